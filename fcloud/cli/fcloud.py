@@ -1,35 +1,64 @@
 import os
-import fire
-import contextlib
+import sys
+import json
+import asyncio
+from itertools import chain
+from functools import cached_property
 from pathlib import Path
 from textwrap import dedent
+from datetime import datetime
 from typing import Optional
 from typing import Generic
-
-
-from prettytable import PrettyTable
+from typing import Callable
+from typing import Awaitable
+from typing import TypeVar
 
 from ..models.driver import T
 from ..models.driver import Driver
 from ..models.settings import Config as _Config
+from ..models.settings import CflData
 from ..models.settings import CloudObj
 from ..models.settings import UserArgument
+from ..models.settings import SyncItem
 
 from ..utils.cfl import create_cfl
 from ..utils.cfl import delete_cfl
 from ..utils.cfl import read_cfl
+from ..utils.cfl import read_cfl_data
+from ..utils.cfl import is_cfl_file
 from ..utils.animations import animation
+from ..utils.pool import run_in_loop
+from ..utils.index import RemoteIndex
+from ..utils.sync import plan_sync
+from ..utils.sync import ACTIONS
+from ..utils.sync import UPLOAD
+from ..utils.sync import UPDATE
+from ..utils.sync import CONVERT
+from ..utils.config import get_data_dir
+from ..utils.daemon import socket_path
+from ..utils.watch import open_watcher
+from ..utils.watch import Debouncer
+from ..utils import limiter
 
 from .groups.config import Config
+from .groups.cache import Cache
+from .groups.index import Index
+from .groups.daemon import Daemon
 from .groups.dropbox import Dropbox
 from .groups.yandex import Yandex
 
 from ..drivers.base import CloudProtocol
+from ..drivers.base import AsyncCloudProtocol
+from ..drivers.remote import RemoteDriver
 from ..exceptions.cfl_errors import CFLError
 from ..exceptions.file_errors import FileError
 from ..exceptions.config_errors import ConfigError
+from ..exceptions.transfer_errors import TransferError
+from ..exceptions.index_errors import RemoteIndexError
 from ..exceptions.exceptions import FcloudException
 
+R = TypeVar("R")
+
 
 class Fcloud:
     """
@@ -53,6 +82,11 @@ class Fcloud:
         """
         # init subcommands `fcloud config`, `fcloud dropbox` ...
         self.config = Config([x.name for x in drivers])
+        self.cache = Cache()
+        self.index = Index(lambda: self._driver, self._open_index)
+        self.daemon = Daemon(
+            lambda: self._local_driver, lambda: self._socket, lambda: self._service
+        )
         self.dropbox = Dropbox()
         self.yandex = Yandex()
 
@@ -61,17 +95,63 @@ class Fcloud:
 
         service = [d for d in drivers if d.name == config.service][0]
         try:
-            auth = service.auth_model(**config.section_fields)
-        except TypeError:
+            auth = service.load_auth_model()(**config.section_fields)
+        except (TypeError, ValueError):
+            # A missing field, or a value that is not a number
             raise FcloudException(*ConfigError.section_error)
 
-        self._driver: CloudProtocol = service.driver(auth, config.main_folder)
+        # The driver is created on first use, because creating it
+        # requires requests to the cloud, which some commands don't need
+        self._service_driver: Driver = service
         self._auth: Generic[T] = auth
         self._main_folder: Path = config.main_folder
         self._cfl_extension = config.cfl_extension
+        self._service: str = config.service
+        self._socket = socket_path(
+            config.service, config.main_folder, config.section_fields
+        )
+
+    @cached_property
+    def _driver(self) -> CloudProtocol:
+        # If a daemon is running, the commands use its driver, which is
+        # already authenticated and keeps its connections to the cloud open
+        remote = RemoteDriver.connect(self._socket)
+        return remote if remote is not None else self._local_driver
+
+    @cached_property
+    def _local_driver(self) -> CloudProtocol:
+        driver = self._service_driver.load_driver()(self._auth, self._main_folder)
+        if self._remote_index is not None:
+            driver.use_index(self._remote_index)
+        return driver
+
+    def _open_index(self) -> RemoteIndex:
+        return RemoteIndex(
+            get_data_dir() / "index.sqlite",
+            self._service,
+            self._main_folder,
+            self._service_driver.case_sensitive,
+        )
+
+    @cached_property
+    def _remote_index(self) -> Optional[RemoteIndex]:
+        """Index of the main folder, if it has been created"""
+        if not (get_data_dir() / "index.sqlite").exists():
+            return None
+        index = self._open_index()
+        return index if index.updated is not None else None
+
+    def _update_index(self, path: Optional[str], obj: Optional[CloudObj]) -> None:
+        # Changes made by fcloud itself are written to the index at once,
+        # so it stays usable until the next refresh
+        index = self._remote_index
+        if index is not None and path is not None and index.covers(Path(path)):
+            index.update([(path, obj)])
 
     def __call__(self, *args, **kwargs):
         if args or kwargs:
+            import fire
+
             fire.Fire(object, name="fcloud")
 
         print(
@@ -90,6 +170,41 @@ class Fcloud:
     def _to_remote_path(self, path: UserArgument | None) -> Path:
         return self._main_folder if path is None else self._to_path(path)
 
+    def _is_cfl_path(self, path: Path) -> bool:
+        return str(path)[-len(self._cfl_extension) :] == self._cfl_extension
+
+    def _run_async(
+        self, func: Callable[[AsyncCloudProtocol], Awaitable[R]], jobs: int
+    ) -> R:
+        """Awaits func with the asynchronous driver on a new event loop, so
+        the files of an operation on a folder are processed on one thread"""
+
+        async def run() -> R:
+            async with self._driver.asynchronous(jobs) as driver:
+                return await func(driver)
+
+        return asyncio.run(run())
+
+    def _limit(self, direction: str, limit: Optional[UserArgument]) -> None:
+        """Applies the speed limit of a command to the transfers of this process"""
+        if limit is None:
+            return
+        limiter.set_limit(direction, limiter.parse_rate(limit))
+        # A daemon has its own limits, so the files are transferred here
+        self._driver = self._local_driver
+
+    def _raise_bulk_errors(
+        self, errors: list[tuple[Path, FcloudException]], total: int
+    ) -> None:
+        if not errors:
+            return
+        title, message = TransferError.bulk_error
+        report = "\n".join(
+            f"{path}: {err.title}. {' '.join(str(err.message).split())}".strip()
+            for path, err in sorted(errors, key=lambda x: str(x[0]))
+        )
+        raise FcloudException(title.format(len(errors), total), message.format(report))
+
     @animation("Uploading")
     def add(
         self,
@@ -97,6 +212,9 @@ class Fcloud:
         near: bool = False,
         filename: Optional[UserArgument] = None,
         remote_path: Optional[UserArgument] = None,
+        jobs: int = 1,
+        dedup: bool = False,
+        limit: Optional[UserArgument] = None,
     ) -> None:
         """Uploud file to cloud. More: https://fcloud.tech/docs/usage/commands/#add
         Args:
@@ -109,7 +227,15 @@ class Fcloud:
             -r --remote_path (UserArgument, optional): The folder under
               which the file will be uploaded to the server.
               Defaults to main folder from config.
+            -j --jobs (int, optional): How many files of a folder are
+              uploaded at the same time. Defaults to 1.
+            -d --dedup (bool, optional): If a file with the same content
+              is already in the folder, copy it in the cloud instead of
+              uploading. Defaults to False.
+            -l --limit (UserArgument, optional): Upload speed limit in bytes
+              per second, like 512K or 10M. Defaults to upload_limit from config.
         """
+        self._limit(limiter.UPLOAD, limit)
         lremote_path = self._to_remote_path(remote_path)
         lpath = self._to_path(path)
 
@@ -117,17 +243,25 @@ class Fcloud:
             raise FcloudException(*CFLError.near_with_folder_error)
         elif not lpath.exists():
             raise FcloudException(*FileError.not_exists_error)
-        elif str(lpath)[-len(self._cfl_extension) :] == self._cfl_extension:
+        elif self._is_cfl_path(lpath):
             return
 
         if lpath.is_dir():
-            for file in [x for x in lpath.rglob("*") if x.is_file()]:
-                with contextlib.suppress(SystemExit):
-                    self.add(
-                        str(file),
-                        remote_path=lremote_path,
-                        without_animation=True,
-                    )
+            files = [
+                x for x in lpath.rglob("*") if x.is_file() and not self._is_cfl_path(x)
+            ]
+            with self._driver.bulk(int(jobs)):
+                errors = self._run_async(
+                    lambda driver: run_in_loop(
+                        lambda file: self._add_file_async(
+                            driver, file, lremote_path, Path(file.name), dedup
+                        ),
+                        files,
+                        int(jobs),
+                    ),
+                    int(jobs),
+                )
+            self._raise_bulk_errors(errors, len(files))
             return
 
         if filename is None:
@@ -135,9 +269,217 @@ class Fcloud:
         else:
             lfilename = Path(str(filename))
 
-        cloud_filename = self._driver.upload_file(lpath, lremote_path / lfilename)
+        self._add_file(lpath, lremote_path, lfilename, near, dedup)
 
-        create_cfl(lpath, cloud_filename, lremote_path, self._cfl_extension, near)
+    def _add_file(
+        self,
+        lpath: Path,
+        lremote_path: Path,
+        lfilename: Path,
+        near: bool = False,
+        dedup: bool = False,
+    ) -> None:
+        mtime_ns = os.stat(lpath).st_mtime_ns
+        cloud_file = None
+        if dedup:
+            cloud_file = self._driver.copy_existing(lpath, lremote_path / lfilename)
+        if cloud_file is None:
+            cloud_file = self._driver.upload_file(lpath, lremote_path / lfilename)
+        self._save_cfl(lpath, lremote_path, cloud_file, mtime_ns, near)
+
+    async def _add_file_async(
+        self,
+        driver: AsyncCloudProtocol,
+        lpath: Path,
+        lremote_path: Path,
+        lfilename: Path,
+        dedup: bool = False,
+    ) -> None:
+        mtime_ns = os.stat(lpath).st_mtime_ns
+        cloud_file = None
+        if dedup:
+            cloud_file = await driver.copy_existing(lpath, lremote_path / lfilename)
+        if cloud_file is None:
+            cloud_file = await driver.upload_file(lpath, lremote_path / lfilename)
+        self._save_cfl(lpath, lremote_path, cloud_file, mtime_ns)
+
+    def _save_cfl(
+        self,
+        lpath: Path,
+        lremote_path: Path,
+        cloud_file: CloudObj,
+        mtime_ns: int,
+        near: bool = False,
+    ) -> None:
+        data = self._cfl_data(lremote_path, cloud_file, mtime_ns)
+        create_cfl(
+            lpath, cloud_file.name, lremote_path, self._cfl_extension, near, data
+        )
+        self._update_index(cloud_file.path, cloud_file)
+
+    def _cfl_data(
+        self, lremote_path: Path, cloud_file: CloudObj, mtime_ns: int
+    ) -> CflData:
+        return CflData(
+            path=lremote_path / cloud_file.name,
+            version=2,
+            driver=self._service,
+            size=cloud_file.size,
+            content_hash=cloud_file.content_hash,
+            modified=cloud_file.modifed and cloud_file.modifed.isoformat(),
+            mtime_ns=mtime_ns,
+            rev=cloud_file.rev,
+        )
+
+    def sync(
+        self,
+        path: UserArgument,
+        remote_path: Optional[UserArgument] = None,
+        jobs: int = 4,
+        cfl: bool = False,
+        checksum: bool = False,
+        dry_run: bool = False,
+        limit: Optional[UserArgument] = None,
+    ) -> str:
+        """Upload new and modified files of a folder. More: https://fcloud.tech/docs/usage/commands/#sync
+
+        Args:
+            -p --path (UserArgument): Local folder
+            -r --remote_path (UserArgument, optional): The folder in the
+              cloud, in which the structure of the local folder is kept.
+              Defaults to main folder from config.
+            -j --jobs (int, optional): How many files are hashed and
+              uploaded at the same time. Defaults to 4.
+            -c --cfl (bool, optional): Replace the synced files with cfls,
+              including files that are already in the cloud.
+              Defaults to False.
+            --checksum (bool, optional): Compare the content of all files
+              of the same size, even if they were not modified after they
+              were uploaded. Defaults to False.
+            -d --dry_run (bool, optional): Only print what would be done.
+              Defaults to False.
+            -l --limit (UserArgument, optional): Upload speed limit in bytes
+              per second, like 512K or 10M. Defaults to upload_limit from config.
+        """
+        self._limit(limiter.UPLOAD, limit)
+        lpath = self._to_path(path)
+        lremote_path = self._to_remote_path(remote_path)
+        if not lpath.is_dir():
+            raise FcloudException(*FileError.not_exists_error)
+
+        items, folders = self._sync_plan(lpath, lremote_path, int(jobs), cfl, checksum)
+        counts = {action: 0 for action in ACTIONS}
+        for item in items:
+            counts[item.action] += 1
+        summary = ", ".join(f"{count} {action}" for action, count in counts.items())
+
+        if dry_run:
+            for item in items:
+                if item.action in (UPLOAD, UPDATE, CONVERT):
+                    relative = item.local_path.relative_to(lpath).as_posix()
+                    sys.stdout.write(f"{item.action:<8}  {relative}\n")
+            return summary
+
+        todo = [x for x in items if x.action in (UPLOAD, UPDATE, CONVERT)]
+        if not todo:
+            return summary
+        self._create_folders(todo, lremote_path, folders)
+        with self._driver.bulk(int(jobs)):
+            errors = self._run_sync(todo, int(jobs), cfl)
+        self._raise_bulk_errors(errors, len(todo))
+        return summary
+
+    @animation("Comparing files")
+    def _sync_plan(
+        self,
+        lpath: Path,
+        lremote_path: Path,
+        jobs: int,
+        to_cfl: bool,
+        checksum: bool,
+    ) -> tuple[list[SyncItem], set[Path]]:
+        """Returns the plan and the folders that exist in the cloud"""
+        index = self._remote_index
+        # Files are replaced by cfls only after the folder has been listed,
+        # because an index may not know of files deleted in the meantime
+        if index is not None and index.covers(lremote_path) and not to_cfl:
+            # Only the changes since the last refresh are requested
+            self._driver.refresh_index(index, jobs=max(jobs, 4))
+            exists = index.exists(lremote_path)
+            files = index.list(lremote_path, recursive=True)
+        else:
+            exists = self._driver.exists(lremote_path)
+            files = self._driver.get_all_files(
+                lremote_path, recursive=True, jobs=max(jobs, 4)
+            )
+
+        remote_files = {}
+        if exists:
+            remote_files = {self._relative_name(x, lremote_path): x for x in files}
+        folders = {
+            lremote_path / name for name, x in remote_files.items() if x.is_directory
+        }
+        if exists:
+            folders.add(lremote_path)
+
+        items = plan_sync(
+            lpath,
+            lremote_path,
+            remote_files,
+            self._is_cfl_path,
+            self._driver.hash_kind,
+            checksum,
+            to_cfl,
+            jobs,
+        )
+        return items, folders
+
+    def _create_folders(
+        self, items: list[SyncItem], lremote_path: Path, existing: set[Path]
+    ) -> None:
+        # Missing folders are created parents first, each of them once
+        folders = {
+            folder
+            for item in items
+            if item.action == UPLOAD
+            for folder in (item.path.parent, *item.path.parent.parents)
+            if folder == lremote_path or lremote_path in folder.parents
+        }
+        for folder in sorted(folders - existing, key=lambda x: len(x.parts)):
+            self._driver.create_folder(folder)
+
+    @animation("Synchronizing")
+    def _run_sync(
+        self, items: list[SyncItem], jobs: int, to_cfl: bool
+    ) -> list[tuple[Path, FcloudException]]:
+        async def sync_file(driver: AsyncCloudProtocol, item: SyncItem) -> None:
+            mtime_ns = os.stat(item.local_path).st_mtime_ns
+            cloud_file = item.cloud_file
+            if item.action != CONVERT:
+                # The file keeps its path, so a modified file replaces
+                # its old version instead of being saved under a new name
+                cloud_file = await driver.upload_file(
+                    item.local_path, item.path, overwrite=True
+                )
+                self._update_index(cloud_file.path, cloud_file)
+            if to_cfl:
+                data = self._cfl_data(item.path.parent, cloud_file, mtime_ns)
+                create_cfl(
+                    item.local_path,
+                    cloud_file.name,
+                    item.path.parent,
+                    self._cfl_extension,
+                    near=False,
+                    data=data,
+                )
+
+        errors = self._run_async(
+            lambda driver: run_in_loop(
+                lambda item: sync_file(driver, item), items, jobs
+            ),
+            jobs,
+        )
+        return [(item.local_path, err) for item, err in errors]
 
     @animation("Downloading")
     def get(
@@ -145,6 +487,10 @@ class Fcloud:
         cfl: UserArgument,
         near: bool = False,
         remove_after: bool = True,
+        jobs: int = 1,
+        segments: int = 1,
+        min_segment_size: int = 8,
+        limit: Optional[UserArgument] = None,
     ) -> None:
         """Get file from cloud. More: https://fcloud.tech/docs/usage/commands/#get
 
@@ -157,74 +503,346 @@ class Fcloud:
               not delete cfl. Defaults to False)
             -r --remove-after (bool, Optional): Deletes the file
               in the cloud after downloading. Default to False
+            -j --jobs (int, optional): How many files of a folder are
+              downloaded at the same time. Defaults to 1.
+            -s --segments (int, optional): How many parts of one file are
+              downloaded at the same time over separate connections.
+              Defaults to 1.
+            -m --min_segment_size (int, optional): Minimum size of one
+              part in MiB. Defaults to 8.
+            -l --limit (UserArgument, optional): Download speed limit in
+              bytes per second, like 512K or 10M. Defaults to
+              download_limit from config.
         """
+        self._limit(limiter.DOWNLOAD, limit)
         lcfl = self._to_path(cfl)
-        cfl_ex = self._cfl_extension
+        segment_args = (int(segments), int(min_segment_size) * 1024 * 1024)
 
         if lcfl.is_file():
-            path = read_cfl(lcfl)
+            self._get_file(lcfl, near, remove_after, *segment_args)
         elif lcfl.is_dir():
-            for file in [x for x in lcfl.rglob("*") if x.is_file()]:
-                with contextlib.suppress(SystemExit):
-                    self.get(
-                        str(file),
-                        remove_after=remove_after,
-                        without_animation=True,
-                    )
-            return
+            cfls = [x for x in lcfl.rglob("*") if x.is_file() and is_cfl_file(x)]
+            with self._driver.bulk(int(jobs)):
+                errors = self._run_async(
+                    lambda driver: run_in_loop(
+                        lambda file: self._get_file_async(
+                            driver, file, remove_after, *segment_args
+                        ),
+                        cfls,
+                        int(jobs),
+                    ),
+                    int(jobs),
+                )
+            self._raise_bulk_errors(errors, len(cfls))
         else:
             raise FcloudException(*CFLError.not_exists_cfl_error)
 
-        if not near:
-            self._driver.download_file(path, lcfl)
+    def _get_file(
+        self,
+        lcfl: Path,
+        near: bool = False,
+        remove_after: bool = True,
+        segments: int = 1,
+        min_segment_size: int = 8 * 1024 * 1024,
+    ) -> None:
+        data = read_cfl_data(lcfl)
+        local_path = self._download_path(lcfl, near)
+        self._driver.download_file(
+            data.path, local_path, segments, min_segment_size, data.size
+        )
+        self._finish_download(lcfl, local_path, data, near)
 
-            if str(lcfl).endswith(cfl_ex):
-                new_name = lcfl.name[: -len(cfl_ex)] if -len(cfl_ex) != 0 else lcfl.name
-                os.rename(lcfl, lcfl.parent / new_name)
-        else:
-            remove_after = False
-            self._driver.download_file(path, lcfl.parent / lcfl.name[: -len(cfl_ex)])
+        # A file downloaded near its cfl is kept in the cloud
+        if remove_after and not near:
+            self._driver.remove_file(data.path)
+            self._update_index(data.path.as_posix(), None)
+
+    async def _get_file_async(
+        self,
+        driver: AsyncCloudProtocol,
+        lcfl: Path,
+        remove_after: bool = True,
+        segments: int = 1,
+        min_segment_size: int = 8 * 1024 * 1024,
+    ) -> None:
+        data = read_cfl_data(lcfl)
+        local_path = self._download_path(lcfl)
+        await driver.download_file(
+            data.path, local_path, segments, min_segment_size, data.size
+        )
+        self._finish_download(lcfl, local_path, data)
 
         if remove_after:
-            self._driver.remove_file(path)
+            await driver.remove_file(data.path)
+            self._update_index(data.path.as_posix(), None)
 
-    @animation("Information collection")
-    def info(self, cfl: UserArgument) -> dict:
+    def _download_path(self, lcfl: Path, near: bool = False) -> Path:
+        cfl_ex = self._cfl_extension
+        if near:
+            return lcfl.parent / lcfl.name[: -len(cfl_ex)]
+        # The file is downloaded next to the cfl, which is
+        # removed only after the download has been completed
+        if str(lcfl).endswith(cfl_ex) and len(cfl_ex) != 0:
+            return lcfl.parent / lcfl.name[: -len(cfl_ex)]
+        return lcfl
+
+    def _finish_download(
+        self, lcfl: Path, local_path: Path, data: CflData, near: bool = False
+    ) -> None:
+        self._restore_mtime(local_path, data)
+        if not near and local_path != lcfl:
+            delete_cfl(lcfl)
+
+    def _restore_mtime(self, local_path: Path, data: CflData) -> None:
+        # The local modification time is kept only if the file in the
+        # cloud has not been changed since the cfl was created
+        if data.mtime_ns is None or os.path.getsize(local_path) != data.size:
+            return
+        os.utime(local_path, ns=(data.mtime_ns, data.mtime_ns))
+
+    def info(self, cfl: UserArgument, refresh: bool = False) -> dict:
         """Info about file. More: https://fcloud.tech/docs/usage/commands/#info
 
         Args:
             -c --cfl (UserArgument): File-link path
+            -r --refresh (bool, optional): Request the information from
+              the cloud instead of reading it from the cfl. Defaults to False.
         """
         lcfl = self._to_path(cfl)
-        return self._driver.info(read_cfl(lcfl))
+        data = read_cfl_data(lcfl)
+        if data.version < 2 and not refresh and self._remote_index is not None:
+            # Cfls of version 1 contain only the path
+            file = self._remote_index.get(data.path)
+            if file is not None:
+                data.size, data.rev = file.size, file.rev
+                data.content_hash = file.content_hash
+                data.modified = file.modifed and file.modifed.isoformat()
+                data.driver, data.version = self._service, 2
+        if refresh or data.version < 2:
+            return self._remote_info(data.path)
+
+        return {
+            "Path": data.path.as_posix(),
+            "Modified": data.modified,
+            "Size": f"{data.size}B" if data.size is not None else None,
+            "Content hash": data.content_hash,
+            "Revision": data.rev,
+            "Cloud": data.driver,
+        }
+
+    def watch(
+        self,
+        path: UserArgument,
+        remote_path: Optional[UserArgument] = None,
+        jobs: int = 4,
+        settle: float = 2,
+        interval: float = 2,
+        retry: float = 60,
+        polling: bool = False,
+        limit: Optional[UserArgument] = None,
+    ) -> None:
+        """Upload files as they appear in a folder. More: https://fcloud.tech/docs/usage/commands/#watch
+
+        Args:
+            -p --path (UserArgument): Watched local folder
+            -r --remote_path (UserArgument, optional): The folder in the
+              cloud, in which the structure of the local folder is kept.
+              Defaults to main folder from config.
+            -j --jobs (int, optional): How many files are uploaded at the
+              same time. Defaults to 4.
+            -s --settle (float, optional): Seconds for which a file must not
+              change before it is uploaded. Defaults to 2.
+            -i --interval (float, optional): Seconds between polls of the
+              folder, if inotify is not available. Defaults to 2.
+            --retry (float, optional): Seconds after which a failed upload
+              is tried again. Defaults to 60.
+            --polling (bool, optional): Poll the folder even if inotify is
+              available. Defaults to False.
+            -l --limit (UserArgument, optional): Upload speed limit in bytes
+              per second, like 512K or 10M. Defaults to upload_limit from config.
+        """
+        self._limit(limiter.UPLOAD, limit)
+        # Imported here, because it imports requests
+        from ..drivers.transfer import PART_SUFFIX
+        from ..drivers.transfer import SEGMENTS_SUFFIX
+
+        lpath = self._to_path(path)
+        lremote_path = self._to_remote_path(remote_path)
+        if not lpath.is_dir():
+            raise FcloudException(*FileError.not_exists_error)
 
-    def remove(self, cfl: UserArgument, only_in_cloud: bool = False) -> None:
+        def is_skipped(file: Path) -> bool:
+            # Unfinished downloads of `get` are skipped too
+            return self._is_cfl_path(file) or file.name.endswith(
+                (PART_SUFFIX, SEGMENTS_SUFFIX)
+            )
+
+        debouncer = Debouncer(float(settle))
+        folders: set[Path] = set()  # Folders created in the cloud
+        # Files that changed during their upload and the paths of the
+        # incomplete copies, which are overwritten by the next upload
+        incomplete: dict[Path, Path] = {}
+        with open_watcher(lpath, is_skipped, polling) as watcher:
+            # Files that were there before the start are uploaded too
+            for file in watcher.scan():
+                debouncer.touch(file)
+            print(f"Watching {lpath} ({watcher.kind}), press Ctrl+C to stop")
+            try:
+                while True:
+                    for file in watcher.changes(debouncer.timeout(float(interval))):
+                        debouncer.touch(file)
+                    ready = debouncer.ready()
+                    if not ready:
+                        continue
+                    errors, changed = self._offload(
+                        ready, lpath, lremote_path, folders, incomplete, int(jobs)
+                    )
+                    for file, _ in errors:
+                        debouncer.touch(file, float(retry))
+                    for file in changed:
+                        debouncer.touch(file)
+            except KeyboardInterrupt:
+                return
+
+    def _offload(
+        self,
+        files: list[Path],
+        lpath: Path,
+        lremote_path: Path,
+        folders: set[Path],
+        incomplete: dict[Path, Path],
+        jobs: int,
+    ) -> tuple[list[tuple[Path, FcloudException]], list[Path]]:
+        """Uploads a batch of files of a watched folder and prints the results.
+        Returns the failed files and the files that were written to during
+        their upload, which are uploaded again once they settle."""
+        remote_folders = {
+            file: lremote_path / file.parent.relative_to(lpath) for file in files
+        }
+        errors: list[tuple[Path, FcloudException]] = []
+        for folder in sorted(set(remote_folders.values()) - folders):
+            try:
+                self._driver.create_folder(folder)
+                folders.add(folder)
+            except FcloudException as err:
+                errors.extend((x, err) for x in files if remote_folders[x] == folder)
+        files = [x for x in files if remote_folders[x] in folders]
+
+        changed: list[Path] = []
+
+        async def add_file(driver: AsyncCloudProtocol, file: Path) -> None:
+            folder = remote_folders[file]
+            stat = os.stat(file)
+            if file in incomplete:
+                path = incomplete[file]
+                cloud_file = await driver.upload_file(file, path, overwrite=True)
+            else:
+                cloud_file = await driver.upload_file(file, folder / file.name)
+            relative = file.relative_to(lpath).as_posix()
+            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            if self._modified(file, stat):
+                # The uploaded copy is incomplete, and the file must not be
+                # replaced by a cfl while it is written
+                changed.append(file)
+                incomplete[file] = folder / cloud_file.name
+                sys.stdout.write(f"{now}  changed  {relative}\n")
+                return
+            incomplete.pop(file, None)
+            self._save_cfl(file, folder, cloud_file, stat.st_mtime_ns)
+            sys.stdout.write(f"{now}  added  {relative}\n")
+
+        with self._driver.bulk(jobs):
+            errors += self._run_async(
+                lambda driver: run_in_loop(
+                    lambda file: add_file(driver, file), files, jobs
+                ),
+                jobs,
+            )
+        for file, err in errors:
+            relative = file.relative_to(lpath).as_posix()
+            message = " ".join(str(err.message).split())
+            print(f"Error: {relative}: {err.title}. {message}", file=sys.stderr)
+        sys.stdout.flush()
+        return errors, changed
+
+    def _modified(self, path: Path, stat: os.stat_result) -> bool:
+        """Whether a file has been written to since `stat` was taken"""
+        now = os.stat(path)
+        return (now.st_size, now.st_mtime_ns) != (stat.st_size, stat.st_mtime_ns)
+
+    @animation("Information collection")
+    def _remote_info(self, path: Path) -> dict:
+        return self._driver.info(path)
+
+    def remove(
+        self, cfl: UserArgument, only_in_cloud: bool = False, jobs: int = 1
+    ) -> None:
         """Will delete a file in the cloud by cfl. More: https://fcloud.tech/docs/usage/commands/#remove
 
         Args:
             -c --cfl (UserArgument):  File-link path
             -o --only_in_cloud (bool, optional): If true, will
               not delete cfl. Defaults to False.
+            -j --jobs (int, optional): How many files of a folder are
+              deleted at the same time, if the cloud does not support
+              batch deletion. Defaults to 1.
         """
         lcfl = self._to_path(cfl)
 
         if lcfl.is_file():
             remote_path = read_cfl(lcfl)
             self._driver.remove_file(remote_path)
+            self._update_index(remote_path.as_posix(), None)
 
             if not only_in_cloud:
                 delete_cfl(lcfl)
         elif lcfl.is_dir():
-            for file in (x for x in lcfl.rglob("*") if x.is_file()):
-                with contextlib.suppress(SystemExit):
-                    self.remove(str(file), only_in_cloud=only_in_cloud)
+            self._remove_dir(lcfl, only_in_cloud, int(jobs))
         else:
             raise FcloudException(*CFLError.not_exists_cfl_error)
 
-    @animation("Collecting files")
+    def _remove_dir(self, lcfl: Path, only_in_cloud: bool, jobs: int) -> None:
+        errors: list[tuple[Path, FcloudException]] = []
+        cfls: dict[Path, Path] = {}
+        files = [x for x in lcfl.rglob("*") if x.is_file() and is_cfl_file(x)]
+        for file in files:
+            try:
+                cfls[file] = read_cfl(file)
+            except FcloudException as err:
+                errors.append((file, err))
+
+        remote_paths = list(dict.fromkeys(cfls.values()))
+        failed = dict(
+            self._run_async(
+                lambda driver: driver.remove_files(remote_paths, jobs), jobs
+            )
+        )
+
+        for remote_path in remote_paths:
+            if remote_path not in failed:
+                self._update_index(remote_path.as_posix(), None)
+
+        for file, remote_path in cfls.items():
+            if remote_path in failed:
+                errors.append((file, failed[remote_path]))
+            elif not only_in_cloud:
+                try:
+                    delete_cfl(file)
+                except FcloudException as err:
+                    errors.append((file, err))
+
+        self._raise_bulk_errors(errors, len(files))
+
     def files(
-        self, remote_path: Optional[UserArgument] = None, only_files: bool = False
-    ) -> PrettyTable:
+        self,
+        remote_path: Optional[UserArgument] = None,
+        only_files: bool = False,
+        ndjson: bool = False,
+        page_size: int = 1000,
+        subfolders: bool = False,
+        jobs: int = 4,
+        cached: bool = False,
+    ) -> None:
         """Get info about all files. More: https://fcloud.tech/docs/usage/commands/#files
 
         Args:
@@ -233,25 +851,129 @@ class Fcloud:
               Defaults to None.
             -o --only_files (bool, optional): Display only files in
               the output, ignoring folders. Defaults to False.
+            -n --ndjson (bool, optional): Print one JSON object per
+              line instead of a table. Defaults to False.
+            -p --page_size (int, optional): How many files are requested
+              from the cloud at once. Defaults to 1000.
+            -s --subfolders (bool, optional): Also list the files of all
+              subfolders. Defaults to False.
+            -j --jobs (int, optional): How many folders are listed at the
+              same time with --subfolders, if the cloud lists one folder
+              per request. Defaults to 4.
+            -c --cached (bool, optional): List the files from the local
+              index of the main folder without requests to the cloud.
+              Defaults to False.
         """
         lremote_path = self._to_remote_path(remote_path)
-
-        if not only_files:
-            columns = ["Filename", "Size", "Is_directory", "Modified"]
+        if cached:
+            index = self._remote_index
+            if index is None or not index.exists(lremote_path):
+                title, message = RemoteIndexError.not_indexed_error
+                raise FcloudException(title, message.format(self._main_folder))
+            files = index.list(lremote_path, subfolders)
         else:
-            columns = ["Filename", "Size", "Modified"]
+            files = self._driver.get_all_files(
+                lremote_path, int(page_size), subfolders, int(jobs)
+            )
+        files = (x for x in files if not (only_files and x.is_directory))
+        # The first page is requested before anything is printed,
+        # so that errors are not preceded by the header
+        first = next(files, None)
+        files = chain([first], files) if first is not None else files
+
+        # Rows are printed as they arrive, so the widths of the columns
+        # are fixed and the filename, whose length varies, is the last one
+        if not ndjson:
+            print(f"Files in {lremote_path}")
+            print(f"{'Modified':<19}  {'Size':>13}  Filename")
+        for file in files:
+            name = self._relative_name(file, lremote_path) if subfolders else file.name
+            if ndjson:
+                line = json.dumps(
+                    {
+                        "name": name,
+                        "size": file.size,
+                        "is_directory": file.is_directory,
+                        "modified": file.modifed and file.modifed.isoformat(),
+                        "content_hash": file.content_hash,
+                    },
+                    ensure_ascii=False,
+                )
+            else:
+                modified = file.modifed and file.modifed.strftime("%Y-%m-%d %H:%M:%S")
+                size = "<DIR>" if file.is_directory else file.size
+                line = f"{modified or '':<19}  {size:>13}  {name}"
+            sys.stdout.write(line + "\n")
+
+    def du(
+        self,
+        remote_path: Optional[UserArgument] = None,
+        depth: Optional[int] = None,
+        ndjson: bool = False,
+        page_size: int = 1000,
+        jobs: int = 4,
+    ) -> None:
+        """Space used by a folder and its subfolders. More: https://fcloud.tech/docs/usage/commands/#du
 
-        files_table = PrettyTable(
-            columns, encoding="utf-8", title=f"Files in {lremote_path}"
+        Args:
+            -r --remote_path (UserArgument, optional): The folder to be
+              measured. Defaults to main folder from config.
+            -d --depth (int, optional): Display subfolders only up to this
+              depth, their files are counted in the displayed folders.
+              Defaults to all subfolders.
+            -n --ndjson (bool, optional): Print one JSON object per
+              line instead of a table. Defaults to False.
+            -p --page_size (int, optional): How many files are requested
+              from the cloud at once. Defaults to 1000.
+            -j --jobs (int, optional): How many folders are listed at the
+              same time, if the cloud lists one folder per request.
+              Defaults to 4.
+        """
+        lremote_path = self._to_remote_path(remote_path)
+        totals = self._folder_totals(
+            lremote_path,
+            None if depth is None else int(depth),
+            int(page_size),
+            int(jobs),
+            # The animation would get into the output read by scripts
+            **({"without_animation": True} if ndjson else {}),
         )
-        files: list[CloudObj] = self._driver.get_all_files(lremote_path)
 
+        if not ndjson:
+            print(f"{'Size':>15}  {'Files':>9}  Folder")
+        for folder, (size, count) in sorted(totals.items()):
+            path = (lremote_path / folder).as_posix()
+            if ndjson:
+                line = json.dumps(
+                    {"path": path, "size": size, "files": count}, ensure_ascii=False
+                )
+            else:
+                line = f"{size:>15}  {count:>9}  {path}"
+            sys.stdout.write(line + "\n")
+
+    @animation("Collecting files")
+    def _folder_totals(
+        self, lremote_path: Path, depth: Optional[int], page_size: int, jobs: int
+    ) -> dict[str, list[int]]:
+        # Only the totals of folders are kept, not the listed files,
+        # so memory depends on the number of folders
+        totals: dict[str, list[int]] = {"": [0, 0]}  # folder: [size, files]
+        files = self._driver.get_all_files(lremote_path, page_size, True, jobs)
         for file in files:
-            if not file.is_directory and only_files:
-                files_table.add_row([file.name, file.size, file.modifed])
-            elif not file.is_directory:
-                files_table.add_row([file.name, file.size, False, file.modifed])
-            elif file.is_directory and not only_files:
-                files_table.add_row([file.name, None, True, None])
-
-        return files_table
+            parts = self._relative_name(file, lremote_path).split("/")
+            folders = parts if file.is_directory else parts[:-1]
+            if depth is not None:
+                folders = folders[: max(0, depth)]
+            for i in range(len(folders) + 1):
+                total = totals.setdefault("/".join(folders[:i]), [0, 0])
+                if not file.is_directory:
+                    total[0] += file.size or 0
+                    total[1] += 1
+        return totals
+
+    def _relative_name(self, file: CloudObj, root: Path) -> str:
+        """Path of a listed file relative to the listed folder"""
+        if file.path is None:
+            return file.name
+        # Dropbox paths may differ from root in case, but not in length
+        return file.path[len(root.as_posix().rstrip("/")) :].lstrip("/")
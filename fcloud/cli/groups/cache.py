@@ -0,0 +1,54 @@
+from pathlib import Path
+from typing import Optional
+
+from ...utils.hashing import HashCache
+from ...utils.hashing import hash_files
+from ...utils.hashing import HASH_KINDS
+from ...models.settings import UserArgument
+
+from ...exceptions.file_errors import FileError
+from ...exceptions.exceptions import FcloudException
+
+
+class Cache:
+    """Use to manage the local cache of file hashes"""
+
+    def fill(
+        self, path: UserArgument, kind: str = "dropbox", jobs: Optional[int] = None
+    ) -> str:
+        """Hash all files in a folder in advance
+
+        Args:
+            -p --path (UserArgument): File or folder to hash
+            -k --kind (str, optional): dropbox, md5 or sha256. Defaults to dropbox.
+            -j --jobs (int, optional): How many files are hashed at the
+              same time. Defaults to the number of CPUs.
+        """
+        if kind not in HASH_KINDS:
+            title, message = FileError.hash_kind_error
+            raise FcloudException(title, message.format(kind, ", ".join(HASH_KINDS)))
+        lpath = Path(str(path))
+        if not lpath.exists():
+            raise FcloudException(*FileError.not_exists_error)
+
+        files = (
+            [lpath] if lpath.is_file() else [x for x in lpath.rglob("*") if x.is_file()]
+        )
+        hash_files(files, kind, jobs)
+        return f"{len(files)} files hashed"
+
+    def prune(self) -> str:
+        """Remove entries of files that were changed, moved or deleted"""
+        return f"{HashCache.default().prune()} entries removed"
+
+    def clear(self) -> None:
+        """Remove all entries"""
+        HashCache.default().clear()
+
+    def size(self) -> int:
+        """Number of cached files"""
+        return len(HashCache.default())
+
+    def path(self) -> Path:
+        """Cache path"""
+        return HashCache.default().path
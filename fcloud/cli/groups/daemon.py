@@ -0,0 +1,93 @@
+from pathlib import Path
+from typing import Callable
+from typing import Optional
+from datetime import datetime
+
+from ...drivers.base import CloudProtocol
+from ...utils import daemon
+from ...utils.daemon import DaemonServer
+from ...utils.limiter import set_limit
+from ...utils.limiter import parse_rate
+from ...utils.limiter import format_rate
+from ...utils.limiter import UPLOAD
+from ...utils.limiter import DOWNLOAD
+from ...models.settings import UserArgument
+from ...exceptions.daemon_errors import DaemonError
+from ...exceptions.exceptions import FcloudException
+
+
+class Daemon:
+    """Use to keep the connection to the cloud open between commands"""
+
+    def __init__(
+        self,
+        get_driver: Callable[[], CloudProtocol],
+        get_socket: Callable[[], Path],
+        get_service: Callable[[], str],
+    ):
+        """
+        Args:
+            get_driver (Callable): Creates the driver, which connects to the cloud
+            get_socket (Callable): Returns the socket of the daemon for the config
+            get_service (Callable): Returns the name of the cloud
+        """
+        self._get_driver = get_driver
+        self._get_socket = get_socket
+        self._get_service = get_service
+
+    def run(
+        self,
+        upload_limit: Optional[UserArgument] = None,
+        download_limit: Optional[UserArgument] = None,
+    ) -> None:
+        """Run the daemon until Ctrl+C or "fcloud daemon stop". While it is
+        running, other commands use its connection to the cloud.
+
+        Args:
+            -u --upload_limit (UserArgument, optional): Upload speed limit
+              of all transfers of the daemon, like 512K or 10M.
+              Defaults to upload_limit from config.
+            -d --download_limit (UserArgument, optional): Download speed
+              limit of all transfers of the daemon. Defaults to
+              download_limit from config.
+        """
+        for direction, limit in ((UPLOAD, upload_limit), (DOWNLOAD, download_limit)):
+            if limit is not None:
+                set_limit(direction, parse_rate(limit))
+        path = self._get_socket()
+        server = DaemonServer(path, self._get_driver(), self._get_service())
+        print(f"Listening on {path}, press Ctrl+C to stop")
+        server.run()
+
+    def status(self) -> dict:
+        """Information about the running daemon"""
+        status = self._request("status")
+        return {
+            "Pid": status["pid"],
+            "Cloud": status["service"],
+            "Started": datetime.fromtimestamp(status["started"]),
+            "Requests": status["requests"],
+            "Upload limit": format_rate(status["limits"][UPLOAD]),
+            "Download limit": format_rate(status["limits"][DOWNLOAD]),
+            **{
+                f"Connections ({backend})": f"{x['connections']} opened for"
+                f" {x['requests']} requests, pool size {x['pool_size']}"
+                for backend, x in status["connections"].items()
+            },
+        }
+
+    def stop(self) -> None:
+        """Stop the running daemon"""
+        self._request("stop")
+
+    def path(self) -> Path:
+        """Socket path"""
+        return self._get_socket()
+
+    def _request(self, method: str):
+        try:
+            return daemon.request(
+                self._get_socket(), method, timeout=daemon.STATUS_TIMEOUT
+            )
+        except OSError:
+            raise FcloudException(*DaemonError.not_running_error)
@@ -1,4 +1,3 @@
-import requests
 import os
 from textwrap import dedent
 
@@ -45,8 +44,11 @@ class Dropbox:
         edit_config("DROPBOX", "token", access_token.refresh_token)
 
     def _get_access_token(self, auth: DropboxAuth) -> TokenData:
+        # Imported here, because it imports requests
+        from ...drivers.transport import get_session
+
         try:
-            response = requests.post(
+            response = get_session("dropbox").post(
                 "https://api.dropboxapi.com/oauth2/token",
                 data={"code": auth.token, "grant_type": "authorization_code"},
                 auth=(
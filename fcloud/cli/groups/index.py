@@ -0,0 +1,65 @@
+from pathlib import Path
+from typing import Callable
+from datetime import datetime
+
+from ...models.settings import UserArgument
+from ...drivers.base import CloudProtocol
+from ...utils.index import RemoteIndex
+
+
+class Index:
+    """Use to manage the local index of the files of the main folder in the cloud"""
+
+    def __init__(
+        self,
+        get_driver: Callable[[], CloudProtocol],
+        get_index: Callable[[], RemoteIndex],
+    ):
+        """
+        Args:
+            get_driver (Callable): Returns the driver, it is created on first use
+            get_index (Callable): Returns the index of the main folder
+        """
+        self._get_driver = get_driver
+        self._get_index = get_index
+
+    def refresh(self, full: bool = False, jobs: int = 4) -> str:
+        """Request the changes of the main folder since the last refresh
+
+        Args:
+            -f --full (bool, optional): List the whole folder again.
+              Defaults to False.
+            -j --jobs (int, optional): How many folders are listed at the
+              same time, if the cloud lists one folder per request.
+              Defaults to 4.
+        """
+        index = self._get_index()
+        changes = self._get_driver().refresh_index(index, full, int(jobs))
+        return f"{changes} changes, {len(index)} files in the index"
+
+    def status(self) -> dict:
+        """Information about the index"""
+        index = self._get_index()
+        updated = index.updated
+        return {
+            "Folder": index.root.as_posix(),
+            "Files": len(index),
+            "Updated": datetime.fromtimestamp(updated) if updated else None,
+            "Incremental": index.cursor is not None,
+        }
+
+    def exists(self, path: UserArgument) -> bool:
+        """Whether a file or folder is in the index, without requests to the cloud
+
+        Args:
+            -p --path (UserArgument): Path in the cloud
+        """
+        return self._get_index().exists(Path(str(path)))
+
+    def clear(self) -> None:
+        """Remove all entries of the main folder"""
+        self._get_index().clear()
+
+    def path(self) -> Path:
+        """Index path"""
+        return self._get_index().path
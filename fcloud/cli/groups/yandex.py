@@ -1,5 +1,4 @@
 import os
-import yadisk
 
 from ...exceptions.config_errors import ConfigError
 
@@ -17,14 +16,15 @@ class Yandex:
         error = (title, message.format("client_secret", self._conf))
         self._client_secret = get_field("client_secret", error, section="YANDEX")
 
-        self._app = yadisk.Client(self._cient_id, self._client_secret)
-
     def get_token(self):
         """Generates a code that must be validated by clicking
         on the link to receive the token"""
-        url = self._app.get_code_url()
+        import yadisk
+
+        app = yadisk.Client(self._cient_id, self._client_secret)
+        url = app.get_code_url()
         print(f"Go to the following url: {url}")
         code = input("Enter the confirmation code: ")
 
-        response = self._app.get_token(code)
+        response = app.get_token(code)
         edit_config("YANDEX", "token", response.access_token)
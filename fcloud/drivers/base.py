@@ -1,44 +1,129 @@
 from typing import Protocol
+from typing import TYPE_CHECKING
+from typing import Optional
+from typing import Iterator
+from typing import AsyncIterator
 from pathlib import Path
+from contextlib import contextmanager
+
+from ..utils.pool import run_in_pool
+from ..utils.pool import run_in_loop
+from ..exceptions.exceptions import FcloudException
+
+if TYPE_CHECKING:
+    from ..models.settings import CloudObj
+    from ..utils.index import RemoteIndex
 
 
 class CloudProtocol(Protocol):
+    # Kind of the content hashes reported by the cloud (see `file_hash`),
+    # None if the cloud does not report them
+    hash_kind: Optional[str] = None
+
     def __init__(self, auth, main_folder: Path):
         pass
 
-    def download_file(self, path: Path, local_path: Path) -> None:
+    def download_file(
+        self,
+        path: Path,
+        local_path: Path,
+        segments: int = 1,
+        min_segment_size: int = 8 * 1024 * 1024,
+        size: Optional[int] = None,
+    ) -> None:
         """Download a file from the cloud
 
         Args:
             path (Path): Path to a file in the cloud
             local_path (Path): The path where you want to save the downloaded file
+            segments (int, optional): How many parts of the file are downloaded
+              at the same time over separate connections. Defaults to 1.
+            min_segment_size (int, optional): Minimum size of one part in bytes
+            size (int, optional): Size of the file, if it is known from the cfl.
+              Saves a request for the size of the file. Defaults to None.
         """
         pass
 
-    def upload_file(self, local_path: Path, path: Path) -> str:
+    def upload_file(
+        self, local_path: Path, path: Path, overwrite: bool = False
+    ) -> "CloudObj":
         """Upload a file to the cloud
 
         Args:
             local_path (Path): Path to the file to be uploaded
             path (Path): Path where you want to save the file
+            overwrite (bool, optional): Replace the file at `path` if it
+              exists, instead of saving the file under a new name.
+              Defaults to False.
 
         Returns:
-            str: The name under which the file was uploaded
+            CloudObj: The uploaded file. Its name is the name under which the
+            file was uploaded, its size, content hash and revision are saved
+            to the cfl when the cloud reports them.
             * The name assigned after uploading to the cloud may be different from the
             original name because it is already taken in the cloud.
         """
         pass
 
-    def get_all_files(self, remote_path: Path) -> list:
-        """Get a list of files in the cloud. File objects or just file names,
-          but not their actual contents.
+    def copy_existing(self, local_path: Path, path: Path) -> Optional["CloudObj"]:
+        """Copy a file that is already in the cloud instead of uploading it.
+          Used to avoid sending the same content twice.
+
+        Args:
+            local_path (Path): Path to the file to be uploaded
+            path (Path): Path where you want to save the file
+
+        Returns:
+            Optional[CloudObj]: The saved copy (see `upload_file`), or None
+            if the folder of `path` has no file with the same content or
+            the hash of the copy does not match the local file
+        """
+        return None
+
+    def get_all_files(
+        self,
+        remote_path: Path,
+        page_size: int = 1000,
+        recursive: bool = False,
+        jobs: int = 4,
+    ) -> Iterator["CloudObj"]:
+        """Get files in the cloud. File objects, but not their actual contents.
 
         Args:
             remote_path (Path): The path to the folder from which you want to retrieve
             the files.
+            page_size (int, optional): How many files are requested from the
+              cloud at once. Defaults to 1000.
+            recursive (bool, optional): Also list the files of all subfolders.
+              The `path` of every object is set, so that it can be told which
+              folder it belongs to. Defaults to False.
+            jobs (int, optional): How many folders are listed at the same time
+              in a recursive listing, if the cloud can list only one level
+              per request. Defaults to 4.
 
         Returns:
-            list: By default, all files in the default folder will be returned.
+            Iterator[CloudObj]: Files of the folder. The next page is requested
+              only when the previous one has been consumed, so a folder of any
+              size is listed in constant memory.
+        """
+        pass
+
+    def exists(self, path: Path) -> bool:
+        """Whether a file or folder exists in the cloud
+
+        Args:
+            path (Path): Path in the cloud
+        """
+        pass
+
+    def create_folder(self, path: Path) -> None:
+        """Create a folder in the cloud together with its missing parents.
+          Nothing is done if the folder exists. By default nothing is done
+          at all, which suits clouds that create the folders of uploaded
+          files themselves.
+
+        Args:
+            path (Path): Path to the folder in the cloud
         """
         pass
 
@@ -51,6 +136,72 @@ class CloudProtocol(Protocol):
         """
         pass
 
+    def remove_files(
+        self, paths: list[Path], jobs: int = 1
+    ) -> list[tuple[Path, FcloudException]]:
+        """Delete many files in the cloud. By default files are
+          deleted one by one on a pool of `jobs` threads, drivers
+          may override it to use batch requests.
+
+        Args:
+            paths (list[Path]): Paths to the files in the cloud
+            jobs (int, optional): Maximum number of deletions running at once
+
+        Returns:
+            list[tuple[Path, FcloudException]]: Files that were not deleted
+            along with their errors. All other files have been deleted.
+        """
+        return run_in_pool(self.remove_file, paths, jobs)
+
+    @contextmanager
+    def bulk(self, jobs: int = 1) -> Iterator[None]:
+        """Context in which many files are processed at the same time,
+          for example when a folder is uploaded. Drivers may use it to
+          group requests together.
+
+        Args:
+            jobs (int, optional): How many files are processed at once
+        """
+        yield
+
+    def use_index(self, index: "RemoteIndex") -> None:
+        """Look up the names taken in folders covered by a local index
+          in it, instead of listing the folders before uploads
+
+        Args:
+            index (RemoteIndex): Index of the main folder
+        """
+        pass
+
+    def forget_cache(self) -> None:
+        """Drop what the driver remembers about remote folders, for example
+        the names taken in them. Called when the folders may have been
+        changed by someone else, such as between the commands served by
+        the daemon"""
+        pass
+
+    def refresh_index(
+        self, index: "RemoteIndex", full: bool = False, jobs: int = 4
+    ) -> int:
+        """Bring the local index of a folder up to date. By default the
+          whole folder is listed again, drivers may override it to request
+          only the changes since the cursor saved in the index.
+
+        Args:
+            index (RemoteIndex): Index of the folder `index.root`
+            full (bool, optional): List the whole folder even if the
+              index has a cursor. Defaults to False.
+            jobs (int, optional): How many folders are listed at the same
+              time, see `get_all_files`. Defaults to 4.
+
+        Returns:
+            int: Number of changed objects
+        """
+        files = self.get_all_files(index.root, recursive=True, jobs=jobs)
+        return index.update(
+            ((x.path, x) for x in files), cursor=lambda: None, reset=True
+        )
+
     def info(self, path: Path) -> dict:
         """Print information about the file
 
@@ -61,3 +212,86 @@ class CloudProtocol(Protocol):
             dict: Information that will be displayed to the user
         """
         pass
+
+    def asynchronous(self, jobs: int = 1) -> "AsyncCloudProtocol":
+        """Driver of the same cloud whose methods are coroutines, so that
+          many requests are awaited on one event loop. By default the
+          methods of this driver are run on a pool of threads, drivers
+          may override it to use an asynchronous client.
+
+        Args:
+            jobs (int, optional): How many calls are running at the same time
+
+        Returns:
+            AsyncCloudProtocol: Driver to be used with `async with` on the
+            event loop that awaits its methods
+        """
+        # Imported here, because it imports this module
+        from .threaded import ThreadedDriver
+
+        return ThreadedDriver(self, jobs)
+
+
+class AsyncCloudProtocol(Protocol):
+    """Asynchronous counterpart of `CloudProtocol` for operations on many
+    files, see `CloudProtocol.asynchronous`. The methods take the same
+    arguments and return the same results as those of `CloudProtocol`.
+    """
+
+    hash_kind: Optional[str] = None
+
+    async def download_file(
+        self,
+        path: Path,
+        local_path: Path,
+        segments: int = 1,
+        min_segment_size: int = 8 * 1024 * 1024,
+        size: Optional[int] = None,
+    ) -> None:
+        """See `CloudProtocol.download_file`"""
+        pass
+
+    async def upload_file(
+        self, local_path: Path, path: Path, overwrite: bool = False
+    ) -> "CloudObj":
+        """See `CloudProtocol.upload_file`"""
+        pass
+
+    async def copy_existing(self, local_path: Path, path: Path) -> Optional["CloudObj"]:
+        """See `CloudProtocol.copy_existing`"""
+        return None
+
+    def get_all_files(
+        self,
+        remote_path: Path,
+        page_size: int = 1000,
+        recursive: bool = False,
+        jobs: int = 4,
+    ) -> AsyncIterator["CloudObj"]:
+        """See `CloudProtocol.get_all_files`"""
+        pass
+
+    async def remove_file(self, path: Path) -> None:
+        """See `CloudProtocol.remove_file`"""
+        pass
+
+    async def remove_files(
+        self, paths: list[Path], jobs: int = 1
+    ) -> list[tuple[Path, FcloudException]]:
+        """See `CloudProtocol.remove_files`. By default `jobs` files are
+        deleted at the same time on the event loop."""
+        return await run_in_loop(self.remove_file, paths, jobs)
+
+    async def info(self, path: Path) -> dict:
+        """See `CloudProtocol.info`"""
+        pass
+
+    async def close(self) -> None:
+        """Closes the connections of the driver"""
+        pass
+
+    async def __aenter__(self) -> "AsyncCloudProtocol":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
@@ -0,0 +1,71 @@
+import threading
+from concurrent.futures import Future
+
+import dropbox
+from dropbox.files import CommitInfo
+from dropbox.files import FileMetadata
+from dropbox.files import UploadSessionCursor
+from dropbox.files import UploadSessionFinishArg
+from dropbox.exceptions import ApiError
+
+
+class FinishBatcher:
+    """Commits finished upload sessions in groups using
+    files_upload_session_finish_batch_v2.
+
+    Every uploading thread waits in `finish` until its session is committed.
+    A group is sent once it has `size` sessions or `linger` seconds after
+    its first session, whichever comes first.
+    """
+
+    def __init__(self, app: dropbox.Dropbox, size: int, linger: float = 1.0):
+        self._app = app
+        self._size = size
+        self._linger = linger
+        self._lock = threading.Lock()
+        self._entries: list[tuple[UploadSessionFinishArg, Future]] = []
+        self._timer: threading.Timer | None = None
+
+    def finish(self, cursor: UploadSessionCursor, commit: CommitInfo) -> FileMetadata:
+        """Commits a closed upload session
+
+        Returns:
+            FileMetadata: Metadata of the committed file
+        """
+        future: Future = Future()
+        with self._lock:
+            self._entries.append((UploadSessionFinishArg(cursor, commit), future))
+            full = len(self._entries) >= self._size
+            if not full and self._timer is None:
+                self._timer = threading.Timer(self._linger, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+        if full:
+            self.flush()
+        return future.result()
+
+    def flush(self) -> None:
+        """Commits all waiting sessions right away"""
+        with self._lock:
+            entries, self._entries = self._entries, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not entries:
+            return
+
+        try:
+            result = self._app.files_upload_session_finish_batch_v2(
+                [arg for arg, _ in entries]
+            )
+        except Exception as er:
+            for _, future in entries:
+                future.set_exception(er)
+            return
+
+        for (_, future), entry in zip(entries, result.entries):
+            if entry.is_success():
+                future.set_result(entry.get_success())
+            else:
+                future.set_exception(ApiError(None, entry.get_failure(), None, None))
@@ -0,0 +1,108 @@
+import threading
+from typing import Optional
+
+MIB = 1024 * 1024
+# Chunks of concurrent upload sessions, except the last one,
+# must be multiples of 4 MiB
+ALIGNMENT = 4 * MIB
+# Dropbox accepts at most 150 MiB in one request
+MAX_CHUNK_SIZE = 148 * MIB
+
+
+class ChunkSizer:
+    """Chooses the size of the chunks of upload sessions from the measured
+    speed of the chunks that were sent before.
+
+    A chunk should take about `duration` seconds to send: long enough that
+    the round trip of the request is a small share of it, short enough that
+    little has to be sent again when a connection is dropped. The speed is
+    averaged over the recent chunks without the latency, which is measured
+    by requests without data. The size grows at most twice per chunk and is
+    halved after a dropped connection.
+
+    Sizes are multiples of 4 MiB between `min_size` and `max_size`.
+    The sizer is shared by all uploads of a driver, so a new file starts
+    with the size learned from the previous ones.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        min_size: int = ALIGNMENT,
+        max_size: int = 64 * MIB,
+        adaptive: bool = True,
+        duration: float = 4.0,
+        overhead: float = 0.1,
+    ):
+        """
+        Args:
+            size (int): Size of the first chunk in bytes
+            min_size (int, optional): Smallest size in bytes. Defaults to 4 MiB.
+            max_size (int, optional): Largest size in bytes. Defaults to 64 MiB.
+            adaptive (bool, optional): Whether the size is changed at all.
+              Defaults to True.
+            duration (float, optional): Shortest time to send one chunk in
+              seconds. Defaults to 4.
+            overhead (float, optional): Largest share of the time of a chunk
+              spent on the round trip of its request. Defaults to 0.1.
+        """
+        if not adaptive:
+            min_size = max_size = size
+        self.min_size = _align(min(min_size, MAX_CHUNK_SIZE))
+        self.max_size = max(self.min_size, _align(min(max_size, MAX_CHUNK_SIZE)))
+        self.adaptive = adaptive
+        self.duration = duration
+        self.overhead = overhead
+        self._size = self._clamp(_align(size))
+        self._speed: Optional[float] = None  # Bytes per second
+        self._latency: Optional[float] = None  # Seconds
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        """Size of the next chunk in bytes"""
+        with self._lock:
+            return self._size
+
+    def latency(self, seconds: float) -> None:
+        """Records how long a request without data took, such as the start
+        of an upload session"""
+        with self._lock:
+            self._latency = _average(self._latency, seconds)
+
+    def sent(self, size: int, seconds: float) -> None:
+        """Records that a chunk of `size` bytes was sent in `seconds`"""
+        if not self.adaptive:
+            return
+        with self._lock:
+            # The last chunk of a file is usually shorter and
+            # its time depends mostly on the latency
+            if size < self._size // 2:
+                return
+            latency = self._latency or 0.0
+            transfer = max(seconds - latency, seconds / 2, 1e-3)
+            self._speed = _average(self._speed, size / transfer)
+
+            duration = max(self.duration, latency / self.overhead)
+            wanted = min(self._speed * duration, self._size * 2)
+            self._size = self._clamp(_align(int(wanted)))
+
+    def failed(self) -> None:
+        """Records that a chunk was not sent, because the connection was
+        dropped or has timed out"""
+        if not self.adaptive:
+            return
+        with self._lock:
+            self._size = self._clamp(_align(self._size // 2))
+
+    def _clamp(self, size: int) -> int:
+        return min(max(size, self.min_size), self.max_size)
+
+
+def _align(size: int) -> int:
+    return max(ALIGNMENT, size // ALIGNMENT * ALIGNMENT)
+
+
+def _average(old: Optional[float], value: float, weight: float = 0.3) -> float:
+    """Moving average in which recent values weigh more"""
+    return value if old is None else old + weight * (value - old)
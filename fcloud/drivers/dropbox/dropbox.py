@@ -1,13 +1,33 @@
 import os
+import time
+import inspect
 from pathlib import Path
+from datetime import datetime
+from datetime import timezone
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import wait
 from typing import Callable
+from typing import Iterator
+from typing import Optional
+from contextlib import contextmanager
 from functools import wraps
 
 import dropbox
 from dropbox.dropbox_client import BadInputException
 from dropbox.files import UploadSessionCursor
+from dropbox.files import UploadSessionType
 from dropbox.files import CommitInfo
-from dropbox.files import Metadata
+from dropbox.files import WriteMode
+from dropbox.files import DeleteArg
+from dropbox.files import DeleteBatchLaunch
+from dropbox.files import DeleteBatchResult
+from dropbox.files import ListFolderError
+from dropbox.files import GetMetadataError
+from dropbox.files import ListFolderContinueError
+from dropbox.files import ListFolderResult
+from dropbox.files import DeletedMetadata
 from dropbox.files import FileMetadata
 from dropbox.files import FolderMetadata
 from dropbox.exceptions import AuthError
@@ -18,16 +38,30 @@ from requests.exceptions import ProxyError
 from stone.backends.python_rsrc.stone_validators import ValidationError
 
 from requests import ConnectionError
+from requests.exceptions import Timeout
 
 from ...models.settings import CloudObj
 from ...exceptions.file_errors import FileError
+from ...exceptions.exceptions import FcloudException
 from ..base import CloudProtocol
+from ..transfer import download_url
+from ..transport import get_session
+from ..transport import ensure_pool_size
+from .chunks import ChunkSizer
+from .chunks import MIB
 from .errors import DropboxError
 from .errors import DropboxException
 
-from ...utils.other import generate_new_name
+from ...utils.registry import NameRegistry
+from ...utils.registry import ContentIndex
+from ...utils.journal import UploadJournal
+from ...utils.tokens import TokenCache
+from ...utils.config import get_data_dir
+from ...utils.index import Change
+from ...utils.index import RemoteIndex
 
 
+from .batch import FinishBatcher
 from .models import DropboxAuth
 
 
@@ -36,108 +70,594 @@ def dropbox_api_error(func: Callable):
       Dropbox api and prints them to the user
 
     Args:
-        func (Callable): driver method
+        func (Callable): driver method. Errors of generator methods
+          are caught while iterating over them
     """
 
+    if inspect.isgeneratorfunction(func):
+
+        @wraps(func)
+        def inner_generator(*args, **kwargs):
+            with _dropbox_errors(args):
+                yield from func(*args, **kwargs)
+
+        return inner_generator
+
     @wraps(func)
     def inner(*args, **kwargs):
-        try:
-            result = func(*args, **kwargs)
-            return result
-        except AuthError:
-            raise DropboxException(*DropboxError.auth_error)
-        except BadInputError as er:
-            title, message = DropboxError.badinput_error
-            raise DropboxException(title, message.format(er.message))
-        except BadInputException as er:
-            title, message = DropboxError.uncorrect_data_error
-            raise DropboxException(title, message.format(er))
-        except (HttpError, ProxyError):
-            raise DropboxException(*DropboxError.max_retries_error)
-        except ApiError as er:
-            raise DropboxException("API error", er.args[1])
-        except ConnectionError:
-            raise DropboxException(*DropboxError.connection_error)
-        except ValidationError:
-            raise DropboxException(*DropboxError.validation_error)
-        except FileNotFoundError:
-            raise DropboxException(*FileError.not_exists_error)
-        except PermissionError:
-            raise DropboxException(*FileError.perrmission_denied)
-        except Exception as er:
-            title, message = DropboxError.uknown_error
-            raise DropboxException(title.format(er), message.format(er))
+        with _dropbox_errors(args):
+            return func(*args, **kwargs)
 
     return inner
 
 
+@contextmanager
+def _dropbox_errors(args: tuple) -> Iterator[None]:
+    try:
+        yield
+    except FcloudException:
+        raise
+    except AuthError:
+        if args and isinstance(args[0], DropboxCloud):
+            # The cached access token may have been revoked
+            args[0]._tokens.forget(args[0]._token_key)
+        raise DropboxException(*DropboxError.auth_error)
+    except BadInputError as er:
+        title, message = DropboxError.badinput_error
+        raise DropboxException(title, message.format(er.message))
+    except BadInputException as er:
+        title, message = DropboxError.uncorrect_data_error
+        raise DropboxException(title, message.format(er))
+    except (HttpError, ProxyError):
+        raise DropboxException(*DropboxError.max_retries_error)
+    except ApiError as er:
+        raise DropboxException("API error", er.args[1])
+    except ConnectionError:
+        raise DropboxException(*DropboxError.connection_error)
+    except ValidationError:
+        raise DropboxException(*DropboxError.validation_error)
+    except FileNotFoundError:
+        raise DropboxException(*FileError.not_exists_error)
+    except PermissionError:
+        raise DropboxException(*FileError.perrmission_denied)
+    except Exception as er:
+        title, message = DropboxError.uknown_error
+        raise DropboxException(title.format(er), message.format(er))
+
+
+def _file_obj(metadata: FileMetadata) -> CloudObj:
+    return CloudObj(
+        name=metadata.name,
+        size=metadata.size,
+        is_directory=False,
+        modifed=metadata.server_modified,
+        content_hash=metadata.content_hash,
+        rev=metadata.rev,
+        path=metadata.path_display,
+    )
+
+
+def _correct_offset(er: ApiError) -> int | None:
+    """Offset expected by Dropbox, if an append was sent with a wrong one"""
+    if getattr(er.error, "is_incorrect_offset", lambda: False)():
+        return er.error.get_incorrect_offset().correct_offset
+    return None
+
+
+def _session_lost(er: ApiError) -> bool:
+    """Whether an upload session can no longer be continued"""
+    return any(
+        getattr(er.error, check, lambda: False)()
+        for check in ("is_not_found", "is_closed")
+    )
+
+
+# How many times a chunk of a sequential session is sent after a dropped connection
+CHUNK_ATTEMPTS = 3
+
+
 class DropboxCloud(CloudProtocol):
+    hash_kind = "dropbox"
+
     @dropbox_api_error
     def __init__(self, auth: DropboxAuth, main_folder: Path):
-        self.chunk_size = 4 * 1024 * 1024
+        self._chunks = ChunkSizer(
+            auth.chunk_size * MIB,
+            auth.min_chunk_size * MIB,
+            auth.max_chunk_size * MIB,
+            auth.adaptive_chunks,
+        )
+        self.parallel_chunks = auth.parallel_chunks
+        self.small_file_threshold = auth.small_file_threshold * 1024 * 1024
+        self._batcher: FinishBatcher | None = None
+        self._journal = UploadJournal(get_data_dir() / "uploads")
+        self.delete_batch_size = 1000
+        self._names = NameRegistry(self._folder_names)
+        self._contents = ContentIndex(self._list_folder, self.hash_kind)
         self._main_folder = main_folder
         self._auth = auth
+        self._jobs = 1  # Files processed at the same time, see `bulk`
+        self._session = get_session("dropbox", max(1, self.parallel_chunks))
+        self._tokens = TokenCache(get_data_dir() / "tokens.json")
+        self._token_key = self._tokens.key(
+            "dropbox", auth.token, auth.app_key, auth.app_secret
+        )
+        access_token, expires_at = self._access_token()
         self.app: dropbox.Dropbox = dropbox.Dropbox(
+            oauth2_access_token=access_token,
+            # The sdk compares the expiration with naive utc time and
+            # refreshes the token itself if the process outlives it
+            oauth2_access_token_expiration=datetime.fromtimestamp(
+                expires_at, timezone.utc
+            ).replace(tzinfo=None),
             oauth2_refresh_token=self._auth.token,
             app_key=self._auth.app_key,
             app_secret=self._auth.app_secret,
+            session=self._session,
         )
-        self.app.check_app()
+
+    def _access_token(self) -> tuple[str, float]:
+        """Returns a cached access token, or exchanges the refresh token for
+        a new one. A successful exchange also proves that the app key, app
+        secret and refresh token are valid, so `check_app` is not needed."""
+        entry = self._tokens.get(self._token_key)
+        if entry is not None:
+            return entry["access_token"], entry["verified_until"]
+
+        response = self._session.post(
+            "https://api.dropboxapi.com/oauth2/token",
+            data={"grant_type": "refresh_token", "refresh_token": self._auth.token},
+            auth=(self._auth.app_key, self._auth.app_secret),
+            timeout=60,
+        )
+        if response.status_code in (400, 401):
+            raise DropboxException(*DropboxError.auth_error)
+        response.raise_for_status()
+        result = response.json()
+
+        # Refresh a little earlier, so a token does not expire mid-request
+        expires_at = time.time() + int(result["expires_in"]) - 300
+        self._tokens.save(
+            self._token_key,
+            {"access_token": result["access_token"], "verified_until": expires_at},
+        )
+        return result["access_token"], expires_at
+
+    @dropbox_api_error
+    def download_file(
+        self,
+        path: Path,
+        local_path: Path,
+        segments: int = 1,
+        min_segment_size: int = 8 * 1024 * 1024,
+        size: Optional[int] = None,
+    ) -> None:
+        link = self.app.files_get_temporary_link(path.as_posix())
+        ensure_pool_size("dropbox", self._jobs * segments)
+        # The link comes with the current size of the file, so segments are
+        # planned without probing. It is preferred to `size`, which was saved
+        # in the cfl and is out of date if the file has been replaced since
+        download_url(
+            self._session,
+            link.link,
+            local_path,
+            size=link.metadata.size,
+            segments=segments,
+            min_segment_size=min_segment_size,
+            version=link.metadata.rev,
+        )
+
+    @property
+    def chunk_size(self) -> int:
+        """Size of the next chunk of an upload session, see `ChunkSizer`"""
+        return self._chunks.size
 
     @dropbox_api_error
-    def download_file(self, path: Path, local_path: Path) -> None:
-        self.app.files_download_to_file(local_path.as_posix(), path.as_posix())
+    def upload_file(
+        self, local_path: Path, path: Path, overwrite: bool = False
+    ) -> CloudObj:
+        key = self._journal.key(local_path, path)
+        if overwrite:
+            filename = self._names.reserve_exact(path)
+        else:
+            filename = self._names.reserve(path)
+        path = path.with_name(filename)
+        mode = WriteMode.overwrite if overwrite else WriteMode.add
+        try:
+            metadata = self._upload(local_path, path, key, mode)
+        except BaseException:
+            self._names.release(path)
+            raise
+        self._names.commit(path)
+        self._contents.add(local_path, path)
+        return _file_obj(metadata)
 
     @dropbox_api_error
-    def upload_file(self, local_path: Path, path: Path) -> str:
+    def copy_existing(self, local_path: Path, path: Path) -> Optional[CloudObj]:
+        source = self._contents.find(local_path, path.parent)
+        if source is None:
+            return None
+
+        filename = self._names.reserve(path)
+        path = path.with_name(filename)
         try:
-            self.app.files_get_metadata(str(path))
-        except ApiError:
-            raise ApiError(*DropboxError.path_not_found_error, None, None)
+            result = self.app.files_copy_v2(
+                (path.parent / source).as_posix(), path.as_posix()
+            )
+        except BaseException:
+            self._names.release(path)
+            raise
+        self._names.commit(path)
+        if result.metadata.content_hash != self._contents.digest(local_path):
+            # The source was changed after its folder was listed,
+            # so the file is uploaded instead of the copy
+            self._contents.forget(path.parent)
+            self.remove_file(path)
+            return None
+        return _file_obj(result.metadata)
+
+    def _upload(
+        self, local_path: Path, path: Path, key: str, mode: WriteMode
+    ) -> FileMetadata:
+        size = os.path.getsize(local_path)
+        if size <= self.small_file_threshold:
+            with open(local_path, "rb") as file:
+                return self.app.files_upload(file.read(), path.as_posix(), mode)
+
+        entry = self._journal.get(key)
+        if self.parallel_chunks > 1 and size > self.chunk_size:
+            metadata = self._upload_concurrent_session(
+                local_path, path, size, key, entry, mode
+            )
+        else:
+            metadata = self._upload_session(local_path, path, size, key, entry, mode)
+        self._journal.remove(key)
+        return metadata
 
-        filename = os.path.basename(path)
-        files = [file.name for file in self.get_all_files(path.parent)]
-        if filename in files:
-            filename = generate_new_name(busy=files, default=filename)
+    def _start_session(self, key: str, chunk_size: Optional[int] = None) -> str:
+        """Starts a concurrent session with chunks of chunk_size if it is
+        given, otherwise a sequential one"""
+        concurrent = chunk_size is not None
+        session_type = UploadSessionType.concurrent if concurrent else None
+        started = time.monotonic()
+        session_id = self.app.files_upload_session_start(
+            b"", session_type=session_type
+        ).session_id
+        # The request carries no data, so its time is the latency
+        self._chunks.latency(time.monotonic() - started)
+        if concurrent:
+            entry = {"session_id": session_id, "chunk_size": chunk_size}
+            self._journal.save(key, {**entry, "type": "concurrent", "chunks": []})
+        else:
+            entry = {"session_id": session_id, "offset": 0}
+            self._journal.save(key, {**entry, "type": "sequential"})
+        return session_id
 
-        upload_session = self.app.files_upload_session_start(b"")
-        cursor = UploadSessionCursor(session_id=upload_session.session_id, offset=0)
+    def _upload_session(
+        self,
+        local_path: Path,
+        path: Path,
+        size: int,
+        key: str,
+        entry: dict | None,
+        mode: WriteMode,
+    ) -> FileMetadata:
+        """Uploads a file chunk by chunk. Each confirmed offset is saved to
+        the journal, so an interrupted upload continues where it stopped."""
+        if entry is not None and entry["type"] == "sequential":
+            cursor = UploadSessionCursor(entry["session_id"], entry["offset"])
+        else:
+            entry = None
+            cursor = UploadSessionCursor(self._start_session(key), offset=0)
+
+        failures = 0
         with open(local_path, "rb") as file:
+            file.seek(cursor.offset)
+            # The size of every chunk is chosen from the speed of the previous ones
             while (data := file.read(self.chunk_size)) != b"":
-                self.app.files_upload_session_append_v2(data, cursor)
+                close = cursor.offset + len(data) >= size
+                try:
+                    self._append(data, cursor, close)
+                except (ConnectionError, Timeout):
+                    # A smaller chunk is sent again from the same offset.
+                    # If the dropped one has arrived, the offset is corrected
+                    failures += 1
+                    if failures >= CHUNK_ATTEMPTS:
+                        raise
+                    file.seek(cursor.offset)
+                    continue
+                except ApiError as er:
+                    if (offset := _correct_offset(er)) is not None:
+                        cursor.offset = offset
+                    elif entry is not None and _session_lost(er):
+                        entry = None
+                        cursor = UploadSessionCursor(self._start_session(key), 0)
+                    else:
+                        raise
+                    file.seek(cursor.offset)
+                    continue
+                failures = 0
                 cursor.offset += len(data)
+                self._journal.save(
+                    key,
+                    {
+                        "type": "sequential",
+                        "session_id": cursor.session_id,
+                        "offset": cursor.offset,
+                    },
+                )
+
+        return self._finish_session(cursor, path, mode)
+
+    def _upload_concurrent_session(
+        self,
+        local_path: Path,
+        path: Path,
+        size: int,
+        key: str,
+        entry: dict | None,
+        mode: WriteMode,
+    ) -> FileMetadata:
+        """Uploads chunks of one file in parallel. At most `parallel_chunks`
+        chunks are read into memory at the same time. Uploaded chunks are
+        saved to the journal and skipped when the upload is continued.
 
-        commit = CommitInfo(path=path.as_posix())
-        self.app.files_upload_session_finish(b"", cursor, commit)
-        return filename
+        The chunk size is chosen when the session starts and is kept
+        until it is finished, because the offsets of the chunks depend on it."""
+        if entry is not None and entry["type"] == "concurrent":
+            session_id = entry["session_id"]
+            try:
+                self._append_concurrent(local_path, size, key, entry)
+            except ApiError as er:
+                if not _session_lost(er):
+                    raise
+                session_id = self._start_session(key, self.chunk_size)
+                self._append_concurrent(local_path, size, key, self._journal.get(key))
+        else:
+            session_id = self._start_session(key, self.chunk_size)
+            self._append_concurrent(local_path, size, key, self._journal.get(key))
+
+        cursor = UploadSessionCursor(session_id, offset=size)
+        return self._finish_session(cursor, path, mode)
+
+    def _append_concurrent(
+        self, local_path: Path, size: int, key: str, entry: dict
+    ) -> None:
+        session_id = entry["session_id"]
+        chunk_size = entry["chunk_size"]
+        done = set(entry["chunks"])
+        # Every chunk except the last one must be a multiple of 4 MiB
+        last_offset = (size - 1) // chunk_size * chunk_size
+
+        def save(offset: int):
+            done.add(offset)
+            self._journal.save(key, {**entry, "chunks": sorted(done)})
+
+        with open(local_path, "rb") as file:
+            with ThreadPoolExecutor(max_workers=self.parallel_chunks) as pool:
+                pending: dict[Future, int] = {}
+                for offset in range(0, last_offset, chunk_size):
+                    if offset in done:
+                        continue
+                    if len(pending) >= self.parallel_chunks:
+                        finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            future.result()
+                            save(pending.pop(future))
+                    file.seek(offset)
+                    data = file.read(chunk_size)
+                    cursor = UploadSessionCursor(session_id=session_id, offset=offset)
+                    future = pool.submit(self._append, data, cursor)
+                    pending[future] = offset
+                for future in list(pending):
+                    future.result()
+                    save(pending.pop(future))
+
+            if last_offset not in done:
+                file.seek(last_offset)
+                cursor = UploadSessionCursor(session_id=session_id, offset=last_offset)
+                self._append(file.read(), cursor, close=True)
+                save(last_offset)
+
+    def _append(
+        self, data: bytes, cursor: UploadSessionCursor, close: bool = False
+    ) -> None:
+        """Appends a chunk to an upload session and records how long it took"""
+        started = time.monotonic()
+        try:
+            self.app.files_upload_session_append_v2(data, cursor, close=close)
+        except (ConnectionError, Timeout):
+            self._chunks.failed()
+            raise
+        self._chunks.sent(len(data), time.monotonic() - started)
+
+    def _finish_session(
+        self, cursor: UploadSessionCursor, path: Path, mode: WriteMode
+    ) -> FileMetadata:
+        commit = CommitInfo(path=path.as_posix(), mode=mode)
+        if self._batcher is not None:
+            return self._batcher.finish(cursor, commit)
+        return self.app.files_upload_session_finish(b"", cursor, commit)
+
+    def use_index(self, index: RemoteIndex) -> None:
+        self._names.use_index(index)
+
+    def forget_cache(self) -> None:
+        self._names.clear()
+        self._contents.clear()
+
+    @contextmanager
+    def bulk(self, jobs: int = 1) -> Iterator[None]:
+        self._batcher = FinishBatcher(self.app, max(1, min(jobs, 1000)))
+        self._jobs = max(1, jobs)
+        # Every file may upload several chunks at the same time
+        ensure_pool_size("dropbox", self._jobs * max(1, self.parallel_chunks))
+        try:
+            yield
+        finally:
+            self._batcher.flush()
+            self._batcher = None
+            self._jobs = 1
+
+    def _folder_names(self, folder: Path) -> list[str]:
+        try:
+            return [file.name for file in self._list_folder(folder)]
+        except ApiError as er:
+            if isinstance(er.error, ListFolderError) and er.error.is_path():
+                raise DropboxException(*DropboxError.path_not_found_error)
+            raise
 
     @dropbox_api_error
-    def get_all_files(self, remote_path: Path) -> list[Metadata]:
-        files = []
-        for cloud_obj in self.app.files_list_folder(remote_path.as_posix()).entries:
-            if isinstance(cloud_obj, FileMetadata):
-                files.append(
-                    CloudObj(
-                        name=cloud_obj.name,
-                        size=cloud_obj.size,
-                        is_directory=False,
-                        modifed=cloud_obj.server_modified,
-                    )
-                )
-            elif isinstance(cloud_obj, FolderMetadata):
-                files.append(
-                    CloudObj(
-                        name=cloud_obj.name,
+    def get_all_files(
+        self,
+        remote_path: Path,
+        page_size: int = 1000,
+        recursive: bool = False,
+        jobs: int = 4,
+    ) -> Iterator[CloudObj]:
+        # Dropbox lists the whole tree itself, so jobs is not needed
+        yield from self._list_folder(remote_path, page_size, recursive)
+
+    def _list_folder(
+        self, remote_path: Path, page_size: int = 1000, recursive: bool = False
+    ) -> Iterator[CloudObj]:
+        # Dropbox returns at most 2000 entries per request
+        result = self.app.files_list_folder(
+            remote_path.as_posix(),
+            recursive=recursive,
+            limit=min(max(1, page_size), 2000),
+        )
+        for _, obj in self._changes(result, remote_path, []):
+            yield obj
+
+    @dropbox_api_error
+    def refresh_index(
+        self, index: RemoteIndex, full: bool = False, jobs: int = 4
+    ) -> int:
+        cursor = [index.cursor]
+        result = None
+        if cursor[0] is not None and not full:
+            try:
+                result = self.app.files_list_folder_continue(cursor[0])
+            except ApiError as er:
+                # The cursor has expired, Dropbox asks to list everything again
+                error = er.error
+                if not (
+                    isinstance(error, ListFolderContinueError) and error.is_reset()
+                ):
+                    raise
+
+        reset = result is None
+        if reset:
+            result = self.app.files_list_folder(
+                index.root.as_posix(), recursive=True, limit=2000
+            )
+        changes = self._changes(result, index.root, cursor)
+        return index.update(changes, cursor=lambda: cursor[0], reset=reset)
+
+    def _changes(
+        self, result: ListFolderResult, remote_path: Path, cursor: list
+    ) -> Iterator[Change]:
+        """Entries of all pages of a listing, starting from its first page.
+        The cursor of the last read page is stored in `cursor[0]`.
+
+        Changes are keyed on `path_lower`, because Dropbox paths are not case
+        sensitive and deletions may be reported in a different case. The
+        objects keep `path_display`."""
+        # A recursive listing also contains the folder itself
+        root = remote_path.as_posix().lower().rstrip("/")
+        while True:
+            for entry in result.entries:
+                if isinstance(entry, DeletedMetadata):
+                    yield entry.path_lower, None
+                elif isinstance(entry, FileMetadata):
+                    yield entry.path_lower, _file_obj(entry)
+                elif isinstance(entry, FolderMetadata) and entry.path_lower != root:
+                    yield entry.path_lower, CloudObj(
+                        name=entry.name,
                         size=None,
                         is_directory=True,
                         modifed=None,
+                        path=entry.path_display,
                     )
-                )
-        return files
+            cursor[:] = [result.cursor]
+            if not result.has_more:
+                return
+            result = self.app.files_list_folder_continue(result.cursor)
+
+    @dropbox_api_error
+    def exists(self, path: Path) -> bool:
+        # Dropbox has no metadata for the root folder
+        if path.as_posix() in ("/", ""):
+            return True
+        try:
+            self.app.files_get_metadata(path.as_posix())
+        except ApiError as er:
+            error = er.error
+            if (
+                isinstance(error, GetMetadataError)
+                and error.is_path()
+                and error.get_path().is_not_found()
+            ):
+                return False
+            raise
+        return True
 
     @dropbox_api_error
     def remove_file(self, path: Path):
         self.app.files_delete(path.as_posix())
+        self._names.release(path)
+
+    @dropbox_api_error
+    def remove_files(
+        self, paths: list[Path], jobs: int = 1
+    ) -> list[tuple[Path, FcloudException]]:
+        errors = []
+        for i in range(0, len(paths), self.delete_batch_size):
+            batch = paths[i : i + self.delete_batch_size]
+            try:
+                launch = self.app.files_delete_batch(
+                    [DeleteArg(path.as_posix()) for path in batch]
+                )
+                result = self._wait_delete_batch(launch)
+            except ApiError as er:
+                title, message = DropboxError.batch_error
+                error = DropboxException(title, message.format(er.error))
+                errors.extend((path, error) for path in batch)
+                continue
+
+            for path, entry in zip(batch, result.entries):
+                if not entry.is_failure():
+                    continue
+                failure = entry.get_failure()
+                if (
+                    failure.is_path_lookup()
+                    and failure.get_path_lookup().is_not_found()
+                ):
+                    # Already removed, for example by a previous attempt
+                    continue
+                title, message = DropboxError.batch_error
+                errors.append((path, DropboxException(title, message.format(failure))))
+
+        failed = {path for path, _ in errors}
+        for path in paths:
+            if path not in failed:
+                self._names.release(path)
+        return errors
+
+    def _wait_delete_batch(self, launch: DeleteBatchLaunch) -> DeleteBatchResult:
+        if launch.is_complete():
+            return launch.get_complete()
+
+        delay = 0.25
+        while True:
+            status = self.app.files_delete_batch_check(launch.get_async_job_id())
+            if status.is_complete():
+                return status.get_complete()
+            elif status.is_failed():
+                raise ApiError(None, status.get_failed(), None, None)
+            time.sleep(delay)
+            delay = min(delay * 2, 2)
 
     @dropbox_api_error
     def info(self, path: Path) -> dict:
@@ -57,6 +57,11 @@ class DropboxError(DriverError):
         "The requested resource (file or folder) was not found in the cloud.",
     )
 
+    batch_error = (
+        "Batch operation error",
+        "Dropbox could not complete the operation for this file. Details: {}",
+    )
+
 
 class DropboxException(DriverException):
     pass
@@ -17,3 +17,20 @@ class DropboxAuth:
     token: str
     app_secret: str
     app_key: str
+    # Optional upload settings from the [DROPBOX] section
+    chunk_size: int = 4  # MiB, size of the first chunk, a multiple of 4 MiB
+    adaptive_chunks: bool = True  # Chunk size follows the measured speed
+    min_chunk_size: int = 4  # MiB, bounds of the adaptive chunk size
+    max_chunk_size: int = 64  # MiB, at most 148
+    parallel_chunks: int = 1  # Chunks of one file uploaded at the same time
+    small_file_threshold: int = 8  # MiB, smaller files are sent in one request
+
+    def __post_init__(self):
+        self.chunk_size = max(4, int(self.chunk_size) // 4 * 4)
+        # Values of the config are strings
+        adaptive = str(self.adaptive_chunks).strip().lower()
+        self.adaptive_chunks = adaptive not in ("false", "0", "no", "off")
+        self.min_chunk_size = max(4, int(self.min_chunk_size) // 4 * 4)
+        self.max_chunk_size = min(max(4, int(self.max_chunk_size) // 4 * 4), 148)
+        self.parallel_chunks = max(1, int(self.parallel_chunks))
+        self.small_file_threshold = min(max(0, int(self.small_file_threshold)), 148)
@@ -0,0 +1,120 @@
+import os
+from pathlib import Path
+from typing import Any
+from typing import Iterator
+from typing import Optional
+
+from .base import CloudProtocol
+from ..models.settings import CloudObj
+from ..utils.index import RemoteIndex
+from ..utils import daemon
+from ..exceptions.daemon_errors import DaemonError
+from ..exceptions.exceptions import FcloudException
+
+
+class RemoteDriver(CloudProtocol):
+    """Forwards the calls of driver methods to a running daemon (see
+    `fcloud daemon`), which keeps an authenticated driver and its
+    connections. Local paths are made absolute, because the daemon
+    runs in another working directory.
+    """
+
+    def __init__(self, path: Path, status: dict):
+        """
+        Args:
+            path (Path): Socket of the daemon
+            status (dict): Status returned by the daemon
+        """
+        self._path = path
+        self.hash_kind = status["hash_kind"]
+
+    @classmethod
+    def connect(cls, path: Path) -> Optional["RemoteDriver"]:
+        """Returns a driver if the daemon is running, otherwise None"""
+        if not path.exists():
+            return None
+        try:
+            status = daemon.request(path, "status", timeout=daemon.STATUS_TIMEOUT)
+            return cls(path, status)
+        except (OSError, ValueError):
+            return None
+
+    def download_file(
+        self,
+        path: Path,
+        local_path: Path,
+        segments: int = 1,
+        min_segment_size: int = 8 * 1024 * 1024,
+        size: Optional[int] = None,
+    ) -> None:
+        self._call(
+            "download_file",
+            path,
+            _absolute(local_path),
+            segments,
+            min_segment_size,
+            size,
+        )
+
+    def upload_file(
+        self, local_path: Path, path: Path, overwrite: bool = False
+    ) -> CloudObj:
+        return self._call("upload_file", _absolute(local_path), path, overwrite)
+
+    def copy_existing(self, local_path: Path, path: Path) -> Optional[CloudObj]:
+        return self._call("copy_existing", _absolute(local_path), path)
+
+    def get_all_files(
+        self,
+        remote_path: Path,
+        page_size: int = 1000,
+        recursive: bool = False,
+        jobs: int = 4,
+    ) -> Iterator[CloudObj]:
+        try:
+            with daemon.connect(self._path) as client:
+                file = client.makefile("rwb")
+                args = [remote_path, page_size, recursive, jobs]
+                daemon.send(
+                    file, {"method": "get_all_files", "args": daemon.encode(args)}
+                )
+                while "done" not in (response := daemon.receive(file)):
+                    if "error" in response:
+                        raise daemon.decode(response["error"])
+                    yield daemon.decode(response["item"])
+        except (OSError, ValueError) as err:
+            title, message = DaemonError.connection_error
+            raise FcloudException(title, message.format(err))
+
+    def exists(self, path: Path) -> bool:
+        return self._call("exists", path)
+
+    def create_folder(self, path: Path) -> None:
+        self._call("create_folder", path)
+
+    def remove_file(self, path: Path) -> None:
+        self._call("remove_file", path)
+
+    def remove_files(
+        self, paths: list[Path], jobs: int = 1
+    ) -> list[tuple[Path, FcloudException]]:
+        return [tuple(x) for x in self._call("remove_files", paths, jobs)]
+
+    def refresh_index(
+        self, index: RemoteIndex, full: bool = False, jobs: int = 4
+    ) -> int:
+        return self._call("refresh_index", index, full, jobs)
+
+    def info(self, path: Path) -> dict:
+        return self._call("info", path)
+
+    def _call(self, method: str, *args) -> Any:
+        try:
+            return daemon.request(self._path, method, args)
+        except (OSError, ValueError) as err:
+            title, message = DaemonError.connection_error
+            raise FcloudException(title, message.format(err))
+
+
+def _absolute(path: Path) -> Path:
+    return Path(os.path.abspath(path))
@@ -0,0 +1,95 @@
+import asyncio
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Optional
+from typing import AsyncIterator
+from itertools import islice
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+from .base import CloudProtocol
+from .base import AsyncCloudProtocol
+from ..models.settings import CloudObj
+from ..exceptions.exceptions import FcloudException
+
+
+class ThreadedDriver(AsyncCloudProtocol):
+    """Runs the methods of a synchronous driver on a pool of threads, so
+    that it can be awaited like an asynchronous one. Used for clouds whose
+    library has no asynchronous client, like Dropbox, and for the daemon.
+    """
+
+    def __init__(self, driver: CloudProtocol, jobs: int = 1):
+        """
+        Args:
+            driver (CloudProtocol): Driver whose methods are run
+            jobs (int, optional): Number of threads. Defaults to 1.
+        """
+        self.driver = driver
+        self.hash_kind = driver.hash_kind
+        self._pool = ThreadPoolExecutor(max_workers=max(1, int(jobs)))
+
+    async def download_file(
+        self,
+        path: Path,
+        local_path: Path,
+        segments: int = 1,
+        min_segment_size: int = 8 * 1024 * 1024,
+        size: Optional[int] = None,
+    ) -> None:
+        await self._run(
+            self.driver.download_file,
+            path,
+            local_path,
+            segments,
+            min_segment_size,
+            size,
+        )
+
+    async def upload_file(
+        self, local_path: Path, path: Path, overwrite: bool = False
+    ) -> CloudObj:
+        return await self._run(self.driver.upload_file, local_path, path, overwrite)
+
+    async def copy_existing(self, local_path: Path, path: Path) -> Optional[CloudObj]:
+        return await self._run(self.driver.copy_existing, local_path, path)
+
+    async def get_all_files(
+        self,
+        remote_path: Path,
+        page_size: int = 1000,
+        recursive: bool = False,
+        jobs: int = 4,
+    ) -> AsyncIterator[CloudObj]:
+        files = self.driver.get_all_files(remote_path, page_size, recursive, jobs)
+
+        def next_page() -> list[CloudObj]:
+            # A page of objects is taken per call, not a single object
+            return list(islice(files, max(1, page_size)))
+
+        try:
+            while page := await self._run(next_page):
+                for obj in page:
+                    yield obj
+        finally:
+            files.close()
+
+    async def remove_file(self, path: Path) -> None:
+        await self._run(self.driver.remove_file, path)
+
+    async def remove_files(
+        self, paths: list[Path], jobs: int = 1
+    ) -> list[tuple[Path, FcloudException]]:
+        # Drivers may delete the files with batch requests
+        return await self._run(self.driver.remove_files, paths, jobs)
+
+    async def info(self, path: Path) -> dict:
+        return await self._run(self.driver.info, path)
+
+    async def close(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, func: Callable, *args) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, partial(func, *args))
@@ -0,0 +1,333 @@
+import os
+import json
+import threading
+from pathlib import Path
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from ..utils.limiter import get_limiter
+from ..utils.limiter import DOWNLOAD
+
+PART_SUFFIX = ".part"
+SEGMENTS_SUFFIX = ".segments"
+# File with the version of the remote file that a `.part` file belongs to
+SOURCE_SUFFIX = ".source"
+
+
+class _SourceChanged(requests.HTTPError):
+    """The remote file is not the one the `.part` file was downloaded from"""
+
+
+def part_path(local_path: Path) -> Path:
+    """Path of the file into which local_path is downloaded"""
+    return local_path.with_name(local_path.name + PART_SUFFIX)
+
+
+def download_url(
+    session: requests.Session,
+    url: str,
+    local_path: Path,
+    size: Optional[int] = None,
+    segments: int = 1,
+    min_segment_size: int = 8 * 1024 * 1024,
+    chunk_size: int = 1024 * 1024,
+    attempts: int = 3,
+    timeout: float = 60,
+    version: Optional[str] = None,
+) -> None:
+    """Downloads a file into a `.part` file next to local_path and moves it
+    into place once it is complete. If the `.part` file already exists (an
+    earlier download was interrupted), only the missing bytes are requested
+    with HTTP Range requests.
+
+    A part is continued only if it belongs to the same version of the file:
+    the version, the size and the ETag (or Last-Modified) of the first
+    response are saved next to it, and the ETag is sent in `If-Range`, so
+    a server with a newer file answers with all of it. Otherwise the part
+    is thrown away and the download starts over.
+
+    Args:
+        session (requests.Session): Session used for the requests
+        url (str): Direct download link
+        local_path (Path): The path where the downloaded file is saved
+        size (int, optional): Size of the file, if it is already known
+        segments (int, optional): How many byte ranges of the file are
+          downloaded at the same time over separate connections. Defaults to 1.
+        min_segment_size (int, optional): Minimum size of one range in bytes
+        chunk_size (int, optional): Size of the blocks written to disk
+        attempts (int, optional): How many times a dropped connection is resumed
+        timeout (float, optional): Connect and read timeout in seconds
+        version (str, optional): Revision of the file in the cloud, if the
+          cloud reports one. A part of another revision is not continued.
+    """
+    part = part_path(local_path)
+    progress = _segments_path(part)
+    # Smaller blocks, so that a limited download flows evenly
+    chunk_size = get_limiter(DOWNLOAD).block_size(chunk_size)
+
+    if segments > 1 or progress.exists():
+        if size is None:
+            size = _probe_size(session, url, timeout)
+        count = min(segments, size // max(1, min_segment_size)) if size else 1
+        if size and (progress.exists() or count > 1):
+            download = _SegmentedDownload(
+                session, url, part, size, count, timeout, version
+            )
+            try:
+                _retry(lambda: download.run(chunk_size), attempts)
+            except _SourceChanged:
+                # The file was replaced after the part was started
+                _discard(part)
+                size = _probe_size(session, url, timeout) or size
+                download = _SegmentedDownload(
+                    session, url, part, size, count, timeout, version
+                )
+                _retry(lambda: download.run(chunk_size), attempts)
+            os.replace(part, local_path)
+            return
+        elif progress.exists():
+            # The preallocated part of a segmented download can't be continued
+            # by a single stream, because it already has the final size
+            _discard(part)
+
+    def download() -> None:
+        _download_part(session, url, part, chunk_size, timeout, size, version)
+
+    _retry(download, attempts)
+    os.replace(part, local_path)
+    _source_path(part).unlink(missing_ok=True)
+
+
+def _retry(func, attempts: int) -> None:
+    for attempt in range(attempts):
+        try:
+            return func()
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == attempts - 1:
+                raise
+
+
+def _segments_path(part: Path) -> Path:
+    return part.with_name(part.name + SEGMENTS_SUFFIX)
+
+
+def _source_path(part: Path) -> Path:
+    return part.with_name(part.name + SOURCE_SUFFIX)
+
+
+def _discard(part: Path) -> None:
+    """Removes a part together with the files that describe it"""
+    for path in (part, _segments_path(part), _source_path(part)):
+        path.unlink(missing_ok=True)
+
+
+def _same_source(
+    saved: dict | None, size: Optional[int], version: Optional[str]
+) -> bool:
+    """Whether a part described by `saved` belongs to the file"""
+    if saved is None or saved.get("version") != version:
+        return False
+    return size is None or saved.get("size") in (None, size)
+
+
+def _validator(response: requests.Response) -> Optional[str]:
+    """Value for `If-Range`. Weak ETags can't be used in it"""
+    etag = response.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return response.headers.get("Last-Modified")
+
+
+def _range_start(response: requests.Response) -> Optional[int]:
+    first = response.headers.get("Content-Range", "").partition(" ")[2]
+    first = first.partition("-")[0]
+    return int(first) if first.isdigit() else None
+
+
+def _load_json(path: Path) -> dict | None:
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_json(path: Path, data: dict) -> None:
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(data, file)
+
+
+def _probe_size(session: requests.Session, url: str, timeout: float) -> int | None:
+    """Size of the file, if the server supports Range requests"""
+    headers = {"Range": "bytes=0-0"}
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        total = response.headers.get("Content-Range", "").rpartition("/")[2]
+        if response.status_code == 206 and total.isdigit():
+            return int(total)
+    return None
+
+
+class _SegmentedDownload:
+    """Downloads byte ranges of one file over several connections and writes
+    them in place into a preallocated `.part` file. The progress of every
+    range is saved next to it, so an interrupted download is continued."""
+
+    def __init__(
+        self,
+        session: requests.Session,
+        url: str,
+        part: Path,
+        size: int,
+        count: int,
+        timeout: float,
+        version: Optional[str] = None,
+    ):
+        self._session = session
+        self._url = url
+        self._part = part
+        self._progress = _segments_path(part)
+        self._timeout = timeout
+        self._size = size
+        self._version = version
+        self._validator: Optional[str] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+        saved = _load_json(self._progress)
+        if (
+            saved is not None
+            and saved["size"] == size
+            and saved.get("version") == version
+            and part.exists()
+        ):
+            self._ranges: list[list[int]] = saved["ranges"]
+            self._validator = saved.get("validator")
+        else:
+            # [first byte, last byte, bytes already written]
+            self._ranges = [
+                [i * size // count, (i + 1) * size // count - 1, 0]
+                for i in range(max(1, count))
+            ]
+            with open(part, "wb") as file:
+                file.truncate(size)
+
+    def run(self, chunk_size: int) -> None:
+        self._save()
+        try:
+            with ThreadPoolExecutor(max_workers=len(self._ranges)) as pool:
+                futures = [
+                    pool.submit(self._fetch, segment, chunk_size)
+                    for segment in self._ranges
+                    if segment[0] + segment[2] <= segment[1]
+                ]
+                try:
+                    for future in futures:
+                        future.result()
+                except BaseException:
+                    self._stop.set()
+                    raise
+        finally:
+            self._save()
+        os.remove(self._progress)
+
+    def _fetch(self, segment: list[int], chunk_size: int) -> None:
+        start, end, done = segment
+        headers = {"Range": f"bytes={start + done}-{end}"}
+        if self._validator is not None:
+            headers["If-Range"] = self._validator
+        with self._session.get(
+            self._url, headers=headers, stream=True, timeout=self._timeout
+        ) as response:
+            response.raise_for_status()
+            validator = _validator(response)
+            with self._lock:
+                if response.status_code != 206 and self._validator is not None:
+                    raise _SourceChanged("The file has changed")
+                if response.status_code != 206:
+                    raise requests.HTTPError(
+                        "The server does not support Range requests"
+                    )
+                if self._validator is None:
+                    self._validator = validator
+                elif validator is not None and validator != self._validator:
+                    raise _SourceChanged("The file has changed")
+
+            with open(self._part, "r+b") as file:
+                file.seek(start + done)
+                for data in response.iter_content(chunk_size):
+                    if self._stop.is_set():
+                        return
+                    file.write(data[: end + 1 - start - segment[2]])
+                    with self._lock:
+                        segment[2] = min(segment[2] + len(data), end + 1 - start)
+                    get_limiter(DOWNLOAD).consume(len(data))
+
+    def _save(self) -> None:
+        with self._lock:
+            data = {
+                "size": self._size,
+                "version": self._version,
+                "validator": self._validator,
+                "ranges": [list(x) for x in self._ranges],
+            }
+        _save_json(self._progress, data)
+
+
+def _download_part(
+    session: requests.Session,
+    url: str,
+    part: Path,
+    chunk_size: int,
+    timeout: float,
+    size: Optional[int] = None,
+    version: Optional[str] = None,
+) -> None:
+    source = _source_path(part)
+    saved = _load_json(source) if part.exists() else None
+    if part.exists() and not _same_source(saved, size, version):
+        # The part is of another version of the file or its version is unknown
+        _discard(part)
+        saved = None
+
+    offset = part.stat().st_size if part.exists() else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    if offset and saved.get("validator"):
+        headers["If-Range"] = saved["validator"]
+
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        if response.status_code == 416:
+            # The range starts at the end of the file: either the part is
+            # complete or it is larger than the file and must be downloaded again
+            total = response.headers.get("Content-Range", "").rpartition("/")[2]
+            if total == str(offset):
+                return
+            _discard(part)
+            return _download_part(
+                session, url, part, chunk_size, timeout, size, version
+            )
+
+        response.raise_for_status()
+        resumed = response.status_code == 206
+        if resumed and _range_start(response) != offset:
+            _discard(part)
+            return _download_part(
+                session, url, part, chunk_size, timeout, size, version
+            )
+        if not resumed:
+            # The whole file is sent: the part is started again
+            length = response.headers.get("Content-Length", "")
+            total = int(length) if length.isdigit() else None
+            data = {
+                "version": version,
+                "size": size if size is not None else total,
+                "validator": _validator(response),
+            }
+            _save_json(source, data)
+
+        mode = "ab" if resumed else "wb"
+        with open(part, mode) as file:
+            for data in response.iter_content(chunk_size):
+                file.write(data)
+                get_limiter(DOWNLOAD).consume(len(data))
@@ -0,0 +1,169 @@
+import os
+import sys
+import atexit
+import socket
+import threading
+from typing import Iterator
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+
+from ..utils.limiter import get_limiter
+from ..utils.limiter import UPLOAD
+
+# Connections kept open to one host. Pools only grow, see `get_session`
+DEFAULT_POOL_SIZE = 10
+# Hosts with their own pool in one session (api, content, download hosts)
+POOLS_PER_SESSION = 10
+# Connect and read timeouts of requests that set no timeout themselves
+DEFAULT_TIMEOUT = (10, 60)
+# Set this environment variable to print statistics of connections on exit
+STATS_ENV = "FCLOUD_HTTP_STATS"
+# Request bodies of this size and larger are sent through the upload limiter
+LIMITED_BODY = 64 * 1024
+
+_sessions: dict[str, requests.Session] = {}
+_lock = threading.Lock()
+
+
+class _PoolAdapter(HTTPAdapter):
+    """Adapter with a fixed number of kept connections per host, a default
+    timeout and TCP keep-alive, so idle connections of long-running
+    commands are not silently dropped by routers."""
+
+    def __init__(self, size: int, counts: tuple[int, int] = (0, 0)):
+        """
+        Args:
+            size (int): Connections kept open to one host
+            counts (tuple[int, int], optional): Requests and connections of
+              the adapter this one replaces
+        """
+        self.size = size
+        self._counts = counts
+        super().__init__(pool_connections=POOLS_PER_SESSION, pool_maxsize=size)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        pool_kwargs.setdefault(
+            "socket_options",
+            HTTPConnection.default_socket_options
+            + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)],
+        )
+        super().init_poolmanager(connections, maxsize, block, **pool_kwargs)
+
+    def send(self, request, timeout=None, **kwargs):
+        if timeout is None:
+            timeout = DEFAULT_TIMEOUT
+        body = request.body
+        if hasattr(body, "read") or (
+            isinstance(body, bytes) and len(body) >= LIMITED_BODY
+        ):
+            # Raises here if the limit in the config can't be parsed
+            get_limiter(UPLOAD)
+            request.body = _limited_body(body)
+        return super().send(request, timeout=timeout, **kwargs)
+
+    def counts(self) -> tuple[int, int]:
+        """Number of sent requests and of opened connections"""
+        sent, opened = self._counts
+        pools = self.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                sent += pool.num_requests
+                opened += pool.num_connections
+        return sent, opened
+
+
+def get_session(backend: str, size: int = DEFAULT_POOL_SIZE) -> requests.Session:
+    """Returns the session shared by everything that talks to a backend,
+    so connections (and their TLS handshakes) are reused across requests,
+    threads and the driver's own client library.
+
+    Args:
+        backend (str): Name of the cloud
+        size (int, optional): Connections that may be used at the same
+          time. If the pool of the session is smaller, it is enlarged.
+          Defaults to DEFAULT_POOL_SIZE.
+    """
+    with _lock:
+        session = _sessions.get(backend)
+        if session is None:
+            session = _sessions[backend] = requests.Session()
+            _mount(session, max(size, DEFAULT_POOL_SIZE))
+            if len(_sessions) == 1 and os.environ.get(STATS_ENV):
+                atexit.register(_print_stats)
+        elif _adapter(session).size < size:
+            # Connections in use are closed when they are returned
+            # to the old pool, idle ones are closed at once
+            old = _adapter(session)
+            _mount(session, size, old.counts())
+            old.close()
+    return session
+
+
+def ensure_pool_size(backend: str, size: int) -> None:
+    """Enlarges the pool of the shared session of a backend, so that
+    `size` requests can use their own connections at the same time"""
+    get_session(backend, size)
+
+
+def stats() -> dict[str, dict[str, int]]:
+    """Statistics of the connections of every backend used by this process"""
+    with _lock:
+        sessions = dict(_sessions)
+    result = {}
+    for backend, session in sessions.items():
+        adapter = _adapter(session)
+        sent, opened = adapter.counts()
+        result[backend] = {
+            "pool_size": adapter.size,
+            "requests": sent,
+            "connections": opened,
+            "reused": max(0, sent - opened),
+        }
+    return result
+
+
+def _mount(session: requests.Session, size: int, counts=(0, 0)) -> None:
+    adapter = _PoolAdapter(size, counts)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+
+def _adapter(session: requests.Session) -> _PoolAdapter:
+    return session.adapters["https://"]
+
+
+def _limited_body(body) -> Iterator[bytes]:
+    """Yields a request body in blocks taken from the upload limiter. It is
+    looked up for every block, so a limit changed during a long upload
+    applies to its remaining blocks. The Content-Length of the request is
+    kept, so the body is not sent in chunked encoding."""
+    if isinstance(body, bytes):
+        view = memoryview(body)
+        offset = 0
+        while offset < len(view):
+            limiter = get_limiter(UPLOAD)
+            block = view[offset : offset + limiter.block_size()]
+            limiter.consume(len(block))
+            offset += len(block)
+            yield block
+        return
+
+    while True:
+        limiter = get_limiter(UPLOAD)
+        block = body.read(limiter.block_size())
+        if not block:
+            return
+        limiter.consume(len(block))
+        yield block
+
+
+def _print_stats() -> None:
+    for backend, data in stats().items():
+        print(
+            f"{backend}: {data['requests']} requests over {data['connections']}"
+            f" connections ({data['reused']} reused), pool size {data['pool_size']}",
+            file=sys.stderr,
+        )
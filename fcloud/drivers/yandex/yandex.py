@@ -1,24 +1,56 @@
 import os
+import time
+import asyncio
+import inspect
+import requests
 from yadisk import Client
+from yadisk import AsyncClient
+from yadisk.sessions.requests_session import RequestsSession
 
 from pathlib import Path
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
 from typing import Callable
+from typing import Iterator
+from typing import AsyncIterator
+from typing import Optional
 from functools import wraps
+from contextlib import contextmanager
 
 from yadisk.exceptions import YaDiskConnectionError
 from yadisk.exceptions import RequestTimeoutError
 from yadisk.exceptions import PathNotFoundError
 from yadisk.exceptions import UnauthorizedError
 from yadisk.exceptions import ForbiddenError
+from yadisk.exceptions import DirectoryExistsError
+from yadisk.exceptions import ParentNotFoundError
 
 from .errors import YandexException
 from .errors import YandexError
 
 from .models import YandexAuth
 from ..base import CloudProtocol
+from ..base import AsyncCloudProtocol
+from ..transfer import download_url
+from ..transfer import part_path
+from ..transport import get_session
+from ..transport import ensure_pool_size
+from ..transport import DEFAULT_POOL_SIZE
 from ...models.settings import CloudObj
-from ...utils.other import generate_new_name
+from ...utils.registry import NameRegistry
+from ...utils.registry import ContentIndex
+from ...utils.pool import walk_in_pool
+from ...utils.pool import walk_in_loop
+from ...utils.index import Change
+from ...utils.index import RemoteIndex
+from ...utils.tokens import TokenCache
+from ...utils.limiter import get_limiter
+from ...utils.limiter import UPLOAD
+from ...utils.limiter import DOWNLOAD
+from ...utils.config import get_data_dir
 from ...exceptions.file_errors import FileError
+from ...exceptions.exceptions import FcloudException
 
 
 def yandex_api_error(func: Callable):
@@ -26,86 +58,481 @@ def yandex_api_error(func: Callable):
       Dropbox api and prints them to the user
 
     Args:
-        func (Callable): driver method
+        func (Callable): driver method. Errors of generator methods
+          are caught while iterating over them
     """
 
+    if inspect.isgeneratorfunction(func):
+
+        @wraps(func)
+        def inner_generator(*args, **kwargs):
+            with _yandex_errors():
+                yield from func(*args, **kwargs)
+
+        return inner_generator
+
+    if inspect.isasyncgenfunction(func):
+
+        @wraps(func)
+        async def inner_async_generator(*args, **kwargs):
+            with _yandex_errors():
+                async for item in func(*args, **kwargs):
+                    yield item
+
+        return inner_async_generator
+
+    if inspect.iscoroutinefunction(func):
+
+        @wraps(func)
+        async def inner_coroutine(*args, **kwargs):
+            with _yandex_errors():
+                return await func(*args, **kwargs)
+
+        return inner_coroutine
+
     @wraps(func)
     def inner(*args, **kwargs):
-        try:
+        with _yandex_errors():
             return func(*args, **kwargs)
-        except YaDiskConnectionError:
-            raise YandexException(*YandexError.connection_error)
-        except RequestTimeoutError:
-            raise YandexException(*YandexError.timed_out_error)
-        except PathNotFoundError:
-            raise YandexException(*YandexError.path_not_found_error)
-        except UnauthorizedError:
-            raise YandexException(*YandexError.invalid_token_error)
-        except ForbiddenError:
-            raise YandexException(*YandexError.access_denied)
-        except FileNotFoundError:
-            raise YandexException(*FileError.not_exists_error)
-        except PermissionError:
-            raise YandexException(*FileError.perrmission_denied)
-        except Exception as er:
-            title, message = YandexError.uknown_error
-            raise YandexException(title.format(er), message.format(er))
 
     return inner
 
 
+@contextmanager
+def _yandex_errors() -> Iterator[None]:
+    try:
+        yield
+    except FcloudException:
+        raise
+    except YaDiskConnectionError:
+        raise YandexException(*YandexError.connection_error)
+    except RequestTimeoutError:
+        raise YandexException(*YandexError.timed_out_error)
+    except PathNotFoundError:
+        raise YandexException(*YandexError.path_not_found_error)
+    except UnauthorizedError:
+        raise YandexException(*YandexError.invalid_token_error)
+    except ForbiddenError:
+        raise YandexException(*YandexError.access_denied)
+    except FileNotFoundError:
+        raise YandexException(*FileError.not_exists_error)
+    except PermissionError:
+        raise YandexException(*FileError.perrmission_denied)
+    except requests.ConnectionError:
+        raise YandexException(*YandexError.connection_error)
+    except Exception as er:
+        title, message = YandexError.uknown_error
+        raise YandexException(title.format(er), message.format(er))
+
+
+# Fields of the metadata of an uploaded file, see `_uploaded_obj`
+FILE_FIELDS = ["name", "path", "size", "md5", "modified", "revision"]
+# Fields of the objects of a listing, see `_resource_obj`
+LIST_FIELDS = ["name", "path", "type", "size", "modified", "md5"]
+
+
+def _resource_obj(file) -> CloudObj:
+    return CloudObj(
+        name=file.name,
+        size=file.size,
+        is_directory=file.type == "dir",
+        modifed=file.modified,
+        content_hash=file.md5,
+        path=file.path.removeprefix("disk:"),
+    )
+
+
+def _uploaded_obj(metadata) -> CloudObj:
+    return CloudObj(
+        name=metadata.name,
+        size=metadata.size,
+        is_directory=False,
+        modifed=metadata.modified,
+        content_hash=metadata.md5,
+        rev=str(metadata.revision) if metadata.revision is not None else None,
+        path=metadata.path.removeprefix("disk:"),
+    )
+
+
+def _info(metadata) -> dict:
+    return {
+        "Path": metadata.path,
+        "Size": f"{metadata.size} B",
+        "Media type": metadata.media_type,
+        "Content hash": metadata.md5,
+        "Modified": metadata.modified,
+        "Antivirus status": metadata.antivirus_status,
+    }
+
+
+class _SharedSession(RequestsSession):
+    """yadisk creates a requests session for every thread, so the threads
+    of a pool open their own connections. This one uses the shared session."""
+
+    def __init__(self, session: requests.Session):
+        super().__init__()
+        self._shared = session
+
+    @property
+    def requests_session(self) -> requests.Session:
+        return self._shared
+
+    def close(self) -> None:
+        # The session is shared with other users
+        pass
+
+
 class YandexCloud(CloudProtocol):
+    hash_kind = "md5"
+
     @yandex_api_error
     def __init__(self, auth: YandexAuth, main_folder: Path):
         self._main_folder = main_folder
         self._auth = auth
-        self._app = Client(auth.client_id, auth.client_secret, auth.token)
+        self._jobs = 1  # Files processed at the same time, see `bulk`
+        self._session = get_session("yandex")
+        self._app = Client(
+            auth.client_id,
+            auth.client_secret,
+            auth.token,
+            session=_SharedSession(self._session),
+        )
+        self._names = NameRegistry(self._folder_names)
+        self._contents = ContentIndex(self._list_folder, self.hash_kind)
+        self._tokens = TokenCache(get_data_dir() / "tokens.json")
 
-        if not self._app.check_token():
-            raise UnauthorizedError
+        # Yandex tokens live for months, so a successful check is trusted
+        # for a day. A token revoked in the meantime fails on the first
+        # request with the same error as here
+        key = self._tokens.key("yandex", auth.token, auth.client_id)
+        if self._tokens.get(key) is None:
+            if not self._app.check_token():
+                raise UnauthorizedError
+            self._tokens.save(key, {"verified_until": time.time() + 24 * 60 * 60})
 
     @yandex_api_error
-    def download_file(self, path: Path, local_path: Path) -> None:
-        self._app.download(path.as_posix(), local_path.as_posix())
-
-    @yandex_api_error
-    def upload_file(self, local_path: Path, path: Path) -> str:
-        filename = os.path.basename(path)
-        if not self._app.exists(path.parent.as_posix()):
-            raise PathNotFoundError
-        files = [file.name for file in self.get_all_files(path.parent)]
-        if filename in files:
-            filename = generate_new_name(files, filename)
-        self._app.upload(
-            local_path.as_posix(), path.parent.joinpath(filename).as_posix()
+    def download_file(
+        self,
+        path: Path,
+        local_path: Path,
+        segments: int = 1,
+        min_segment_size: int = 8 * 1024 * 1024,
+        size: Optional[int] = None,
+    ) -> None:
+        link = self._app.get_download_link(path.as_posix())
+        ensure_pool_size("yandex", self._jobs * segments)
+        download_url(
+            self._session,
+            link,
+            local_path,
+            size=size,
+            segments=segments,
+            min_segment_size=min_segment_size,
         )
 
-        return filename
+    @yandex_api_error
+    def upload_file(
+        self, local_path: Path, path: Path, overwrite: bool = False
+    ) -> CloudObj:
+        if overwrite:
+            filename = self._names.reserve_exact(path)
+        else:
+            filename = self._names.reserve(path)
+        path = path.with_name(filename)
+        try:
+            self._app.upload(
+                local_path.as_posix(), path.as_posix(), overwrite=overwrite
+            )
+        except BaseException:
+            self._names.release(path)
+            raise
+        self._names.commit(path)
+        self._contents.add(local_path, path)
+        return self._file_obj(path)
 
     @yandex_api_error
-    def get_all_files(self, remote_path: Path) -> list[CloudObj]:
+    def copy_existing(self, local_path: Path, path: Path) -> Optional[CloudObj]:
+        source = self._contents.find(local_path, path.parent)
+        if source is None:
+            return None
+
+        filename = self._names.reserve(path)
+        path = path.with_name(filename)
+        try:
+            self._app.copy((path.parent / source).as_posix(), path.as_posix())
+        except BaseException:
+            self._names.release(path)
+            raise
+        self._names.commit(path)
+        obj = self._file_obj(path)
+        if obj.content_hash != self._contents.digest(local_path):
+            # The source was changed after its folder was listed,
+            # so the file is uploaded instead of the copy
+            self._contents.forget(path.parent)
+            self.remove_file(path)
+            return None
+        return obj
+
+    def use_index(self, index: RemoteIndex) -> None:
+        self._names.use_index(index)
+
+    def forget_cache(self) -> None:
+        self._names.clear()
+        self._contents.clear()
+
+    @contextmanager
+    def bulk(self, jobs: int = 1) -> Iterator[None]:
+        self._jobs = max(1, jobs)
+        ensure_pool_size("yandex", self._jobs)
+        try:
+            yield
+        finally:
+            self._jobs = 1
+
+    def asynchronous(self, jobs: int = 1) -> AsyncCloudProtocol:
+        try:
+            return AsyncYandexCloud(self, jobs)
+        except ModuleNotFoundError:
+            # The asynchronous client of yadisk needs httpx,
+            # without it the requests are sent from threads
+            return super().asynchronous(jobs)
+
+    def _file_obj(self, path: Path) -> CloudObj:
+        return _uploaded_obj(self._app.get_meta(path.as_posix(), fields=FILE_FIELDS))
+
+    def _folder_names(self, folder: Path) -> list[str]:
         return [
-            CloudObj(
-                name=file.name,
-                size=file.size,
-                is_directory=file.type == "dir",
-                modifed=file.modified,
-            )
-            for file in self._app.listdir(remote_path.as_posix())
+            file.name for file in self._app.listdir(folder.as_posix(), fields=["name"])
         ]
 
+    @yandex_api_error
+    def get_all_files(
+        self,
+        remote_path: Path,
+        page_size: int = 1000,
+        recursive: bool = False,
+        jobs: int = 4,
+    ) -> Iterator[CloudObj]:
+        if not recursive:
+            yield from self._list_folder(remote_path, page_size)
+            return
+
+        # YandexDisk lists one level per request, so the subfolders
+        # are listed breadth-first, several at the same time
+        ensure_pool_size("yandex", jobs)
+        yield from walk_in_pool(
+            lambda folder: self._list_folder(folder, page_size),
+            remote_path,
+            lambda obj: Path(obj.path) if obj.is_directory else None,
+            jobs,
+            page_size,
+        )
+
+    def _list_folder(
+        self, remote_path: Path, page_size: int = 1000
+    ) -> Iterator[CloudObj]:
+        # listdir requests the next page when the previous one is consumed
+        for file in self._app.listdir(
+            remote_path.as_posix(),
+            limit=max(1, page_size),
+            fields=LIST_FIELDS,
+        ):
+            yield _resource_obj(file)
+
+    @yandex_api_error
+    def refresh_index(
+        self, index: RemoteIndex, full: bool = False, jobs: int = 4
+    ) -> int:
+        # The cursor is the time of the last refresh. Some margin is kept
+        # for the clocks of the cloud and of this computer
+        started = datetime.now(timezone.utc) - timedelta(minutes=5)
+        cursor = None if full else index.cursor
+        # YandexDisk does not report deleted files, so the whole
+        # folder is listed again at least once a day
+        if cursor is not None and time.time() - index.updated < 24 * 60 * 60:
+            changes = self._uploaded_since(index.root, datetime.fromisoformat(cursor))
+            if changes is not None:
+                return index.update(changes, cursor=started.isoformat)
+
+        files = self.get_all_files(index.root, recursive=True, jobs=jobs)
+        return index.update(
+            ((x.path, x) for x in files), cursor=started.isoformat, reset=True
+        )
+
+    def _uploaded_since(self, root: Path, since: datetime) -> Optional[list[Change]]:
+        """Files of root uploaded after since. None if there may be more of
+        them than YandexDisk returns in the list of last uploaded files."""
+        limit = 1000
+        files = list(self._app.get_last_uploaded(limit=limit))
+        changes = []
+        for file in files:
+            if file.created < since:
+                return changes
+            obj = _resource_obj(file)
+            if root in Path(obj.path).parents:
+                changes.append((obj.path, obj))
+        return changes if len(files) < limit else None
+
+    @yandex_api_error
+    def exists(self, path: Path) -> bool:
+        return self._app.exists(path.as_posix())
+
+    @yandex_api_error
+    def create_folder(self, path: Path) -> None:
+        # YandexDisk does not create the folders of uploaded files
+        try:
+            self._app.mkdir(path.as_posix())
+        except DirectoryExistsError:
+            pass
+        except ParentNotFoundError:
+            self.create_folder(path.parent)
+            self.create_folder(path)
+
     @yandex_api_error
     def remove_file(self, path: Path) -> None:
         self._app.remove(path.as_posix())
+        self._names.release(path)
 
     @yandex_api_error
     def info(self, path: Path) -> dict:
-        metadata = self._app.get_meta(path.as_posix())
-        return {
-            "Path": metadata.path,
-            "Size": f"{metadata.size} B",
-            "Media type": metadata.media_type,
-            "Content hash": metadata.md5,
-            "Modified": metadata.modified,
-            "Antivirus status": metadata.antivirus_status,
-        }
+        return _info(self._app.get_meta(path.as_posix()))
+
+
+class AsyncYandexCloud(AsyncCloudProtocol):
+    """Sends the requests of a `YandexCloud` with the asynchronous client of
+    yadisk, so that thousands of them are awaited without a thread each.
+    Names of folders and contents of files are shared with the driver.
+    """
+
+    hash_kind = "md5"
+
+    def __init__(self, driver: YandexCloud, jobs: int = 1):
+        """
+        Args:
+            driver (YandexCloud): Authenticated driver
+            jobs (int, optional): How many requests are sent at the same time
+
+        Raises:
+            ModuleNotFoundError: httpx is not installed
+        """
+        import httpx
+        from yadisk.sessions.async_httpx_session import AsyncHTTPXSession
+
+        self._driver = driver
+        self._jobs = max(1, jobs)
+        connections = max(self._jobs, DEFAULT_POOL_SIZE)
+        session = AsyncHTTPXSession(
+            limits=httpx.Limits(
+                max_connections=connections, max_keepalive_connections=connections
+            )
+        )
+        auth = driver._auth
+        self._app = AsyncClient(
+            auth.client_id, auth.client_secret, auth.token, session=session
+        )
+
+    @yandex_api_error
+    async def download_file(
+        self,
+        path: Path,
+        local_path: Path,
+        segments: int = 1,
+        min_segment_size: int = 8 * 1024 * 1024,
+        size: Optional[int] = None,
+    ) -> None:
+        link = await self._app.get_download_link(path.as_posix())
+        part = part_path(local_path)
+        if segments > 1 or part.exists() or get_limiter(DOWNLOAD).rate > 0:
+            # Segmented and interrupted downloads are continued with range
+            # requests of the synchronous driver, which also obeys the limit
+            ensure_pool_size("yandex", self._jobs * segments)
+            await asyncio.to_thread(
+                download_url,
+                self._driver._session,
+                link,
+                local_path,
+                size=size,
+                segments=segments,
+                min_segment_size=min_segment_size,
+            )
+            return
+        await self._app.download_by_link(link, part.as_posix())
+        os.replace(part, local_path)
+
+    @yandex_api_error
+    async def upload_file(
+        self, local_path: Path, path: Path, overwrite: bool = False
+    ) -> CloudObj:
+        if get_limiter(UPLOAD).rate > 0:
+            # Requests of the shared session go through the limiter
+            return await asyncio.to_thread(
+                self._driver.upload_file, local_path, path, overwrite
+            )
+        names = self._driver._names
+        if overwrite:
+            filename = names.reserve_exact(path)
+        else:
+            # The folder is listed on first use
+            filename = await asyncio.to_thread(names.reserve, path)
+        path = path.with_name(filename)
+        try:
+            await self._app.upload(
+                local_path.as_posix(), path.as_posix(), overwrite=overwrite
+            )
+        except BaseException:
+            names.release(path)
+            raise
+        names.commit(path)
+        self._driver._contents.add(local_path, path)
+        return await self._file_obj(path)
+
+    async def copy_existing(self, local_path: Path, path: Path) -> Optional[CloudObj]:
+        # Folders are listed and files are hashed only
+        # once, so it is left to the synchronous driver
+        return await asyncio.to_thread(self._driver.copy_existing, local_path, path)
+
+    async def _file_obj(self, path: Path) -> CloudObj:
+        metadata = await self._app.get_meta(path.as_posix(), fields=FILE_FIELDS)
+        return _uploaded_obj(metadata)
+
+    @yandex_api_error
+    async def get_all_files(
+        self,
+        remote_path: Path,
+        page_size: int = 1000,
+        recursive: bool = False,
+        jobs: int = 4,
+    ) -> AsyncIterator[CloudObj]:
+        if not recursive:
+            async for obj in self._list_folder(remote_path, page_size):
+                yield obj
+            return
+
+        async for obj in walk_in_loop(
+            lambda folder: self._list_folder(folder, page_size),
+            remote_path,
+            lambda obj: Path(obj.path) if obj.is_directory else None,
+            jobs,
+            page_size,
+        ):
+            yield obj
+
+    async def _list_folder(
+        self, remote_path: Path, page_size: int = 1000
+    ) -> AsyncIterator[CloudObj]:
+        async for file in self._app.listdir(
+            remote_path.as_posix(), limit=max(1, page_size), fields=LIST_FIELDS
+        ):
+            yield _resource_obj(file)
+
+    @yandex_api_error
+    async def remove_file(self, path: Path) -> None:
+        await self._app.remove(path.as_posix())
+        self._driver._names.release(path)
+
+    @yandex_api_error
+    async def info(self, path: Path) -> dict:
+        return _info(await self._app.get_meta(path.as_posix()))
+
+    async def close(self) -> None:
+        await self._app.close()
@@ -0,0 +1,18 @@
+from .base_errors import FcloudError
+
+
+class DaemonError(FcloudError):
+    not_running_error = (
+        "Daemon is not running",
+        'Start it with "fcloud daemon run"',
+    )
+
+    already_running_error = (
+        "Daemon is already running",
+        "A daemon for this configuration is listening on '{}'",
+    )
+
+    connection_error = (
+        "Daemon connection lost",
+        "The daemon stopped while the command was running. Details: {}",
+    )
@@ -11,3 +11,8 @@ class FileError(FcloudError):
         "Permission denied",
         "Access rights error",
     )
+
+    hash_kind_error = (
+        "Unknown hash kind",
+        "'{}' is not supported. Use one of: {}",
+    )
@@ -0,0 +1,8 @@
+from .base_errors import FcloudError
+
+
+class RemoteIndexError(FcloudError):
+    not_indexed_error = (
+        "Folder is not indexed",
+        """Only the main folder '{}' is indexed. Run "fcloud index refresh" to index it""",
+    )
@@ -0,0 +1,14 @@
+from .base_errors import FcloudError
+
+
+class TransferError(FcloudError):
+    bulk_error = (
+        "{} of {} files failed",
+        "{}",
+    )
+
+    limit_error = (
+        "Invalid speed limit",
+        "Can`t parse '{}'. Use bytes per second with an optional K, M or G "
+        "suffix, for example 512K or 10M. 0 disables the limit.",
+    )
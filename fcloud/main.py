@@ -9,12 +9,6 @@ from .cli.fcloud import Fcloud
 from .models.driver import Driver
 from .utils.error import catch_error
 
-from .drivers.dropbox.dropbox import DropboxCloud
-from .drivers.dropbox.models import DropboxAuth
-
-from .drivers.yandex.yandex import YandexCloud
-from .drivers.yandex.models import YandexAuth
-
 
 @catch_error(debug="--debug" in sys.argv)
 def main():
@@ -24,23 +18,27 @@ def main():
     else:
         path = Path(os.environ.get(env))
 
-    # Here you can add your own driver
+    # Here you can add your own driver. Drivers are given as import
+    # paths, so that only the library of the used cloud is imported
     drivers = [
         Driver(
             name="dropbox",
-            driver=DropboxCloud,
-            auth_model=DropboxAuth,
+            driver="fcloud.drivers.dropbox.dropbox:DropboxCloud",
+            auth_model="fcloud.drivers.dropbox.models:DropboxAuth",
+            case_sensitive=False,
         ),
         Driver(
             name="yandex",
-            driver=YandexCloud,
-            auth_model=YandexAuth,
+            driver="fcloud.drivers.yandex.yandex:YandexCloud",
+            auth_model="fcloud.drivers.yandex.models:YandexAuth",
         ),
     ]
 
     cmd = sys.argv[1] if len(sys.argv) > 1 else None
     _help = "--help" in sys.argv
-    with_driver = not (cmd in ["config", None, *[x.name for x in drivers]] or _help)
+    with_driver = not (
+        cmd in ["config", "cache", None, *[x.name for x in drivers]] or _help
+    )
 
     cli = Fcloud(drivers, read_config(drivers, path) if with_driver else None)
 
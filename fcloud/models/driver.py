@@ -1,6 +1,7 @@
 from typing import TypeVar
 from typing import Generic
 from typing import Type
+from importlib import import_module
 from dataclasses import dataclass
 
 from ..drivers.base import CloudProtocol
@@ -10,6 +11,30 @@ T = TypeVar("T")  # Dataclasses with fields requested by the driver from the con
 
 @dataclass
 class Driver:
+    """Cloud supported by fcloud.
+
+    `driver` and `auth_model` can be classes or import paths in the form
+    "package.module:Class". Paths are imported only when the cloud is used,
+    so the libraries of other clouds are never loaded. `case_sensitive` is
+    False for clouds in which paths differ only in case name the same file.
+    """
+
     name: str
-    driver: Type[CloudProtocol]
-    auth_model: Type[T]
+    driver: Type[CloudProtocol] | str
+    auth_model: Type[T] | str
+    case_sensitive: bool = True
+
+    def load_driver(self) -> Type[CloudProtocol]:
+        self.driver = _load(self.driver)
+        return self.driver
+
+    def load_auth_model(self) -> Type[T]:
+        self.auth_model = _load(self.auth_model)
+        return self.auth_model
+
+
+def _load(obj: type | str) -> type:
+    if not isinstance(obj, str):
+        return obj
+    module, _, name = obj.partition(":")
+    return getattr(import_module(module), name)
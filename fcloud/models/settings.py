@@ -31,3 +31,32 @@ class CloudObj:
     size: int | None
     is_directory: bool
     modifed: str | None
+    content_hash: str | None = None
+    rev: str | None = None
+    path: str | None = None
+
+
+@dataclass
+class CflData:
+    """Contents of a cfl. Version 1 cfls contain only the path,
+    version 2 cfls also describe the file, so that it can be checked
+    without requests to the cloud."""
+
+    path: Path
+    version: int = 1
+    driver: str | None = None
+    size: int | None = None
+    content_hash: str | None = None
+    modified: str | None = None  # Modification time in the cloud
+    mtime_ns: int | None = None  # Modification time of the local file
+    rev: str | None = None
+
+
+@dataclass
+class SyncItem:
+    """A step of a sync of a local folder with a folder in the cloud"""
+
+    action: str  # One of the actions in utils/sync.py
+    local_path: Path
+    path: Path  # Path of the file in the cloud
+    cloud_file: CloudObj | None = None  # The file in the cloud before the sync
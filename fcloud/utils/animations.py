@@ -1,7 +1,3 @@
-import animation as _animation
-import cursor
-
-
 import os
 import functools
 from sys import stdout
@@ -20,6 +16,11 @@ def animation(
             if ("without_animation", True) in kwargs.items():
                 kwargs.pop("without_animation")
                 return func(*args, **kwargs)
+            # Imported here, so that commands without an animation
+            # don't spend startup time on it
+            import animation as _animation
+            import cursor
+
             try:
                 columns, _ = os.get_terminal_size()
             except OSError:
@@ -1,14 +1,35 @@
 import os
 from pathlib import Path
+from typing import Optional
 
+from ..models.settings import CflData
 from ..exceptions.cfl_errors import CFLError
 from ..exceptions.file_errors import FileError
 from ..exceptions.base_errors import FcloudError
 from ..exceptions.exceptions import FcloudException
 
+# Fields of a version 2 cfl in the order in which they are written.
+# Each of them is stored on its own line as `name:value` after the
+# `%cfl:` line, so old versions of fcloud still read the path
+CFL_FIELDS = {
+    "version": "version",
+    "driver": "driver",
+    "size": "size",
+    "hash": "content_hash",
+    "modified": "modified",
+    "mtime": "mtime_ns",
+    "rev": "rev",
+}
+_INT_FIELDS = ("version", "size", "mtime_ns")
+
 
 def create_cfl(
-    path: Path, filename: str, main_folder: Path, cfl_extension: str, near: bool = True
+    path: Path,
+    filename: str,
+    main_folder: Path,
+    cfl_extension: str,
+    near: bool = True,
+    data: Optional[CflData] = None,
 ) -> None:
     """Create CFL
 
@@ -19,6 +40,8 @@ def create_cfl(
         cfl_extension (str): Cfl extension
         near (bool, optional): If True, it will create a cfl near to the main file,
           if False, it will overwrite the file. Defaults to True.
+        data (CflData, optional): Information about the uploaded file. If
+          passed, a version 2 cfl is created. Defaults to None.
     """
     try:
         new_path = str(path) + cfl_extension
@@ -26,6 +49,8 @@ def create_cfl(
             os.rename(path, new_path)
         with open(new_path, "w", encoding="utf-8") as cfl:
             cfl.write(f"%cfl:{main_folder / filename}")
+            if data is not None:
+                cfl.write(_dump_fields(data))
     except PermissionError:
         raise FcloudException(*FileError.perrmission_denied)
     except FileExistsError:
@@ -55,10 +80,66 @@ def read_cfl(path: Path) -> Path:
     return Path(data)
 
 
+def read_cfl_data(path: Path) -> CflData:
+    """Read and validate cfl file with all the information in it
+
+    Args:
+        path (Path): Path to cfl
+
+    Returns:
+        CflData: Remote path of the file and, for version 2 cfls,
+          its size, hash, modification times, revision and driver
+    """
+    if not path.exists():
+        raise FcloudException(*CFLError.not_exists_cfl_error)
+    with open(path, "r", encoding="utf-8") as cfl:
+        first_line = cfl.readline()
+        if not is_cfl(first_line):
+            raise FcloudException(*CFLError.incorrect_cfl_error)
+        data = CflData(Path(first_line[5:].replace("\n", "")))
+        for line in cfl:
+            name, sep, value = line.rstrip("\n").partition(":")
+            if not sep or name not in CFL_FIELDS:
+                # Fields from newer versions are skipped
+                continue
+            setattr(data, CFL_FIELDS[name], _parse_field(CFL_FIELDS[name], value))
+    return data
+
+
+def _dump_fields(data: CflData) -> str:
+    data.version = max(data.version, 2)
+    lines = []
+    for name, attr in CFL_FIELDS.items():
+        value = getattr(data, attr)
+        if value is not None and value != "":
+            lines.append(f"\n{name}:{value}")
+    return "".join(lines)
+
+
+def _parse_field(attr: str, value: str) -> str | int | None:
+    if value == "":
+        return None
+    if attr not in _INT_FIELDS:
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        raise FcloudException(*CFLError.incorrect_cfl_error)
+
+
 def is_cfl(cfl: str) -> bool:
     return cfl.startswith("%cfl:")
 
 
+def is_cfl_file(path: Path) -> bool:
+    """Checks whether the file at path is a cfl without reading it whole"""
+    try:
+        with open(path, "rb") as file:
+            return is_cfl(file.read(5).decode("utf-8", errors="ignore"))
+    except OSError:
+        return False
+
+
 def delete_cfl(cfl: Path) -> None:
     try:
         os.remove(cfl)
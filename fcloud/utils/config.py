@@ -1,5 +1,6 @@
 import os
 import configparser
+from pathlib import Path
 from typing import Optional
 
 
@@ -52,3 +53,14 @@ def get_section(
         return config[section.upper()]
     except KeyError:
         raise FcloudConfigException(*error)
+
+
+def get_data_dir() -> Path:
+    """Folder with the local state of fcloud (journals, caches, indexes).
+    It is located next to the configuration file."""
+    config = os.environ.get("FCLOUD_CONFIG_PATH")
+    if config is None:
+        config = Path(os.path.abspath(__file__)).parent.parent / ".conf"
+    path = Path(config).parent / ".fcloud"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
@@ -0,0 +1,282 @@
+import os
+import json
+import time
+import signal
+import socket
+import hashlib
+import threading
+import socketserver
+from pathlib import Path
+from datetime import datetime
+from typing import Any
+from typing import BinaryIO
+from typing import Optional
+
+from .index import RemoteIndex
+from .limiter import limits
+from .config import get_data_dir
+from ..models.settings import CloudObj
+from ..exceptions.base_errors import FcloudError
+from ..exceptions.daemon_errors import DaemonError
+from ..exceptions.exceptions import FcloudException
+
+# Methods of `CloudProtocol` that can be called through the daemon.
+# Generator methods stream their items one message at a time
+METHODS = (
+    "download_file",
+    "upload_file",
+    "copy_existing",
+    "exists",
+    "create_folder",
+    "remove_file",
+    "remove_files",
+    "refresh_index",
+    "info",
+)
+GENERATOR_METHODS = ("get_all_files",)
+# Seconds to wait for the status of the daemon. A daemon that does not
+# answer in time is treated as not running
+STATUS_TIMEOUT = 5
+# Seconds for which the driver may trust what it remembers about remote
+# folders. Commands are served one after another for hours, and the
+# folders can be changed by other clients in the meantime
+CACHE_TTL = 10
+
+
+def socket_path(service: str, main_folder: Path, fields: dict[str, str]) -> Path:
+    """Socket of the daemon for a configuration. A daemon serves only the
+    configuration it was started with, so a changed configuration is never
+    sent to a daemon with the old one."""
+    config = json.dumps([service, main_folder.as_posix(), sorted(fields.items())])
+    digest = hashlib.sha256(config.encode("utf-8")).hexdigest()
+    return get_data_dir() / f"daemon-{digest[:16]}.sock"
+
+
+def encode(value: Any) -> Any:
+    """Converts arguments and results of driver methods to JSON values"""
+    if isinstance(value, Path):
+        return {"$path": value.as_posix()}
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, CloudObj):
+        return {"$obj": {k: encode(v) for k, v in vars(value).items()}}
+    if isinstance(value, FcloudException):
+        return {"$error": [value.title, str(value.message)]}
+    if isinstance(value, RemoteIndex):
+        return {
+            "$index": [
+                str(value.path),
+                value.service,
+                value.root.as_posix(),
+                value.case_sensitive,
+            ]
+        }
+    if isinstance(value, (list, tuple)):
+        return [encode(x) for x in value]
+    if isinstance(value, dict):
+        return {str(k): encode(v) for k, v in value.items()}
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def decode(value: Any) -> Any:
+    if isinstance(value, list):
+        return [decode(x) for x in value]
+    if not isinstance(value, dict):
+        return value
+    if "$path" in value:
+        return Path(value["$path"])
+    if "$datetime" in value:
+        return datetime.fromisoformat(value["$datetime"])
+    if "$obj" in value:
+        return CloudObj(**{k: decode(v) for k, v in value["$obj"].items()})
+    if "$error" in value:
+        return FcloudException(*value["$error"])
+    if "$index" in value:
+        path, service, root, case_sensitive = value["$index"]
+        return RemoteIndex(Path(path), service, Path(root), case_sensitive)
+    return {k: decode(v) for k, v in value.items()}
+
+
+def send(file: BinaryIO, message: dict) -> None:
+    """Messages are JSON objects, one per line"""
+    file.write(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+    file.flush()
+
+
+def receive(file: BinaryIO) -> dict:
+    line = file.readline()
+    if not line:
+        raise ConnectionError("Connection closed")
+    return json.loads(line)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "DaemonServer"
+
+    def handle(self) -> None:
+        try:
+            request = receive(self.rfile)
+        except (ConnectionError, ValueError):
+            return
+        method = request.get("method")
+        self.server.requests += 1
+        try:
+            if method == "status":
+                send(self.wfile, {"result": self.server.status()})
+            elif method == "stop":
+                send(self.wfile, {"result": None})
+                threading.Thread(target=self.server.shutdown).start()
+            elif method in METHODS or method in GENERATOR_METHODS:
+                self._call(method, request)
+            else:
+                raise FcloudException("Unknown method", str(method))
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading, for example after the first page
+            return
+        except FcloudException as err:
+            send(self.wfile, {"error": encode(err)})
+        except Exception as err:
+            title, message = FcloudError.uknown_error
+            send(
+                self.wfile,
+                {"error": encode(FcloudException(title, message.format(err)))},
+            )
+
+    def _call(self, method: str, request: dict) -> None:
+        self.server.expire_cache()
+        func = getattr(self.server.driver, method)
+        args = decode(request.get("args", []))
+        if method in GENERATOR_METHODS:
+            for item in func(*args):
+                send(self.wfile, {"item": encode(item)})
+            send(self.wfile, {"done": True})
+        else:
+            send(self.wfile, {"result": encode(func(*args))})
+
+
+class DaemonServer(socketserver.ThreadingUnixStreamServer):
+    """Serves calls of driver methods over a Unix socket, so that one
+    authenticated driver and its connections are reused by every command.
+
+    Each call is a connection: a request message with the method and its
+    arguments, followed by a result, an error, or the items of a generator.
+    Connections are handled in threads, so commands run at the same time.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path: Path, driver, service: str):
+        """
+        Args:
+            path (Path): Socket path, see `socket_path`
+            driver (CloudProtocol): Driver whose methods are called
+            service (str): Name of the cloud, used in the status
+        """
+        self.driver = driver
+        self.service = service
+        self.started = time.time()
+        self.requests = 0
+        self._cache_lock = threading.Lock()
+        self._cache_time = time.monotonic()
+        if is_running(path):
+            title, message = DaemonError.already_running_error
+            raise FcloudException(title, message.format(path))
+        # A socket left by a daemon that was killed
+        path.unlink(missing_ok=True)
+
+        # Only the owner may use the credentials of the daemon
+        umask = os.umask(0o177)
+        try:
+            super().__init__(str(path), _Handler)
+        finally:
+            os.umask(umask)
+        self.path = path
+
+    def expire_cache(self) -> None:
+        """Makes the driver forget remote folders once `CACHE_TTL` has passed"""
+        with self._cache_lock:
+            now = time.monotonic()
+            if now - self._cache_time < CACHE_TTL:
+                return
+            self._cache_time = now
+        self.driver.forget_cache()
+
+    def status(self) -> dict:
+        # Imported here, because it imports requests
+        from ..drivers.transport import stats
+
+        return {
+            "pid": os.getpid(),
+            "service": self.service,
+            "hash_kind": getattr(self.driver, "hash_kind", None),
+            "started": self.started,
+            "requests": self.requests,
+            "limits": limits(),
+            "connections": stats(),
+        }
+
+    def run(self) -> None:
+        """Serves until `stop` is requested, the process is interrupted
+        or receives SIGTERM"""
+
+        def terminate(*args) -> None:
+            threading.Thread(target=self.shutdown).start()
+
+        # Signal handlers can be set only in the main thread
+        main = threading.current_thread() is threading.main_thread()
+        previous = signal.signal(signal.SIGTERM, terminate) if main else None
+        try:
+            self.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if main:
+                signal.signal(signal.SIGTERM, previous)
+            self.server_close()
+            self.path.unlink(missing_ok=True)
+
+
+def request(
+    path: Path, method: str, args: tuple = (), timeout: Optional[float] = None
+) -> Any:
+    """Calls a method of the daemon and returns its result
+
+    Args:
+        path (Path): Socket of the daemon
+        method (str): Name of the method
+        args (tuple, optional): Arguments of the method
+        timeout (float, optional): Seconds to wait for the result.
+          By default it is awaited however long it takes.
+
+    Raises:
+        OSError: The daemon is not running or has not answered in time
+        FcloudException: The method failed
+    """
+    with connect(path, timeout) as client:
+        file = client.makefile("rwb")
+        send(file, {"method": method, "args": encode(args)})
+        response = receive(file)
+    if "error" in response:
+        raise decode(response["error"])
+    return decode(response["result"])
+
+
+def connect(path: Path, timeout: Optional[float] = None) -> socket.socket:
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+    try:
+        client.connect(str(path))
+    except BaseException:
+        client.close()
+        raise
+    return client
+
+
+def is_running(path: Path) -> bool:
+    try:
+        request(path, "status", timeout=STATUS_TIMEOUT)
+    except (OSError, ValueError, FcloudException):
+        return False
+    return True
@@ -0,0 +1,164 @@
+import os
+import hashlib
+import threading
+from pathlib import Path
+from typing import Iterable
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+
+from .config import get_data_dir
+
+DROPBOX_BLOCK_SIZE = 4 * 1024 * 1024
+HASH_KINDS = ("dropbox", "md5", "sha256")
+
+
+def compute_hashes(path: Path) -> dict[str, str]:
+    """Computes every supported kind of hash in a single read of the file:
+    'dropbox' - SHA-256 of the concatenated SHA-256 hashes of every 4 MiB
+    block (https://www.dropbox.com/developers/reference/content-hash),
+    'md5' and 'sha256' of the whole file."""
+    blocks = hashlib.sha256()
+    md5 = hashlib.md5()
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as file:
+        while block := file.read(DROPBOX_BLOCK_SIZE):
+            blocks.update(hashlib.sha256(block).digest())
+            md5.update(block)
+            sha256.update(block)
+    return {
+        "dropbox": blocks.hexdigest(),
+        "md5": md5.hexdigest(),
+        "sha256": sha256.hexdigest(),
+    }
+
+
+def file_hash(path: Path, kind: str) -> str:
+    """Hash of the file in the form used by a cloud. The result is
+    stored in the local hash cache, so an unchanged file is read only once.
+
+    Args:
+        path (Path): Local file
+        kind (str): 'dropbox', 'md5' or 'sha256'
+    """
+    return HashCache.default().get(path, kind)
+
+
+def hash_files(
+    paths: Iterable[Path], kind: str, jobs: Optional[int] = None
+) -> dict[Path, str]:
+    """Hashes many files at the same time, filling the hash cache.
+    hashlib releases the GIL while hashing, so threads use several cores.
+
+    Args:
+        paths (Iterable[Path]): Local files
+        kind (str): 'dropbox', 'md5' or 'sha256'
+        jobs (int, optional): How many files are hashed at the same time.
+          Defaults to the number of CPUs.
+    """
+    paths = list(paths)
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as pool:
+        return dict(zip(paths, pool.map(lambda x: file_hash(x, kind), paths)))
+
+
+class HashCache:
+    """Persistent cache of file hashes in a SQLite database.
+
+    Rows are keyed by (device, inode, size, mtime_ns), so a file that was
+    modified, replaced or moved to another device gets a new row, while a
+    renamed file keeps its hashes.
+    """
+
+    _default: Optional["HashCache"] = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        # Imported here to keep it out of the startup time of every command
+        import sqlite3
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute("""\
+                CREATE TABLE IF NOT EXISTS hashes (
+                    device INTEGER,
+                    inode INTEGER,
+                    size INTEGER,
+                    mtime_ns INTEGER,
+                    path TEXT,
+                    dropbox TEXT,
+                    md5 TEXT,
+                    sha256 TEXT,
+                    PRIMARY KEY (device, inode, size, mtime_ns)
+                )""")
+
+    @classmethod
+    def default(cls) -> "HashCache":
+        """Cache stored in the fcloud data folder"""
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls(get_data_dir() / "hashes.sqlite")
+            return cls._default
+
+    def get(self, path: Path, kind: str) -> str:
+        if kind not in HASH_KINDS:
+            raise ValueError(f"Unknown hash kind: {kind}")
+        stat = os.stat(path)
+        key = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {kind} FROM hashes WHERE device = ? AND inode = ?"
+                " AND size = ? AND mtime_ns = ?",
+                key,
+            ).fetchone()
+        if row is not None and row[0] is not None:
+            return row[0]
+
+        hashes = compute_hashes(path)
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (*key, os.path.abspath(path), *(hashes[x] for x in HASH_KINDS)),
+            )
+        return hashes[kind]
+
+    def prune(self) -> int:
+        """Deletes rows whose recorded path no longer exists or now holds
+        another version of the file. Rows are found by their path, so a file
+        that was moved or renamed also loses its row and is hashed again
+        on next use.
+
+        Returns:
+            int: Number of deleted rows
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT device, inode, size, mtime_ns, path FROM hashes"
+            ).fetchall()
+
+        stale = []
+        for *key, path in rows:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                stale.append(key)
+                continue
+            if key != [stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns]:
+                stale.append(key)
+
+        with self._lock, self._db:
+            self._db.executemany(
+                "DELETE FROM hashes WHERE device = ? AND inode = ?"
+                " AND size = ? AND mtime_ns = ?",
+                stale,
+            )
+        return len(stale)
+
+    def clear(self) -> None:
+        """Deletes all rows"""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM hashes")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
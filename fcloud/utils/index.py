@@ -0,0 +1,253 @@
+import time
+import threading
+from pathlib import Path
+from datetime import datetime
+from typing import Callable
+from typing import Iterable
+from typing import Iterator
+from typing import Optional
+
+from ..models.settings import CloudObj
+
+# A change of the cloud: the path and the new state of the object,
+# or None if the object was deleted. In clouds that are not case sensitive
+# the path may be in any case, the object keeps the path for display
+Change = tuple[str, Optional[CloudObj]]
+
+
+class RemoteIndex:
+    """Local copy of the metadata of a folder in the cloud, stored in SQLite.
+
+    Rows are keyed by (root, path), so looking up a path is a search in a
+    B-tree, and listing a folder uses an index on (root, parent). The index
+    is brought up to date by drivers (see `CloudProtocol.refresh_index`),
+    which save a cursor from which the next refresh continues.
+
+    If the cloud is not case sensitive, paths are keyed in lower case and
+    the path in the case reported by the cloud is kept for display.
+    """
+
+    def __init__(
+        self, path: Path, service: str, root: Path, case_sensitive: bool = True
+    ):
+        """
+        Args:
+            path (Path): Database file
+            service (str): The cloud, whose files are indexed
+            root (Path): The indexed folder in the cloud
+            case_sensitive (bool, optional): Whether paths that differ only
+              in case are different files. Defaults to True.
+        """
+        self.path = path
+        self.service = service
+        self.root = root
+        self.case_sensitive = case_sensitive
+        self._root = Path(self._fold(root.as_posix()))
+        self._key = f"{service}:{self._root.as_posix()}"
+        self._lock = threading.Lock()
+        # Imported here to keep it out of the startup time of every command
+        import sqlite3
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            columns = [x[1] for x in self._db.execute("PRAGMA table_info(entries)")]
+            if columns and "display" not in columns:
+                # An index of an older version is listed again by the next refresh
+                self._db.execute("DROP TABLE entries")
+                self._db.execute("DROP TABLE IF EXISTS state")
+            self._db.execute("""\
+                CREATE TABLE IF NOT EXISTS entries (
+                    root TEXT,
+                    path TEXT,
+                    parent TEXT,
+                    name TEXT,
+                    is_directory INTEGER,
+                    size INTEGER,
+                    content_hash TEXT,
+                    rev TEXT,
+                    modified TEXT,
+                    display TEXT,
+                    PRIMARY KEY (root, path)
+                )""")
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS entries_parent"
+                " ON entries (root, parent, name)"
+            )
+            self._db.execute("""\
+                CREATE TABLE IF NOT EXISTS state (
+                    root TEXT PRIMARY KEY,
+                    cursor TEXT,
+                    updated REAL
+                )""")
+
+    @property
+    def cursor(self) -> Optional[str]:
+        """Position in the history of changes of the cloud, from which
+        the next refresh continues. None if it must list everything."""
+        return self._state()[0]
+
+    @property
+    def updated(self) -> Optional[float]:
+        """Unix time of the last refresh, None if the folder was never indexed"""
+        return self._state()[1]
+
+    def update(
+        self,
+        changes: Iterable[Change],
+        cursor: Optional[Callable[[], Optional[str]]] = None,
+        reset: bool = False,
+    ) -> int:
+        """Applies changes in one transaction
+
+        Args:
+            changes (Iterable[Change]): Changed and deleted objects. Deleting
+              a folder also deletes everything in it.
+            cursor (Callable, optional): Returns the new cursor. It is called
+              after all changes have been consumed, because drivers learn
+              the cursor from the last page of changes. If not passed, the
+              cursor and the time of the last refresh are kept.
+            reset (bool, optional): The changes contain the whole folder and
+              replace the index. Defaults to False.
+
+        Returns:
+            int: Number of applied changes
+        """
+        count = 0
+        with self._lock, self._db:
+            if reset:
+                self._db.execute("DELETE FROM entries WHERE root = ?", (self._key,))
+            for path, obj in changes:
+                if obj is None:
+                    self._delete(path)
+                else:
+                    self._put(path, obj)
+                count += 1
+            if cursor is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO state VALUES (?, ?, ?)",
+                    (self._key, cursor(), time.time()),
+                )
+        return count
+
+    def get(self, path: Path) -> Optional[CloudObj]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT * FROM entries WHERE root = ? AND path = ?",
+                (self._key, self._fold(path.as_posix())),
+            ).fetchone()
+        return None if row is None else _row_obj(row)
+
+    def exists(self, path: Path) -> bool:
+        return Path(self._fold(path.as_posix())) == self._root or (
+            self.get(path) is not None
+        )
+
+    def covers(self, path: Path) -> bool:
+        """Whether a path is the indexed folder or is inside it"""
+        path = Path(self._fold(path.as_posix()))
+        return path == self._root or self._root in path.parents
+
+    def list(self, folder: Path, recursive: bool = False) -> Iterator[CloudObj]:
+        """Objects of a folder ordered by path, read in pages, so
+        memory does not depend on the size of the folder"""
+        folder = self._fold(folder.as_posix())
+        if recursive:
+            prefix = folder.rstrip("/")
+            query = "root = ? AND path > ? AND path < ?"
+            # Paths of descendants lie between 'folder/' and 'folder0'
+            args = (self._key, prefix + "/", prefix + "0")
+        else:
+            query = "root = ? AND parent = ?"
+            args = (self._key, folder)
+
+        last = ""
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    f"SELECT * FROM entries WHERE {query} AND path > ?"
+                    " ORDER BY path LIMIT 1000",
+                    (*args, last),
+                ).fetchall()
+            yield from (_row_obj(row) for row in rows)
+            if len(rows) < 1000:
+                return
+            last = rows[-1][1]
+
+    def clear(self) -> None:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM entries WHERE root = ?", (self._key,))
+            self._db.execute("DELETE FROM state WHERE root = ?", (self._key,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM entries WHERE root = ?", (self._key,)
+            ).fetchone()[0]
+
+    def _state(self) -> tuple[Optional[str], Optional[float]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT cursor, updated FROM state WHERE root = ?", (self._key,)
+            ).fetchone()
+        return (None, None) if row is None else row
+
+    def _fold(self, path: str) -> str:
+        return path if self.case_sensitive else path.lower()
+
+    def _put(self, path: str, obj: CloudObj) -> None:
+        modified = obj.modifed
+        if isinstance(modified, datetime):
+            modified = modified.isoformat()
+        display = Path(obj.path or path)
+        key = Path(self._fold(path))
+        self._db.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                self._key,
+                key.as_posix(),
+                key.parent.as_posix(),
+                obj.name,
+                obj.is_directory,
+                obj.size,
+                obj.content_hash,
+                obj.rev,
+                modified,
+                display.as_posix(),
+            ),
+        )
+        # Clouds may report only files, so their folders are added too
+        key, display = key.parent, display.parent
+        while key != self._root and self._root in key.parents:
+            self._db.execute(
+                "INSERT OR IGNORE INTO entries (root, path, parent, name,"
+                " is_directory, display) VALUES (?, ?, ?, ?, 1, ?)",
+                (
+                    self._key,
+                    key.as_posix(),
+                    key.parent.as_posix(),
+                    display.name,
+                    display.as_posix(),
+                ),
+            )
+            key, display = key.parent, display.parent
+
+    def _delete(self, path: str) -> None:
+        path = self._fold(path)
+        self._db.execute(
+            "DELETE FROM entries WHERE root = ?"
+            " AND (path = ? OR (path > ? AND path < ?))",
+            (self._key, path, path + "/", path + "0"),
+        )
+
+
+def _row_obj(row: tuple) -> CloudObj:
+    _, _, _, name, is_directory, size, content_hash, rev, modified, path = row
+    return CloudObj(
+        name=name,
+        size=size,
+        is_directory=bool(is_directory),
+        modifed=datetime.fromisoformat(modified) if modified else None,
+        content_hash=content_hash,
+        rev=rev,
+        path=path,
+    )
@@ -0,0 +1,95 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+from contextlib import suppress
+from pathlib import Path
+from typing import Optional
+
+
+class UploadJournal:
+    """Saves the state of unfinished upload sessions on disk, so that an
+    interrupted upload can be continued from the last confirmed offset.
+
+    Entries are keyed by the identity of the local file (path, size and
+    modification time) and the path it is uploaded to, so a changed file
+    never resumes an old session. Every entry is a small file of its own,
+    so saving the progress of one upload does not rewrite the others and
+    processes that upload at the same time do not overwrite each other.
+    """
+
+    def __init__(self, path: Path, max_age: int = 2 * 24 * 60 * 60):
+        """
+        Args:
+            path (Path): Folder of the journal, created on first save
+            max_age (int, optional): Seconds after which an entry is considered
+              expired, because the cloud no longer keeps its session.
+              Defaults to 2 days.
+        """
+        self._path = path
+        self._max_age = max_age
+        self._pruned = False
+
+    @staticmethod
+    def key(local_path: Path, path: Path) -> str:
+        """Identity of an upload of local_path to path"""
+        stat = os.stat(local_path)
+        return "|".join(
+            (
+                os.path.abspath(local_path),
+                str(stat.st_size),
+                str(stat.st_mtime_ns),
+                path.as_posix(),
+            )
+        )
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._read(self._file(key))
+        return None if entry is None else entry["entry"]
+
+    def save(self, key: str, entry: dict) -> None:
+        self._path.mkdir(mode=0o700, parents=True, exist_ok=True)
+        if not self._pruned:
+            self._prune()
+        self._write(self._file(key), {"entry": entry, "updated": time.time()})
+
+    def remove(self, key: str) -> None:
+        with suppress(FileNotFoundError):
+            os.remove(self._file(key))
+
+    def _file(self, key: str) -> Path:
+        # Keys contain paths, so the name of the file is their hash
+        return self._path / f"{hashlib.sha256(key.encode('utf-8')).hexdigest()}.json"
+
+    def _read(self, file: Path) -> Optional[dict]:
+        try:
+            with open(file, "r", encoding="utf-8") as journal:
+                data = json.load(journal)
+        except (OSError, ValueError):
+            return None
+        if data.get("updated", 0) <= time.time() - self._max_age:
+            return None
+        return data
+
+    def _prune(self) -> None:
+        # Entries of uploads that were never continued
+        self._pruned = True
+        for file in self._path.glob("*.json"):
+            if self._read(file) is None:
+                with suppress(FileNotFoundError):
+                    os.remove(file)
+
+    def _write(self, file: Path, data: dict) -> None:
+        # The entry is replaced at once, so it is never read half written.
+        # It is readable only by the owner, because it contains the id of
+        # the session
+        fd, tmp = tempfile.mkstemp(prefix=file.name, suffix=".tmp", dir=self._path)
+        try:
+            with open(fd, "w", encoding="utf-8") as journal:
+                json.dump(data, journal)
+            os.replace(tmp, file)
+        except BaseException:
+            with suppress(FileNotFoundError):
+                os.remove(tmp)
+            raise
@@ -0,0 +1,210 @@
+import os
+import re
+import time
+import threading
+import configparser
+from typing import Optional
+
+from ..exceptions.transfer_errors import TransferError
+from ..exceptions.exceptions import FcloudException
+
+UPLOAD = "upload"
+DOWNLOAD = "download"
+# Settings of the [FCLOUD] section with the limits in bytes per second
+CONFIG_FIELDS = {UPLOAD: "upload_limit", DOWNLOAD: "download_limit"}
+# Seconds between checks whether the configuration file has changed
+RELOAD_INTERVAL = 1.0
+# Bounds of the blocks in which limited data is sent or received
+MIN_BLOCK = 16 * 1024
+MAX_BLOCK = 1024 * 1024
+
+_UNITS = {"": 1, "k": 1024, "m": 1024**2, "g": 1024**3}
+_RATE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([kmg]?)(?:i?b)?(?:/s)?\s*$", re.IGNORECASE)
+
+
+class TokenBucket:
+    """Limits the rate at which all threads of the process send or receive
+    data. Every block takes as many tokens as it has bytes, and tokens are
+    added at `rate` per second.
+
+    The bucket holds at most one second of tokens, so after a pause no more
+    than that is sent at full speed. Tokens may be taken in advance: a
+    thread that takes more than there are waits until they would have been
+    added, so waiting threads share the rate in the order they asked.
+    """
+
+    def __init__(self, rate: float = 0):
+        """
+        Args:
+            rate (float, optional): Bytes per second, 0 for no limit
+        """
+        self._lock = threading.Lock()
+        self._rate = 0.0
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+        self.rate = rate
+
+    @property
+    def rate(self) -> float:
+        """Bytes per second, 0 if there is no limit. It can be changed
+        while data is being sent, the next blocks follow the new rate."""
+        return self._rate
+
+    @rate.setter
+    def rate(self, rate: float) -> None:
+        with self._lock:
+            self._refill()
+            self._rate = max(0.0, float(rate))
+            # Blocks taken in advance at the old rate are not charged again
+            self._tokens = min(max(self._tokens, 0.0), self._rate)
+
+    def reserve(self, size: int) -> float:
+        """Takes the tokens of a block
+
+        Args:
+            size (int): Size of the block in bytes
+
+        Returns:
+            float: Seconds to wait before the block is sent
+        """
+        with self._lock:
+            if self._rate <= 0:
+                return 0.0
+            self._refill()
+            self._tokens -= size
+            return max(0.0, -self._tokens / self._rate)
+
+    def consume(self, size: int) -> None:
+        """Waits until a block of `size` bytes may be sent"""
+        delay = self.reserve(size)
+        if delay > 0:
+            time.sleep(delay)
+
+    def block_size(self, default: int = MAX_BLOCK) -> int:
+        """Size of the blocks into which a stream is split, about a tenth of
+        a second of data, so that a limited stream flows evenly"""
+        rate = self._rate
+        if rate <= 0:
+            return default
+        return min(default, max(MIN_BLOCK, int(rate / 10)))
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        if self._rate > 0:
+            elapsed = now - self._updated
+            self._tokens = min(self._rate, self._tokens + elapsed * self._rate)
+        self._updated = now
+
+
+_buckets = {UPLOAD: TokenBucket(), DOWNLOAD: TokenBucket()}
+_overrides: dict[str, float] = {}  # Limits of the command, see `set_limit`
+_lock = threading.Lock()
+_checked = 0.0  # When the configuration file was last checked
+_config_mtime: Optional[int] = None
+_loaded = False
+
+
+def get_limiter(direction: str) -> TokenBucket:
+    """Returns the bucket shared by all transfers of the process in one
+    direction. The limits in the configuration file are read again when
+    it changes, at most once per `RELOAD_INTERVAL`, so a new limit applies
+    to the transfers that are already running.
+
+    Args:
+        direction (str): UPLOAD or DOWNLOAD
+
+    Raises:
+        FcloudException: A limit in the configuration can't be parsed.
+          After the limits have been read once, a wrong value is ignored
+          instead, so that an edit does not stop running transfers.
+    """
+    _reload()
+    return _buckets[direction]
+
+
+def set_limit(direction: str, rate: Optional[float]) -> None:
+    """Sets a limit of the process that takes precedence over the
+    configuration, for example the limit of a command
+
+    Args:
+        direction (str): UPLOAD or DOWNLOAD
+        rate (float, optional): Bytes per second, 0 for no limit.
+          None to use the limit from the configuration again.
+    """
+    global _config_mtime
+    with _lock:
+        if rate is None:
+            _overrides.pop(direction, None)
+            # The limit is read from the configuration on the next check
+            _config_mtime = None
+            return
+        _overrides[direction] = rate
+        _buckets[direction].rate = rate
+
+
+def limits() -> dict[str, float]:
+    """Current limits of both directions in bytes per second"""
+    _reload()
+    return {direction: bucket.rate for direction, bucket in _buckets.items()}
+
+
+def parse_rate(value: str | float) -> float:
+    """Converts a limit like '512K', '10M', '1.5MiB/s' or '2000000'
+    to bytes per second. Suffixes are powers of 1024.
+
+    Raises:
+        FcloudException: The value can't be parsed
+    """
+    # An empty value in the configuration means no limit
+    match = _RATE.match(str(value).strip() or "0")
+    if match is None:
+        title, message = TransferError.limit_error
+        raise FcloudException(title, message.format(value))
+    number, unit = match.groups()
+    return float(number) * _UNITS[unit.lower()]
+
+
+def format_rate(rate: float) -> str:
+    """Converts bytes per second to the format of `parse_rate`"""
+    if rate <= 0:
+        return "unlimited"
+    for unit in ("G", "M", "K"):
+        if rate >= _UNITS[unit.lower()]:
+            return f"{rate / _UNITS[unit.lower()]:g}{unit}/s"
+    return f"{rate:g}/s"
+
+
+def _reload() -> None:
+    global _checked, _config_mtime, _loaded
+    now = time.monotonic()
+    if now - _checked < RELOAD_INTERVAL:
+        return
+    with _lock:
+        if now - _checked < RELOAD_INTERVAL:
+            return
+        _checked = now
+        path = os.environ.get("FCLOUD_CONFIG_PATH")
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except (OSError, TypeError):
+            mtime = None
+        if mtime == _config_mtime and _loaded:
+            return
+
+        config = configparser.ConfigParser()
+        if path is not None:
+            config.read(path, encoding="utf-8")
+        for direction, field in CONFIG_FIELDS.items():
+            if direction in _overrides:
+                continue
+            try:
+                rate = parse_rate(config.get("FCLOUD", field, fallback=""))
+            except FcloudException:
+                if _loaded:
+                    continue
+                # Checked again on the next call
+                _checked = 0.0
+                raise
+            _buckets[direction].rate = rate
+        _config_mtime = mtime
+        _loaded = True
@@ -0,0 +1,208 @@
+import queue
+import asyncio
+import threading
+from typing import Callable
+from typing import Awaitable
+from typing import AsyncIterable
+from typing import AsyncIterator
+from typing import Iterable
+from typing import Iterator
+from typing import Optional
+from typing import TypeVar
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
+
+from ..exceptions.base_errors import FcloudError
+from ..exceptions.exceptions import FcloudException
+
+I = TypeVar("I")  # An item processed by the pool, usually a local path
+F = TypeVar("F")  # A folder walked by the pool
+
+
+def run_in_pool(
+    func: Callable[[I], None], items: Iterable[I], jobs: int = 1
+) -> list[tuple[I, FcloudException]]:
+    """Runs func for every item on a bounded pool of worker threads
+
+    Args:
+        func (Callable): Function that processes one item
+        items (Iterable): Items to be processed
+        jobs (int, optional): Maximum number of items processed at once.
+          Defaults to 1.
+
+    Returns:
+        list[tuple[item, FcloudException]]: Items that failed along with their errors
+    """
+    errors = []
+    pool = ThreadPoolExecutor(max_workers=max(1, int(jobs)))
+    try:
+        futures = {pool.submit(func, item): item for item in items}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except FcloudException as err:
+                errors.append((futures[future], err))
+            except Exception as err:
+                title, message = FcloudError.uknown_error
+                errors.append(
+                    (futures[future], FcloudException(title, message.format(err)))
+                )
+    except BaseException:
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
+    return errors
+
+
+async def run_in_loop(
+    func: Callable[[I], Awaitable[None]], items: Iterable[I], jobs: int = 1
+) -> list[tuple[I, FcloudException]]:
+    """Awaits func for every item on the running event loop, at most `jobs`
+    at a time. The counterpart of `run_in_pool` for coroutines.
+
+    Args:
+        func (Callable): Coroutine function that processes one item
+        items (Iterable): Items to be processed
+        jobs (int, optional): Maximum number of items processed at once.
+          Defaults to 1.
+
+    Returns:
+        list[tuple[item, FcloudException]]: Items that failed along with their errors
+    """
+    errors = []
+    pending = iter(items)
+
+    async def worker() -> None:
+        # Workers take the items one by one, so no more than
+        # `jobs` of them are started and none is taken twice
+        for item in pending:
+            try:
+                await func(item)
+            except FcloudException as err:
+                errors.append((item, err))
+            except Exception as err:
+                title, message = FcloudError.uknown_error
+                errors.append((item, FcloudException(title, message.format(err))))
+
+    await asyncio.gather(*(worker() for _ in range(max(1, int(jobs)))))
+    return errors
+
+
+def walk_in_pool(
+    list_folder: Callable[[F], Iterable[I]],
+    root: F,
+    get_folder: Callable[[I], Optional[F]],
+    jobs: int = 1,
+    buffer: int = 1000,
+) -> Iterator[I]:
+    """Lists a tree of folders breadth-first, several folders at once
+
+    Args:
+        list_folder (Callable): Returns the items of one folder
+        root (F): The folder the walk starts from, it is not yielded
+        get_folder (Callable): Returns the folder to be listed for an item,
+          or None if the item is not a folder
+        jobs (int, optional): Maximum number of folders listed at once.
+          Defaults to 1.
+        buffer (int, optional): Maximum number of listed items waiting to be
+          consumed. Workers wait while the buffer is full, so memory does not
+          depend on the size of the tree. Defaults to 1000.
+
+    Yields:
+        I: Items of all folders of the tree in the order they were listed
+    """
+    done = object()  # Marks the end of the listing of one folder
+    results: queue.Queue = queue.Queue(maxsize=max(1, buffer))
+    stop = threading.Event()
+
+    def put(item) -> None:
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def worker(folder: F) -> None:
+        try:
+            for item in list_folder(folder):
+                if stop.is_set():
+                    return
+                put(item)
+        except BaseException as err:
+            put(err)
+        finally:
+            put(done)
+
+    pool = ThreadPoolExecutor(max_workers=max(1, int(jobs)))
+    try:
+        pool.submit(worker, root)
+        pending = 1
+        while pending:
+            item = results.get()
+            if item is done:
+                pending -= 1
+                continue
+            if isinstance(item, BaseException):
+                raise item
+            folder = get_folder(item)
+            if folder is not None:
+                pending += 1
+                pool.submit(worker, folder)
+            yield item
+    finally:
+        # Also stops the workers if the consumer stops iterating early
+        stop.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def walk_in_loop(
+    list_folder: Callable[[F], AsyncIterable[I]],
+    root: F,
+    get_folder: Callable[[I], Optional[F]],
+    jobs: int = 1,
+    buffer: int = 1000,
+) -> AsyncIterator[I]:
+    """Lists a tree of folders breadth-first on the running event loop.
+    The counterpart of `walk_in_pool` for asynchronous listings, it takes
+    the same arguments, except that list_folder is an async generator.
+    """
+    done = object()  # Marks the end of the listing of one folder
+    results: asyncio.Queue = asyncio.Queue(maxsize=max(1, buffer))
+    limit = asyncio.Semaphore(max(1, int(jobs)))
+    tasks: set[asyncio.Task] = set()
+
+    async def worker(folder: F) -> None:
+        try:
+            async with limit:
+                async for item in list_folder(folder):
+                    await results.put(item)
+        except Exception as err:
+            await results.put(err)
+        finally:
+            await results.put(done)
+
+    def start(folder: F) -> None:
+        task = asyncio.ensure_future(worker(folder))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    try:
+        start(root)
+        pending = 1
+        while pending:
+            item = await results.get()
+            if item is done:
+                pending -= 1
+                continue
+            if isinstance(item, BaseException):
+                raise item
+            folder = get_folder(item)
+            if folder is not None:
+                pending += 1
+                start(folder)
+            yield item
+    finally:
+        # Also stops the workers if the consumer stops iterating early
+        for task in list(tasks):
+            task.cancel()
@@ -0,0 +1,190 @@
+import os
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING
+from typing import Callable
+from typing import Iterable
+from typing import Optional
+
+from .other import generate_new_name
+from .hashing import file_hash
+from ..models.settings import CloudObj
+
+if TYPE_CHECKING:
+    from .index import RemoteIndex
+
+
+class NameRegistry:
+    """Keeps track of the names taken in remote folders, so that name
+    collisions are resolved without listing a folder on every upload.
+
+    Each folder is listed once (on first use) and is then updated as uploads
+    are reserved, committed or released. Reserved names that are still being
+    uploaded survive a reload of the folder.
+    """
+
+    def __init__(self, loader: Callable[[Path], Iterable[str]]):
+        """
+        Args:
+            loader (Callable): Returns the names of all objects in a remote folder
+        """
+        self._loader = loader
+        self._index: Optional["RemoteIndex"] = None
+        self._lock = threading.Lock()
+        self._folder_locks: dict[str, threading.Lock] = {}
+        self._names: dict[str, set[str]] = {}
+        self._pending: dict[str, set[str]] = {}
+
+    def reserve(self, path: Path) -> str:
+        """Reserves a free name for the file in its folder
+
+        Args:
+            path (Path): Desired path of the file in the cloud
+
+        Returns:
+            str: path.name if it is free, otherwise a new name like 'film.mp4 (1)'
+        """
+        folder = path.parent.as_posix()
+        self._load(path.parent)
+        with self._lock:
+            pending = self._pending.setdefault(folder, set())
+            busy = self._names[folder] | pending
+            filename = path.name
+            if filename in busy:
+                filename = generate_new_name(busy=busy, default=filename)
+            pending.add(filename)
+        return filename
+
+    def reserve_exact(self, path: Path) -> str:
+        """Marks path.name as taken without looking for a free name.
+        Used when a file in the cloud is intentionally overwritten."""
+        with self._lock:
+            self._pending.setdefault(path.parent.as_posix(), set()).add(path.name)
+        return path.name
+
+    def commit(self, path: Path) -> None:
+        """Marks a reserved name as taken in the cloud"""
+        folder = path.parent.as_posix()
+        with self._lock:
+            self._pending.get(folder, set()).discard(path.name)
+            if folder in self._names:
+                self._names[folder].add(path.name)
+
+    def release(self, path: Path) -> None:
+        """Frees a name, for example after a failed upload or a removal"""
+        folder = path.parent.as_posix()
+        with self._lock:
+            self._pending.get(folder, set()).discard(path.name)
+            self._names.get(folder, set()).discard(path.name)
+
+    def forget(self, folder: Path) -> None:
+        """Drops the cached listing, so the folder is listed again on next use"""
+        with self._lock:
+            self._names.pop(folder.as_posix(), None)
+
+    def use_index(self, index: "RemoteIndex") -> None:
+        """Takes the names of the folders covered by the index from it
+        instead of the loader. Folders missing from the index are still
+        listed by the loader"""
+        self._index = index
+
+    def clear(self) -> None:
+        """Drops the listings of all folders. Names that are still
+        reserved by running uploads are kept"""
+        with self._lock:
+            self._names.clear()
+
+    def _load(self, folder: Path) -> None:
+        key = folder.as_posix()
+        with self._lock:
+            if key in self._names:
+                return
+            folder_lock = self._folder_locks.setdefault(key, threading.Lock())
+
+        # Only one thread lists a folder, others wait for its result
+        with folder_lock:
+            with self._lock:
+                if key in self._names:
+                    return
+            index = self._index
+            if index is not None and index.covers(folder) and index.exists(folder):
+                names = {obj.name for obj in index.list(folder)}
+            else:
+                names = set(self._loader(folder))
+            with self._lock:
+                self._names[key] = names
+
+
+class ContentIndex:
+    """Finds files in remote folders by their content, so that a file that
+    is already in the cloud is not uploaded again.
+
+    Each folder is listed once. The local file is hashed only if a file of
+    the same size exists in the folder.
+    """
+
+    def __init__(self, loader: Callable[[Path], Iterable[CloudObj]], hash_kind: str):
+        """
+        Args:
+            loader (Callable): Returns the objects of a remote folder,
+              with content_hash filled for files
+            hash_kind (str): Kind of hash used by the cloud, see `file_hash`
+        """
+        self._loader = loader
+        self._hash_kind = hash_kind
+        self._lock = threading.Lock()
+        # folder -> size -> content hash -> name
+        self._folders: dict[str, dict[int, dict[str, str]]] = {}
+        self._local: dict[str, str] = {}
+
+    def find(self, local_path: Path, folder: Path) -> Optional[str]:
+        """Name of a file in the folder with the same content as local_path"""
+        files = self._load(folder)
+        with self._lock:
+            candidates = files.get(os.path.getsize(local_path))
+        if not candidates:
+            return None
+        return candidates.get(self.digest(local_path))
+
+    def add(self, local_path: Path, path: Path) -> None:
+        """Records that local_path was uploaded to path, if it has been hashed"""
+        digest = self._local.get(self._key(local_path))
+        with self._lock:
+            files = self._folders.get(path.parent.as_posix())
+            if files is not None and digest is not None:
+                size = os.path.getsize(local_path)
+                files.setdefault(size, {}).setdefault(digest, path.name)
+
+    def forget(self, folder: Path) -> None:
+        """Drops the cached listing, so the folder is listed again on next use"""
+        with self._lock:
+            self._folders.pop(folder.as_posix(), None)
+
+    def clear(self) -> None:
+        """Drops the listings of all folders, so they are listed again on next use"""
+        with self._lock:
+            self._folders.clear()
+
+    def _key(self, local_path: Path) -> str:
+        stat = os.stat(local_path)
+        return f"{os.path.abspath(local_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+    def digest(self, local_path: Path) -> str:
+        """Hash of the local file in the kind used by the cloud"""
+        key = self._key(local_path)
+        if key not in self._local:
+            self._local[key] = file_hash(local_path, self._hash_kind)
+        return self._local[key]
+
+    def _load(self, folder: Path) -> dict[int, dict[str, str]]:
+        key = folder.as_posix()
+        with self._lock:
+            if key in self._folders:
+                return self._folders[key]
+
+        files: dict[int, dict[str, str]] = {}
+        for obj in self._loader(folder):
+            if not obj.is_directory and obj.content_hash is not None:
+                files.setdefault(obj.size, {})[obj.content_hash] = obj.name
+        with self._lock:
+            return self._folders.setdefault(key, files)
@@ -0,0 +1,101 @@
+import os
+from pathlib import Path
+from datetime import datetime
+from datetime import timezone
+from typing import Callable
+from typing import Optional
+
+from .hashing import hash_files
+from ..models.settings import CloudObj
+from ..models.settings import SyncItem
+
+# Actions of a sync plan
+UPLOAD = "new"  # The file is not in the cloud
+UPDATE = "modified"  # The file in the cloud is different and is overwritten
+CONVERT = "cfl"  # The file is already in the cloud and is replaced by a cfl
+SKIP = "unchanged"  # The file is already in the cloud
+
+ACTIONS = (UPLOAD, UPDATE, CONVERT, SKIP)
+
+
+def plan_sync(
+    local_root: Path,
+    remote_root: Path,
+    remote_files: dict[str, CloudObj],
+    is_skipped: Callable[[Path], bool],
+    hash_kind: Optional[str],
+    checksum: bool = False,
+    to_cfl: bool = False,
+    jobs: Optional[int] = None,
+) -> list[SyncItem]:
+    """Compares the files of a local folder with the files of a folder in
+    the cloud and decides what has to be done with each of them
+
+    A file is unchanged if it has the same size as the file in the cloud
+    and was modified before the file in the cloud was saved. Otherwise,
+    if the cloud reports content hashes, the hashes are compared, so a file
+    that was only touched is not uploaded again.
+
+    A file is replaced by a cfl only if its hash is the same as the hash
+    of the file in the cloud, because its local content is deleted. If the
+    cloud reports no hashes, it is uploaded again and replaced after that.
+
+    Args:
+        local_root (Path): Local folder
+        remote_root (Path): Folder in the cloud
+        remote_files (dict[str, CloudObj]): Objects of the folder in the cloud
+          and of all its subfolders by their paths relative to remote_root
+        is_skipped (Callable): Whether a local file is not synced, for
+          example because it is a cfl
+        hash_kind (str, optional): Kind of the content hashes reported by the
+          cloud, see `file_hash`. None if the cloud does not report them.
+        checksum (bool, optional): Compare the hashes of all files of the
+          same size, ignoring modification times. Defaults to False.
+        to_cfl (bool, optional): Replace synced files with cfls. The files
+          in the cloud must have been listed right before. Defaults to False.
+        jobs (int, optional): How many files are hashed at the same time.
+          Defaults to the number of CPUs.
+
+    Returns:
+        list[SyncItem]: Steps for every local file ordered by path
+    """
+    same = CONVERT if to_cfl else SKIP
+    items: list[SyncItem] = []
+    unsure: list[SyncItem] = []  # Files whose hashes must be compared
+    for local_path in sorted(local_root.rglob("*")):
+        if not local_path.is_file() or is_skipped(local_path):
+            continue
+        name = local_path.relative_to(local_root).as_posix()
+        cloud_file = remote_files.get(name)
+        item = SyncItem(UPLOAD, local_path, remote_root / name, cloud_file)
+        items.append(item)
+        if cloud_file is None or cloud_file.is_directory:
+            continue
+
+        stat = os.stat(local_path)
+        if stat.st_size != cloud_file.size:
+            item.action = UPDATE
+        elif not (checksum or to_cfl) and _saved_after(cloud_file, stat.st_mtime_ns):
+            item.action = SKIP
+        elif hash_kind is not None and cloud_file.content_hash is not None:
+            unsure.append(item)
+        else:
+            item.action = UPDATE
+
+    # Hashes of unchanged files are cached, so they are read only once
+    hashes = hash_files((x.local_path for x in unsure), hash_kind, jobs)
+    for item in unsure:
+        same_hash = hashes[item.local_path] == item.cloud_file.content_hash
+        item.action = same if same_hash else UPDATE
+    return items
+
+
+def _saved_after(cloud_file: CloudObj, mtime_ns: int) -> bool:
+    """Whether the file in the cloud was saved after the local file was modified"""
+    modified = cloud_file.modifed
+    if not isinstance(modified, datetime):
+        return False
+    if modified.tzinfo is None:
+        # Dropbox reports times in UTC without a timezone
+        modified = modified.replace(tzinfo=timezone.utc)
+    return mtime_ns <= modified.timestamp() * 1_000_000_000
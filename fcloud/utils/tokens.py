@@ -0,0 +1,85 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from contextlib import suppress
+from pathlib import Path
+from typing import Optional
+
+
+class TokenCache:
+    """Keeps access tokens and the time until which the credentials of a
+    cloud are considered verified, so that every fcloud process does not
+    have to request or check them again.
+
+    Entries are keyed by a hash of the credentials they were obtained
+    with, so changed credentials never reuse an old token. The file is
+    readable only by its owner.
+    """
+
+    def __init__(self, path: Path):
+        """
+        Args:
+            path (Path): Cache file
+        """
+        self._path = path
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(service: str, *credentials: str) -> str:
+        """Identity of the credentials of a cloud"""
+        digest = hashlib.sha256("\0".join(credentials).encode("utf-8"))
+        return f"{service}:{digest.hexdigest()}"
+
+    def get(self, key: str) -> Optional[dict]:
+        """Returns an entry whose `verified_until` has not passed"""
+        with self._lock:
+            entry = self._read().get(key)
+        if entry is None or entry.get("verified_until", 0) <= time.time():
+            return None
+        return entry
+
+    def save(self, key: str, entry: dict) -> None:
+        """
+        Args:
+            key (str): Identity of the credentials, see `key`
+            entry (dict): Must contain `verified_until` - unix time until
+              which the credentials are not checked again
+        """
+        with self._lock:
+            entries = self._read()
+            entries[key] = entry
+            self._write(entries)
+
+    def forget(self, key: str) -> None:
+        with self._lock:
+            entries = self._read()
+            if entries.pop(key, None) is not None:
+                self._write(entries)
+
+    def _read(self) -> dict[str, dict]:
+        try:
+            with open(self._path, "r", encoding="utf-8") as cache:
+                entries = json.load(cache)
+        except (OSError, ValueError):
+            return {}
+        now = time.time()
+        return {k: v for k, v in entries.items() if v.get("verified_until", 0) > now}
+
+    def _write(self, entries: dict[str, dict]) -> None:
+        # Every write has its own temporary file, so that processes which
+        # refresh tokens at the same time do not mix their entries.
+        # mkstemp creates it readable only by the owner
+        fd, tmp = tempfile.mkstemp(
+            prefix=self._path.name, suffix=".tmp", dir=self._path.parent
+        )
+        try:
+            with open(fd, "w", encoding="utf-8") as cache:
+                json.dump(entries, cache)
+            os.replace(tmp, self._path)
+        except BaseException:
+            with suppress(FileNotFoundError):
+                os.remove(tmp)
+            raise
@@ -0,0 +1,321 @@
+import os
+import time
+import select
+import struct
+from pathlib import Path
+from typing import Callable
+from typing import Iterator
+from typing import Optional
+
+# Flags of inotify from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_MODIFY
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+)
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len of the name
+
+
+class PollingWatcher:
+    """Finds new and changed files by polling the modification times of
+    folders. Only folders whose modification time has changed are read
+    again, so a poll costs one `stat` per folder, however many files there
+    are. A folder changes when files are created, renamed or deleted in it,
+    so files rewritten in place are noticed only by `InotifyWatcher`.
+    """
+
+    kind = "polling"
+
+    def __init__(self, root: Path, is_skipped: Callable[[Path], bool]):
+        """
+        Args:
+            root (Path): Watched folder
+            is_skipped (Callable): Whether changes of a file are not reported
+        """
+        self.root = root
+        self._is_skipped = is_skipped
+        self._folders: dict[Path, int] = {}  # folder: mtime_ns
+        self._files: dict[Path, dict[str, tuple[int, int]]] = {}  # (size, mtime_ns)
+
+    def scan(self) -> list[Path]:
+        """Starts watching and returns the files that are already there"""
+        return self._read_folder(self.root)
+
+    def changes(self, timeout: float) -> list[Path]:
+        """Waits for `timeout` seconds and returns new and changed files"""
+        time.sleep(timeout)
+        changed = []
+        for folder, mtime_ns in list(self._folders.items()):
+            if folder not in self._folders:
+                # Removed together with its parent
+                continue
+            try:
+                current = os.stat(folder).st_mtime_ns
+            except OSError:
+                self._forget(folder)
+                continue
+            if current != mtime_ns:
+                changed.extend(self._read_folder(folder))
+        return changed
+
+    def close(self) -> None:
+        pass
+
+    def _read_folder(self, folder: Path) -> list[Path]:
+        try:
+            self._folders[folder] = os.stat(folder).st_mtime_ns
+            entries = list(os.scandir(folder))
+        except OSError:
+            self._forget(folder)
+            return []
+
+        changed = []
+        known = self._files.get(folder, {})
+        files: dict[str, tuple[int, int]] = {}
+        for entry in entries:
+            path = folder / entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if path not in self._folders:
+                        changed.extend(self._read_folder(path))
+                    continue
+                if not entry.is_file(follow_symlinks=False) or self._is_skipped(path):
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+            if known.get(entry.name) != files[entry.name]:
+                changed.append(path)
+        self._files[folder] = files
+
+        # Subfolders that are gone are not polled anymore
+        names = {entry.name for entry in entries}
+        for subfolder in [x for x in self._folders if x.parent == folder]:
+            if subfolder.name not in names:
+                self._forget(subfolder)
+        return changed
+
+    def _forget(self, folder: Path) -> None:
+        for path in [x for x in self._folders if x == folder or folder in x.parents]:
+            del self._folders[path]
+            self._files.pop(path, None)
+
+    def __enter__(self) -> "PollingWatcher":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class InotifyWatcher:
+    """Receives changes of files from the Linux kernel through inotify,
+    so no folders are read while nothing changes. Every folder of the
+    tree gets its own watch, new folders are watched as they appear.
+    """
+
+    kind = "inotify"
+
+    def __init__(self, root: Path, is_skipped: Callable[[Path], bool]):
+        """
+        Args:
+            root (Path): Watched folder
+            is_skipped (Callable): Whether changes of a file are not reported
+
+        Raises:
+            OSError: inotify is not available or the limit of watches is reached
+        """
+        # Imported here to keep it out of the startup time of every command
+        import ctypes
+        import ctypes.util
+
+        self.root = root
+        self._is_skipped = is_skipped
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._get_errno = ctypes.get_errno
+        self._folders: dict[int, Path] = {}  # watch descriptor: folder
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            errno = self._get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+    def scan(self) -> list[Path]:
+        """Starts watching and returns the files that are already there"""
+        return self._watch_tree(self.root, strict=True)
+
+    def changes(self, timeout: float) -> list[Path]:
+        """Waits up to `timeout` seconds for changes and returns new and
+        changed files"""
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+
+        changed: dict[Path, None] = {}
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            for path in self._parse(data):
+                changed[path] = None
+        return list(changed)
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def _parse(self, data: bytes) -> Iterator[Path]:
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size : offset + _EVENT.size + length]
+            offset += _EVENT.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost, so everything is reported again
+                yield from self._watch_tree(self.root)
+                continue
+            if mask & IN_IGNORED:
+                self._folders.pop(wd, None)
+                continue
+            folder = self._folders.get(wd)
+            if folder is None or not name:
+                continue
+
+            path = folder / os.fsdecode(name.rstrip(b"\0"))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # Files may have been created before the watch was added
+                    yield from self._watch_tree(path)
+            elif not mask & IN_MOVED_FROM and not self._is_skipped(path):
+                yield path
+
+    def _watch_tree(self, folder: Path, strict: bool = False) -> list[Path]:
+        """Watches a folder and its subfolders, returns their files"""
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(folder), WATCH_MASK)
+        if wd < 0:
+            if strict:
+                errno = self._get_errno()
+                raise OSError(errno, os.strerror(errno), str(folder))
+            return []
+        # A moved folder keeps its watch descriptor, which now refers to the new path
+        self._folders[wd] = folder
+
+        files = []
+        try:
+            entries = list(os.scandir(folder))
+        except OSError:
+            return files
+        for entry in entries:
+            path = folder / entry.name
+            if entry.is_dir(follow_symlinks=False):
+                files.extend(self._watch_tree(path, strict))
+            elif entry.is_file(follow_symlinks=False) and not self._is_skipped(path):
+                files.append(path)
+        return files
+
+    def __enter__(self) -> "InotifyWatcher":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def open_watcher(
+    root: Path, is_skipped: Callable[[Path], bool], polling: bool = False
+) -> PollingWatcher | InotifyWatcher:
+    """Returns an inotify watcher if it is available, otherwise a polling one"""
+    if not polling:
+        try:
+            return InotifyWatcher(root, is_skipped)
+        except (OSError, AttributeError):
+            # Not Linux, or the limit of watches is reached
+            pass
+    return PollingWatcher(root, is_skipped)
+
+
+class Debouncer:
+    """Holds back changed files until they stop changing, so that files
+    that are still being written or copied are not uploaded.
+
+    A file is ready when its size and modification time have not changed
+    for `settle` seconds. Only the held back files are checked, so the cost
+    depends on the number of changes.
+    """
+
+    def __init__(self, settle: float):
+        """
+        Args:
+            settle (float): Seconds for which a file must not change
+        """
+        self.settle = settle
+        # path: (size, mtime_ns, time of the last change, delay)
+        self._pending: dict[Path, tuple[int, int, float, float]] = {}
+
+    def touch(self, path: Path, delay: Optional[float] = None) -> None:
+        """Marks a file as changed
+
+        Args:
+            path (Path): Changed file
+            delay (float, optional): Seconds for which the file must not
+              change, for example to retry a failed upload later.
+              Defaults to `settle`.
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self._pending.pop(path, None)
+            return
+        delay = self.settle if delay is None else delay
+        self._pending[path] = (stat.st_size, stat.st_mtime_ns, time.monotonic(), delay)
+
+    def ready(self) -> list[Path]:
+        """Removes and returns the files that have stopped changing"""
+        now = time.monotonic()
+        ready = []
+        for path, (size, mtime_ns, changed, delay) in list(self._pending.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # Deleted or renamed before it was uploaded
+                del self._pending[path]
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+                self._pending[path] = (stat.st_size, stat.st_mtime_ns, now, delay)
+            elif now - changed >= delay:
+                del self._pending[path]
+                ready.append(path)
+        return sorted(ready)
+
+    def timeout(self, interval: float) -> float:
+        """How long to wait for changes before checking the held back files"""
+        if not self._pending:
+            return interval
+        now = time.monotonic()
+        wait = min(
+            changed + delay - now for _, _, changed, delay in self._pending.values()
+        )
+        return max(0.05, min(interval, wait))
+
+    def __len__(self) -> int:
+        return len(self._pending)
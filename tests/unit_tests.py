@@ -1,10 +1,81 @@
+import json
 import tempfile
+import time
 import os
+import sys
+import shutil
+import subprocess
+import asyncio
+import threading
+import pytest
+import requests
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
 from textwrap import dedent
 from pathlib import Path
+from datetime import datetime
+from datetime import timezone
+from types import SimpleNamespace
+from dropbox.exceptions import ApiError
+from dropbox.files import DeleteBatchLaunch
+from dropbox.files import DeleteBatchResult
+from dropbox.files import DeleteBatchResultEntry
+from dropbox.files import DeleteError
+from dropbox.files import FileMetadata
+from dropbox.files import LookupError as PathLookupError
+from yadisk.exceptions import PathNotFoundError
 
+import fcloud
 from fcloud.utils.cfl import create_cfl, delete_cfl
+from fcloud.utils.cfl import read_cfl, read_cfl_data
 from fcloud.utils.other import generate_new_name
+from fcloud.utils.pool import run_in_pool
+from fcloud.utils.pool import walk_in_pool
+from fcloud.utils.pool import run_in_loop
+from fcloud.utils.pool import walk_in_loop
+from fcloud.utils.registry import NameRegistry
+from fcloud.utils.registry import ContentIndex
+from fcloud.utils.hashing import file_hash
+from fcloud.utils.hashing import HashCache
+from fcloud.cli.groups.cache import Cache
+from fcloud.models.settings import CloudObj
+from fcloud.models.settings import CflData
+from fcloud.utils.journal import UploadJournal
+from fcloud.utils.tokens import TokenCache
+from fcloud.utils.index import RemoteIndex
+from fcloud.utils.sync import plan_sync
+from fcloud.utils.watch import PollingWatcher
+from fcloud.utils.watch import Debouncer
+from fcloud.utils.watch import open_watcher
+from fcloud.utils import daemon
+from fcloud.utils.daemon import DaemonServer
+from fcloud.utils.daemon import request
+from fcloud.cli.fcloud import Fcloud
+from fcloud.models.driver import Driver as CloudDriver
+from fcloud.models.settings import Config as Settings
+from fcloud.drivers.base import CloudProtocol
+from fcloud.drivers.remote import RemoteDriver
+from fcloud.drivers.dropbox.dropbox import DropboxCloud
+from fcloud.drivers.dropbox.models import DropboxAuth
+from fcloud.exceptions.config_errors import ConfigError
+from fcloud.drivers.yandex import yandex
+from fcloud.drivers.yandex.yandex import YandexCloud
+from fcloud.drivers.yandex.yandex import AsyncYandexCloud
+from fcloud.drivers.yandex.models import YandexAuth
+from fcloud.drivers.transfer import download_url
+from fcloud.drivers.transfer import part_path
+from fcloud.drivers.threaded import ThreadedDriver
+from fcloud.drivers.dropbox.chunks import ChunkSizer
+from fcloud.drivers.dropbox.chunks import MIB
+from fcloud.utils.limiter import TokenBucket
+from fcloud.utils.limiter import parse_rate
+from fcloud.utils.limiter import format_rate
+from fcloud.utils.limiter import set_limit
+from fcloud.utils.limiter import limits
+from fcloud.utils.limiter import UPLOAD
+from fcloud.drivers.transport import get_session
+from fcloud.drivers.transport import ensure_pool_size
+from fcloud.drivers.transport import stats
 from fcloud.utils.config import get_field, edit_config
 from fcloud.cli.groups.config import Config
 from fcloud.exceptions.exceptions import FcloudException
@@ -17,6 +88,18 @@ TMP_PATH = TMP_DIR + ".tmp"
 
 utils = Utils(TMP_DIR, TMP_PATH)
 
+# Modules that `fcloud.main` must not import: cloud libraries are imported
+# only by the driver of the used cloud, the rest only by commands that use them
+LAZY_MODULES = ("dropbox", "stone", "yadisk", "requests", "sqlite3")
+
+
+@pytest.fixture(autouse=True)
+def data_dir(monkeypatch, tmp_path):
+    # Journals, caches and indexes (see `get_data_dir`) of every test
+    # are kept in its own folder instead of next to a shared config
+    monkeypatch.setenv("FCLOUD_CONFIG_PATH", str(tmp_path / ".conf"))
+    monkeypatch.setattr(HashCache, "_default", None)
+
 
 @utils.catch
 def test_cfl_util():
@@ -42,6 +125,28 @@ def test_cfl_util_near():
     delete_cfl(TMP_PATH + ex)
 
 
+@utils.catch
+def test_cfl_v2():
+    os.mknod(TMP_PATH)
+    data = CflData(
+        Path("/main/folder/filename"), 2, "dropbox", 5, "abc", None, 10**18, "r1"
+    )
+    create_cfl(Path(TMP_PATH), "filename", Path("/main/folder"), ".ex", True, data)
+
+    with open(TMP_PATH + ".ex", "r") as cfl:
+        assert cfl.readline() == "%cfl:/main/folder/filename\n"
+    assert read_cfl(Path(TMP_PATH + ".ex")) == Path("/main/folder/filename")
+    assert read_cfl_data(Path(TMP_PATH + ".ex")) == data
+
+    with open(TMP_PATH + ".ex", "w") as cfl:
+        cfl.write("%cfl:/main/folder/filename")
+    assert read_cfl_data(Path(TMP_PATH + ".ex")) == CflData(
+        Path("/main/folder/filename")
+    )
+
+    delete_cfl(TMP_PATH + ".ex")
+
+
 def test_generate_new_name():
     result = generate_new_name(["file", "file (1)"], "file")
     assert result == "file (2)"
@@ -50,6 +155,707 @@ def test_generate_new_name():
     assert result == "t (1)"
 
 
+def test_run_in_pool():
+    def handler(item: int):
+        if item % 3 == 0:
+            raise FcloudException("Error", str(item))
+
+    errors = run_in_pool(handler, range(10), jobs=4)
+    assert sorted(item for item, _ in errors) == [0, 3, 6, 9]
+    assert all(err.message == str(item) for item, err in errors)
+
+
+def test_walk_in_pool():
+    tree = {"": ["a/", "b/", "f1"], "a/": ["a/c/", "f2"], "b/": [], "a/c/": ["f3"]}
+
+    def get_folder(item: str):
+        return item if item.endswith("/") else None
+
+    items = walk_in_pool(tree.get, "", get_folder, jobs=3, buffer=1)
+    assert sorted(items) == ["a/", "a/c/", "b/", "f1", "f2", "f3"]
+
+    flag = False
+    try:
+        list(walk_in_pool(lambda x: tree[x + "missing"], "", get_folder))
+    except KeyError:
+        flag = True
+    assert flag
+
+
+def test_name_registry():
+    listings = []
+
+    def loader(folder: Path) -> list[str]:
+        listings.append(folder)
+        return ["film.mp4"]
+
+    registry = NameRegistry(loader)
+    first = registry.reserve(Path("/films/film.mp4"))
+    second = registry.reserve(Path("/films/film.mp4"))
+    assert (first, second) == ("film.mp4 (1)", "film.mp4 (2)")
+
+    registry.release(Path("/films") / second)
+    registry.commit(Path("/films") / first)
+    assert registry.reserve(Path("/films/film.mp4")) == "film.mp4 (2)"
+    assert registry.reserve(Path("/films/new.mp4")) == "new.mp4"
+    assert listings == [Path("/films")]
+
+    # Names of running uploads survive the reload of the folder
+    registry.clear()
+    assert registry.reserve(Path("/films/new.mp4")) == "new.mp4 (1)"
+    assert listings == [Path("/films")] * 2
+
+
+@utils.catch
+def test_content_index():
+    with open(TMP_PATH, "wb") as file:
+        file.write(b"Some text" * 1024 * 1024)
+    digest = file_hash(Path(TMP_PATH), "dropbox")
+    assert digest == "c846efc5bb9ac6bde417fe6e0e158f5c6feafed9b69c812b9a4c1f41b5422d69"
+
+    index = ContentIndex(
+        lambda folder: [
+            CloudObj("copy.txt", os.path.getsize(TMP_PATH), False, None, digest),
+            CloudObj("other.txt", 1, False, None, "hash"),
+        ],
+        "dropbox",
+    )
+    assert index.find(Path(TMP_PATH), Path("/files")) == "copy.txt"
+
+    with open(TMP_PATH, "ab") as file:
+        file.write(b"Changed")
+    assert index.find(Path(TMP_PATH), Path("/files")) is None
+
+
+@utils.catch
+def test_copy_existing_checks_hash():
+    with open(TMP_PATH, "wb") as file:
+        file.write(b"Some text")
+    digest = file_hash(Path(TMP_PATH), "dropbox")
+    removed = []
+
+    class App:
+        copied_hash = "0" * 64
+
+        def files_copy_v2(self, source, path):
+            metadata = FileMetadata(
+                name=Path(path).name,
+                path_display=path,
+                size=9,
+                server_modified=datetime(2024, 1, 1),
+                content_hash=self.copied_hash,
+                rev="0123456789",
+            )
+            return SimpleNamespace(metadata=metadata)
+
+        def files_delete(self, path):
+            removed.append(path)
+
+    driver = object.__new__(DropboxCloud)
+    driver.app = App()
+    driver._names = NameRegistry(lambda folder: ["copy.txt"])
+    driver._contents = ContentIndex(
+        lambda folder: [CloudObj("copy.txt", 9, False, None, digest)], "dropbox"
+    )
+    # The cloud file was changed after the folder was listed
+    assert driver.copy_existing(Path(TMP_PATH), Path("/files/file.txt")) is None
+    assert removed == ["/files/file.txt"]
+
+    driver.app.copied_hash = digest
+    obj = driver.copy_existing(Path(TMP_PATH), Path("/files/file.txt"))
+    assert (obj.name, obj.content_hash) == ("file.txt", digest)
+
+
+def test_dropbox_remove_files():
+    class App:
+        def files_delete_batch(self, entries):
+            paths = [x.path for x in entries]
+            if "/a" in paths:
+                raise ApiError(None, "too_many_write_operations", None, None)
+            lookup = DeleteError.path_lookup(PathLookupError.not_found)
+            return DeleteBatchLaunch.complete(
+                DeleteBatchResult(
+                    [
+                        DeleteBatchResultEntry.failure(lookup),
+                        DeleteBatchResultEntry.failure(DeleteError.too_many_files),
+                    ]
+                )
+            )
+
+    driver = object.__new__(DropboxCloud)
+    driver.app = App()
+    driver.delete_batch_size = 2
+    driver._names = NameRegistry(lambda folder: [])
+    paths = [Path("/a"), Path("/b"), Path("/gone"), Path("/big")]
+    errors = driver.remove_files(paths)
+    # Only the batch that failed to start and the real failure are reported,
+    # a file that is already gone counts as removed
+    assert [path for path, _ in errors] == [Path("/a"), Path("/b"), Path("/big")]
+
+
+@utils.catch
+def test_hash_cache():
+    with open(TMP_PATH, "w") as file:
+        file.write("Some text")
+    cache = HashCache(Path(TMP_DIR) / ".tmp-hashes")
+    cache.clear()
+
+    md5 = cache.get(Path(TMP_PATH), "md5")
+    assert md5 == "9db5682a4d778ca2cb79580bdb67083f"
+    assert cache.get(Path(TMP_PATH), "sha256") != md5
+    assert len(cache) == 1
+
+    with open(TMP_PATH, "a") as file:
+        file.write("Changed")
+    cache.get(Path(TMP_PATH), "md5")
+    assert len(cache) == 2
+    assert cache.prune() == 1
+    assert len(cache) == 1
+
+    try:
+        Cache().fill(TMP_PATH, kind="crc32")
+        assert False
+    except FcloudException as err:
+        assert err.title == "Unknown hash kind"
+
+    cache.clear()
+    os.remove(Path(TMP_DIR) / ".tmp-hashes")
+
+
+@utils.catch
+def test_upload_journal():
+    with open(TMP_PATH, "w") as file:
+        file.write("Some text")
+    folder = Path(tempfile.mkdtemp(dir=TMP_DIR)) / "uploads"
+    journal = UploadJournal(folder)
+    key = journal.key(Path(TMP_PATH), Path("/films/film.mp4"))
+    other = journal.key(Path(TMP_PATH), Path("/films/copy.mp4"))
+
+    journal.save(key, {"session_id": "id", "offset": 4})
+    assert journal.get(key)["offset"] == 4
+    (entry,) = folder.iterdir()
+    assert os.stat(entry).st_mode & 0o777 == 0o600
+
+    # Another process saves its own entry without touching this one
+    UploadJournal(folder).save(other, {"session_id": "other", "offset": 8})
+    assert journal.get(key)["offset"] == 4 and journal.get(other)["offset"] == 8
+
+    with open(TMP_PATH, "a") as file:
+        file.write("Changed")
+    assert journal.key(Path(TMP_PATH), Path("/films/film.mp4")) != key
+
+    journal.remove(key)
+    assert journal.get(key) is None and len(list(folder.iterdir())) == 1
+
+    # Expired entries are deleted by the next process that saves one
+    UploadJournal(folder, max_age=0).save(key, {"session_id": "id", "offset": 0})
+    assert journal.get(other) is None and len(list(folder.iterdir())) == 1
+    shutil.rmtree(folder.parent)
+
+
+def test_remote_index():
+    index = RemoteIndex(Path(TMP_DIR) / ".tmp-index", "cloud", Path("/main"))
+    index.clear()
+
+    def file(path: str, size: int = 1) -> tuple[str, CloudObj]:
+        return path, CloudObj(Path(path).name, size, False, None, path=path)
+
+    changes = [file("/main/a/b/f1"), file("/main/f2"), file("/main/a0")]
+    assert index.update(changes, cursor=lambda: "c1", reset=True) == 3
+    assert index.cursor == "c1"
+    assert index.exists(Path("/main/a/b")) and index.get(Path("/main/a")).is_directory
+    assert [x.name for x in index.list(Path("/main"))] == ["a", "a0", "f2"]
+    assert len(list(index.list(Path("/main/a"), recursive=True))) == 2
+
+    index.update([("/main/a", None), file("/main/f2", 5)], cursor=lambda: "c2")
+    assert [x.path for x in index.list(Path("/main"), True)] == ["/main/a0", "/main/f2"]
+    assert index.get(Path("/main/f2")).size == 5 and index.cursor == "c2"
+
+    index.clear()
+    assert len(index) == 0 and index.updated is None
+
+    # Dropbox reports paths in any case, but keeps the case for display
+    index = RemoteIndex(Path(TMP_DIR) / ".tmp-index", "cloud", Path("/Main"), False)
+    obj = CloudObj("F1", 1, False, None, path="/Main/Dir/F1")
+    index.update([("/main/dir/f1", obj)], cursor=lambda: "c1", reset=True)
+    assert index.get(Path("/MAIN/dir/F1")).path == "/Main/Dir/F1"
+    assert [x.path for x in index.list(Path("/main"))] == ["/Main/Dir"]
+    assert index.covers(Path("/main/dir")) and index.exists(Path("/main"))
+    index.update([("/Main/DIR", None)])
+    assert len(index) == 0
+
+    # Names taken in indexed folders are not listed in the cloud
+    index.update([("/main/dir/f1", obj)], cursor=lambda: "c2", reset=True)
+    listings = []
+    registry = NameRegistry(lambda folder: listings.append(folder) or [])
+    registry.use_index(index)
+    assert registry.reserve(Path("/Main/Dir/F1")) == "F1 (1)"
+    assert registry.reserve(Path("/Main/New/F1")) == "F1"
+    assert registry.reserve(Path("/other/F1")) == "F1"
+    assert listings == [Path("/Main/New"), Path("/other")]
+    index.clear()
+    os.remove(Path(TMP_DIR) / ".tmp-index")
+
+
+def test_plan_sync():
+    folder = Path(tempfile.mkdtemp(dir=TMP_DIR))
+    for name, text in (
+        ("new", "1"),
+        ("same", "22"),
+        ("touched", "33"),
+        ("sub/changed", "4"),
+    ):
+        (folder / name).parent.mkdir(exist_ok=True)
+        (folder / name).write_text(text)
+    (folder / "link.cfl").write_text("%cfl:/main/link")
+    saved = datetime.now(timezone.utc)
+    os.utime(folder / "touched", (time.time() + 60, time.time() + 60))
+
+    touched_hash = file_hash(folder / "touched", "md5")
+    remote_files = {
+        "same": CloudObj("same", 2, False, saved, "other"),
+        "touched": CloudObj("touched", 2, False, saved, touched_hash),
+        "sub/changed": CloudObj("changed", 5, False, saved, "other"),
+    }
+    plan = plan_sync(
+        folder, Path("/main"), remote_files, lambda x: x.suffix == ".cfl", "md5"
+    )
+    actions = {x.local_path.relative_to(folder).as_posix(): x.action for x in plan}
+    assert actions == {
+        "new": "new",
+        "same": "unchanged",
+        "touched": "unchanged",
+        "sub/changed": "modified",
+    }
+    assert plan[0].path == Path("/main/new")
+
+    # With checksum, the hash of a file of the same size is always compared
+    plan = plan_sync(folder, Path("/main"), remote_files, lambda x: False, "md5", True)
+    assert {x.local_path.name: x.action for x in plan}["same"] == "modified"
+
+    # A file is replaced by a cfl only if the hashes are the same
+    plan = plan_sync(
+        folder, Path("/main"), remote_files, lambda x: False, "md5", to_cfl=True
+    )
+    actions = {x.local_path.name: x.action for x in plan}
+    assert actions["same"] == "modified" and actions["touched"] == "cfl"
+    plan = plan_sync(
+        folder, Path("/main"), remote_files, lambda x: False, None, to_cfl=True
+    )
+    assert {x.local_path.name: x.action for x in plan}["touched"] == "modified"
+    shutil.rmtree(folder)
+
+
+@utils.catch
+def test_invalid_section(monkeypatch, tmp_path):
+    shutil.copy(Path(fcloud.__file__).parent / ".conf", tmp_path / ".conf")
+    monkeypatch.setenv("FCLOUD_CONFIG_PATH", str(tmp_path / ".conf"))
+    fields = {"token": "t", "app_secret": "s", "app_key": "k", "chunk_size": "8M"}
+    config = Settings("dropbox", fields, Path("/main"), ".cfl")
+    try:
+        Fcloud([CloudDriver("dropbox", CloudProtocol, DropboxAuth)], config)
+        assert False
+    except FcloudException as err:
+        assert err.title == ConfigError.section_error[0]
+
+
+def test_sync_command(monkeypatch, tmp_path):
+    class Driver(CloudProtocol):
+        hash_kind = "md5"
+        files = {}
+
+        def upload_file(self, local_path, path, overwrite=False):
+            self.files[path.as_posix()] = local_path.read_bytes()
+            return CloudObj(path.name, local_path.stat().st_size, False, None)
+
+        def get_all_files(self, remote_path, page_size=1000, recursive=False, jobs=4):
+            for path, data in self.files.items():
+                yield CloudObj(Path(path).name, len(data), False, None, path=path)
+
+        def exists(self, path):
+            return any(path in Path(x).parents for x in self.files)
+
+    folder = tmp_path / "folder"
+    (folder / "sub").mkdir(parents=True)
+    (folder / "a.txt").write_text("a")
+    (folder / "sub" / "b.txt").write_text("bb")
+    # The command groups read the shipped configuration
+    shutil.copy(Path(fcloud.__file__).parent / ".conf", tmp_path / ".conf")
+    monkeypatch.setenv("FCLOUD_CONFIG_PATH", str(tmp_path / ".conf"))
+    config = Settings("test", {}, Path("/sync"), ".cfl")
+    cli = Fcloud([CloudDriver("test", Driver, dict)], config)
+
+    assert cli.sync(folder, dry_run=True) == "2 new, 0 modified, 0 cfl, 0 unchanged"
+    assert Driver.files == {}
+    assert cli.sync(folder) == "2 new, 0 modified, 0 cfl, 0 unchanged"
+    assert Driver.files == {"/sync/a.txt": b"a", "/sync/sub/b.txt": b"bb"}
+
+
+def test_watchers():
+    folder = Path(tempfile.mkdtemp(dir=TMP_DIR))
+    (folder / "old").write_text("1")
+
+    def is_skipped(path: Path) -> bool:
+        return path.suffix == ".cfl"
+
+    for watcher in (
+        PollingWatcher(folder, is_skipped),
+        open_watcher(folder, is_skipped),
+    ):
+        with watcher:
+            assert watcher.scan() == [folder / "old"]
+            (folder / "sub").mkdir()
+            (folder / "sub" / "new").write_text("2")
+            (folder / "sub" / "link.cfl").write_text("%cfl:/main/link")
+            assert watcher.changes(0.1) == [folder / "sub" / "new"]
+            assert watcher.changes(0.1) == []
+        shutil.rmtree(folder / "sub")
+
+    debouncer = Debouncer(0.2)
+    debouncer.touch(folder / "old")
+    assert debouncer.ready() == [] and len(debouncer) == 1
+    time.sleep(0.25)
+    assert debouncer.ready() == [folder / "old"] and len(debouncer) == 0
+    shutil.rmtree(folder)
+
+
+def test_daemon(monkeypatch):
+    forgotten = []
+
+    class Driver(CloudProtocol):
+        hash_kind = "md5"
+
+        def forget_cache(self):
+            forgotten.append(True)
+
+        def upload_file(self, local_path, path, overwrite=False):
+            if not local_path.is_absolute():
+                raise FcloudException("Relative path", str(local_path))
+            return CloudObj(path.name, 1, False, datetime.now(timezone.utc))
+
+        def get_all_files(self, remote_path, page_size=1000, recursive=False, jobs=4):
+            yield from (CloudObj(str(x), 1, False, None) for x in range(3))
+
+        def remove_file(self, path):
+            raise FcloudException("Not found", path.as_posix())
+
+    path = Path(tempfile.mkdtemp(dir=TMP_DIR)) / "daemon.sock"
+    server = DaemonServer(path, Driver(None, Path("/main")), "test")
+    thread = threading.Thread(target=server.run)
+    thread.start()
+    try:
+        driver = RemoteDriver.connect(path)
+        assert driver.hash_kind == "md5"
+        driver.upload_file(Path("/file"), Path("/main/file"))
+        assert not forgotten
+        monkeypatch.setattr(daemon, "CACHE_TTL", 0)
+        assert driver.upload_file(Path("file"), Path("/main/file")).name == "file"
+        assert [x.name for x in driver.get_all_files(Path("/main"))] == ["0", "1", "2"]
+        try:
+            driver.remove_file(Path("/main/file"))
+            assert False
+        except FcloudException as err:
+            assert (err.title, err.message) == ("Not found", "/main/file")
+        assert forgotten
+    finally:
+        request(path, "stop")
+        thread.join()
+    assert RemoteDriver.connect(path) is None
+    shutil.rmtree(path.parent)
+
+
+def test_transport():
+    session = get_session("test")
+    assert stats()["test"]["pool_size"] == 10
+    assert get_session("test", 4) is session
+    assert stats()["test"]["pool_size"] == 10
+    assert get_session("test", 32) is session
+    assert stats()["test"] == {
+        "pool_size": 32,
+        "requests": 0,
+        "connections": 0,
+        "reused": 0,
+    }
+    assert get_session("other") is not session
+    ensure_pool_size("test", 48)
+    assert stats()["test"]["pool_size"] == 48
+
+
+def test_async_driver():
+    class Driver(CloudProtocol):
+        def get_all_files(self, remote_path, page_size=1000, recursive=False, jobs=4):
+            yield from (CloudObj(str(x), 1, False, None) for x in range(5))
+
+        def remove_file(self, path):
+            if path.name == "missing":
+                raise FcloudException("Not found", path.as_posix())
+
+    running = 0
+    peak = 0
+
+    async def process(item):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        if item == 3:
+            raise ValueError(item)
+
+    async def list_folder(folder):
+        for name in ("a", "b") if len(folder) < 3 else ():
+            await asyncio.sleep(0)
+            yield folder + name
+
+    async def main():
+        errors = await run_in_loop(process, range(10), jobs=3)
+        assert [x for x, _ in errors] == [3] and peak == 3
+        tree = [x async for x in walk_in_loop(list_folder, "/", lambda x: x, jobs=2)]
+        assert sorted(tree) == ["/a", "/aa", "/ab", "/b", "/ba", "/bb"]
+
+        async with Driver(None, Path("/main")).asynchronous(2) as driver:
+            assert isinstance(driver, ThreadedDriver)
+            files = driver.get_all_files(Path("/main"), page_size=2)
+            assert [x.name async for x in files] == ["0", "1", "2", "3", "4"]
+            paths = [Path("/main/file"), Path("/main/missing")]
+            errors = await driver.remove_files(paths, jobs=2)
+            assert [(x, err.title) for x, err in errors] == [(paths[1], "Not found")]
+
+    asyncio.run(main())
+
+
+@utils.catch
+def test_async_yandex(monkeypatch):
+    with open(TMP_PATH, "w") as file:
+        file.write("Some text")
+    tree = {"/main": ["dir", "film.mp4"], "/main/dir": ["f1"]}
+    uploaded = []
+
+    def resource(path: str, is_directory: bool = False):
+        return SimpleNamespace(
+            name=Path(path).name,
+            path="disk:" + path,
+            type="dir" if is_directory else "file",
+            size=0 if is_directory else 9,
+            modified=datetime(2024, 1, 1, tzinfo=timezone.utc),
+            md5=None if is_directory else "9db5682a4d778ca2cb79580bdb67083f",
+            revision=1,
+        )
+
+    class Client:
+        def __init__(self, *args, session=None):
+            assert session is not None
+
+        async def upload(self, local_path, path, overwrite=False):
+            uploaded.append((local_path, path, overwrite))
+
+        async def get_meta(self, path, fields=None):
+            return resource(path)
+
+        async def listdir(self, path, limit=None, fields=None):
+            if path not in tree:
+                raise PathNotFoundError()
+            for name in tree[path]:
+                await asyncio.sleep(0)
+                yield resource(f"{path}/{name}", name == "dir")
+
+        async def close(self):
+            pass
+
+    monkeypatch.setattr(yandex, "AsyncClient", Client)
+    driver = object.__new__(YandexCloud)
+    driver._auth = YandexAuth("token", "id", "secret")
+    driver._names = NameRegistry(lambda folder: tree[folder.as_posix()])
+    driver._contents = ContentIndex(lambda folder: [], "md5")
+
+    async def main():
+        async with driver.asynchronous(2) as cloud:
+            assert isinstance(cloud, AsyncYandexCloud)
+            obj = await cloud.upload_file(Path(TMP_PATH), Path("/main/film.mp4"))
+            assert obj.name == "film.mp4 (1)" and obj.path == "/main/film.mp4 (1)"
+            assert uploaded == [(TMP_PATH, "/main/film.mp4 (1)", False)]
+
+            files = cloud.get_all_files(Path("/main"), recursive=True, jobs=2)
+            paths = sorted([x.path async for x in files])
+            assert paths == ["/main/dir", "/main/dir/f1", "/main/film.mp4"]
+            try:
+                [x async for x in cloud.get_all_files(Path("/missing"))]
+                assert False
+            except FcloudException as err:
+                assert err.title == "Resource not found"
+
+    asyncio.run(main())
+
+
+class _FileHandler(BaseHTTPRequestHandler):
+    """Serves `file` with Range and If-Range, and cuts the responses
+    after `cut` bytes to simulate a dropped connection"""
+
+    protocol_version = "HTTP/1.1"
+    file = {"data": b"", "etag": '"v1"', "cut": None, "sent": 0}
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        data, etag = self.file["data"], self.file["etag"]
+        start, end = 0, len(data) - 1
+        ranges = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if ranges and if_range in (None, etag):
+            first, _, last = ranges.removeprefix("bytes=").partition("-")
+            start, end = int(first), int(last or end)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+        else:
+            self.send_response(200)
+        body = data[start : end + 1]
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        body = body[: self.file["cut"]]
+        self.file["sent"] += len(body)
+        self.wfile.write(body)
+        if self.file["cut"] is not None:
+            self.close_connection = True
+
+
+def _serve_file() -> tuple[ThreadingHTTPServer, str]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FileHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/file"
+
+
+def test_download_resume():
+    server, url = _serve_file()
+    file = _FileHandler.file
+    path = Path(tempfile.mkdtemp(dir=TMP_DIR)) / "file"
+    session = get_session("test")
+    try:
+        file.update(data=os.urandom(100_000), etag='"v1"', cut=40_000)
+        try:
+            download_url(session, url, path, chunk_size=1000, version="r1", attempts=1)
+            assert False
+        except requests.RequestException:
+            pass
+        assert part_path(path).stat().st_size == 40_000
+
+        # The same version is continued from the end of the part
+        file.update(cut=None, sent=0)
+        download_url(session, url, path, version="r1")
+        assert path.read_bytes() == file["data"] and file["sent"] == 60_000
+
+        # A part of an older version is not continued
+        for version, etag in (("r2", '"v1"'), (None, '"v2"')):
+            part_path(path).write_bytes(path.read_bytes()[:40_000])
+            file.update(data=os.urandom(100_000), etag=etag, sent=0)
+            download_url(session, url, path, version=version)
+            assert path.read_bytes() == file["data"] and file["sent"] == 100_000
+    finally:
+        server.shutdown()
+        shutil.rmtree(path.parent)
+
+
+def test_segmented_download():
+    server, url = _serve_file()
+    file = _FileHandler.file
+    path = Path(tempfile.mkdtemp(dir=TMP_DIR)) / "file"
+    session = get_session("test")
+    args = {"segments": 4, "min_segment_size": 1000, "chunk_size": 1000}
+    try:
+        file.update(data=os.urandom(100_000), etag='"v1"', cut=10_000)
+        try:
+            download_url(session, url, path, version="r1", attempts=1, **args)
+            assert False
+        except requests.RequestException:
+            pass
+
+        # Every segment is continued where it stopped
+        with open(f"{part_path(path)}.segments") as progress:
+            done = sum(x[2] for x in json.load(progress)["ranges"])
+        assert done > 0
+        file.update(cut=None, sent=0)
+        download_url(session, url, path, version="r1", **args)
+        # One byte of the request for the size
+        assert path.read_bytes() == file["data"]
+        assert file["sent"] == 100_001 - done
+
+        # Without a version, a changed file is noticed by If-Range
+        file.update(cut=10_000)
+        try:
+            download_url(session, url, path, attempts=1, **args)
+        except requests.RequestException:
+            pass
+        file.update(data=os.urandom(100_000), etag='"v2"', cut=None)
+        download_url(session, url, path, **args)
+        assert path.read_bytes() == file["data"]
+        assert list(path.parent.iterdir()) == [path]
+    finally:
+        server.shutdown()
+        shutil.rmtree(path.parent)
+
+
+def test_chunk_sizer():
+    sizer = ChunkSizer(4 * MIB, max_size=64 * MIB, duration=1)
+    sizer.latency(0.1)
+    # 100 MiB/s on a fast link, the size doubles up to the limit
+    for _ in range(5):
+        sizer.sent(sizer.size, sizer.size / (100 * MIB) + 0.1)
+    assert sizer.size == 64 * MIB
+    sizer.sent(MIB, 10)  # The short last chunk of a file is ignored
+    assert sizer.size == 64 * MIB
+    sizer.failed()
+    assert sizer.size == 32 * MIB
+    # 1 MiB/s on a slow link
+    for _ in range(10):
+        sizer.sent(sizer.size, sizer.size / MIB + 0.1)
+    assert sizer.size == 4 * MIB
+    sizer = ChunkSizer(6 * MIB, adaptive=False)
+    sizer.failed()
+    assert sizer.size == 4 * MIB and sizer.max_size == 4 * MIB
+    assert ChunkSizer(500 * MIB, max_size=500 * MIB).size == 148 * MIB
+
+
+def test_limiter():
+    assert parse_rate("512K") == 512 * 1024
+    assert parse_rate("1.5MiB/s") == 1.5 * MIB
+    assert parse_rate("2000") == 2000 and parse_rate("") == 0
+    assert format_rate(10 * MIB) == "10M/s" and format_rate(0) == "unlimited"
+    try:
+        parse_rate("fast")
+        assert False
+    except FcloudException:
+        pass
+
+    bucket = TokenBucket(MIB)
+    assert bucket.block_size() == MIB // 10
+    # Later blocks wait for the blocks reserved before them
+    assert 0.49 < bucket.reserve(MIB // 2) <= 0.5
+    assert 0.99 < bucket.reserve(MIB // 2) <= 1
+    bucket.rate = 0
+    assert bucket.reserve(100 * MIB) == 0
+
+    set_limit(UPLOAD, 3 * MIB)
+    assert limits()[UPLOAD] == 3 * MIB
+    set_limit(UPLOAD, None)
+
+
+def test_token_cache():
+    tokens = TokenCache(Path(TMP_DIR) / ".tmp-tokens")
+    key = tokens.key("dropbox", "refresh token", "app key")
+    assert key != tokens.key("dropbox", "other token", "app key")
+
+    tokens.save(key, {"access_token": "token", "verified_until": time.time() + 60})
+    assert tokens.get(key)["access_token"] == "token"
+    assert os.stat(Path(TMP_DIR) / ".tmp-tokens").st_mode & 0o777 == 0o600
+
+    tokens.save(key, {"access_token": "token", "verified_until": time.time() - 1})
+    assert tokens.get(key) is None
+
+    tokens.forget(key)
+    os.remove(Path(TMP_DIR) / ".tmp-tokens")
+
+
 @utils.catch
 def test_config_utils():
     utils.create_temp_config()
@@ -71,7 +877,8 @@ def test_config_utils():
 
 
 @utils.catch
-def test_config():
+def test_config(monkeypatch):
+    monkeypatch.setenv("FCLOUD_CONFIG_PATH", TMP_PATH)
     config = Config(["some_cloud", "second_cloud"], Path(TMP_PATH))
     with open(TMP_PATH, "w") as conf:
         conf.write(
@@ -101,3 +908,22 @@ def test_config():
             token = 123456abcdef
 
             """)
+
+
+def test_lazy_imports():
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import fcloud.main"],
+        capture_output=True,
+        text=True,
+        cwd=Path(__file__).parent.parent,
+    )
+    assert process.returncode == 0, process.stderr
+
+    # Modules imported by `site` are listed before it and are not fcloud's
+    lines = process.stderr.splitlines()
+    site = next(i for i, x in enumerate(lines) if x.endswith("| site"))
+    imported = {line.split("|")[2].strip() for line in lines[site + 1 :]}
+
+    assert "fcloud.main" in imported
+    for module in LAZY_MODULES:
+        assert module not in imported, f"{module} is imported at startup"